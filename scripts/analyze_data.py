@@ -1,8 +1,19 @@
 import subprocess
 import json
+import re
+import argparse
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import os
 import pandas as pd
 from io import StringIO
 
+from settings import Config
+from raw_dataset import ORDERS_LAYOUT, STOCK_LAYOUT, PartitionFilter, discover, iter_records, iter_tables
+from trino_stream import iter_trino_rows
+
+PARTITION_DATE = re.compile(r"/date=(\d{4}-\d{2}-\d{2})/")
+
 def run_hdfs_command(cmd):
     """Exécute une commande HDFS"""
     full_cmd = f"docker-compose exec namenode {cmd}"
@@ -49,6 +60,35 @@ def analyze_orders():
     else:
         print(f"   ✗ Impossible de lire le fichier")
 
+def analyze_demand_rollup(date="2025-12-02"):
+    """Analyse la demande à partir du rollup demand_daily"""
+    print("\n\n=== ANALYSE DU ROLLUP DE DEMANDE ===")
+    
+    query = f"""
+        SELECT sku_id, SUM(qty) as total, SUM(order_count) as lignes
+        FROM hive.procurement.demand_daily
+        WHERE date = '{date}'
+        GROUP BY sku_id
+        ORDER BY total DESC
+    """
+    print(f"\n$ trino> {query.strip()[:80]}")
+    try:
+        rows = list(iter_trino_rows(query, {'total': int, 'lignes': int}))
+    except subprocess.SubprocessError as e:
+        print(f"   ✗ Erreur: {str(getattr(e, 'stderr', None) or e).strip()[:200]}")
+        return
+    
+    if not rows:
+        print(f"   ✗ Rollup vide pour {date}")
+        return
+    
+    df = pd.DataFrame(rows)
+    print(f"   ✓ {len(df)} SKU avec demande le {date}")
+    print(f"   Quantité totale: {df['total'].sum()}")
+    print(f"   Lignes de commande couvertes: {df['lignes'].sum()}")
+    print(f"\n   Top 10 SKU:")
+    print(df.head(10).to_string(index=False))
+
 def analyze_stock():
     """Analyse les données de stock"""
     print("\n\n=== ANALYSE DES DONNÉES DE STOCK ===")
@@ -125,14 +165,233 @@ def verify_hdfs_structure():
     print("\n3. Interface Web:")
     print("   http://localhost:9870")
 
+# =========================
+# ANALYSE PARALLÈLE PAR PARTITIONS
+# =========================
+class PartialStats:
+    """Agrégats partiels fusionnables (un par fichier lu)"""
+    
+    def __init__(self):
+        self.files = 0
+        self.order_lines = 0
+        self.sku_quantity = Counter()
+        self.stock_rows = 0
+        self.stock_available = Counter()
+        self.stock_reserved = Counter()
+    
+    def merge(self, other):
+        """Combine un autre agrégat partiel dans celui-ci"""
+        self.files += other.files
+        self.order_lines += other.order_lines
+        self.sku_quantity.update(other.sku_quantity)
+        self.stock_rows += other.stock_rows
+        self.stock_available.update(other.stock_available)
+        self.stock_reserved.update(other.stock_reserved)
+        return self
+
+def list_partition_files(root, start_date, end_date):
+    """Liste les fichiers des partitions date=... comprises dans l'intervalle"""
+    result = run_hdfs_command(f"hdfs dfs -ls -R {root}")
+    files = []
+    for line in result.stdout.splitlines():
+        if not line.startswith('-'):
+            continue  # répertoires et lignes d'avertissement
+        path = line.split()[-1]
+        match = PARTITION_DATE.search(path)
+        if match and start_date <= match.group(1) <= end_date:
+            files.append(path)
+    return files
+
+def open_hdfs_stream(path):
+    """Ouvre un flux de lecture sur un fichier HDFS"""
+    return subprocess.Popen(['docker-compose', 'exec', '-T', 'namenode', 'hdfs', 'dfs', '-cat', path],
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+
+def close_hdfs_stream(proc, path):
+    """Attend la fin de la lecture ; lève CalledProcessError si `hdfs dfs -cat` a échoué"""
+    proc.stdout.close()
+    returncode = proc.wait()
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, f"hdfs dfs -cat {path}")
+
+def abort_hdfs_stream(proc):
+    """Interrompt une lecture abandonnée en cours de flux"""
+    proc.kill()
+    proc.stdout.close()
+    proc.wait()
+
+def aggregate_orders_file(path):
+    """Agrège un fichier orders.json (tableau JSON ou JSON lines) lu en flux"""
+    partial = PartialStats()
+    proc = open_hdfs_stream(path)
+    try:
+        for record in iter_records(proc.stdout):
+            partial.order_lines += 1
+            partial.sku_quantity[record['sku_id']] += int(record.get('quantity', 0))
+    except Exception:
+        abort_hdfs_stream(proc)
+        raise
+    close_hdfs_stream(proc, path)
+    partial.files = 1
+    return partial
+
+def aggregate_stock_file(path, chunksize):
+    """Agrège un fichier de stock CSV par blocs de `chunksize` lignes"""
+    partial = PartialStats()
+    proc = open_hdfs_stream(path)
+    try:
+        for chunk in pd.read_csv(proc.stdout, chunksize=chunksize):
+            partial.stock_rows += len(chunk)
+            by_sku = chunk.groupby('sku_id')[['available_stock', 'reserved_stock']].sum()
+            partial.stock_available.update(by_sku['available_stock'].to_dict())
+            partial.stock_reserved.update(by_sku['reserved_stock'].to_dict())
+    except Exception:
+        abort_hdfs_stream(proc)
+        raise
+    close_hdfs_stream(proc, path)
+    partial.files = 1
+    return partial
+
+def load_products(local_dir=None):
+    """products.csv (sku_id, category, pack_size) depuis HDFS, ou data/master en local ; None si absent"""
+    columns = ['sku_id', 'category', 'pack_size']
+    if local_dir is not None:
+        path = os.path.join(local_dir, "master", "products.csv")
+        if not os.path.exists(path):
+            return None
+        return pd.read_csv(path, usecols=columns)
+    result = run_hdfs_command("hdfs dfs -cat /raw/master/products.csv")
+    if result.returncode != 0 or not result.stdout:
+        return None
+    return pd.read_csv(StringIO(result.stdout), usecols=columns)
+
+def analyze_range(start_date, end_date, workers=8, chunksize=50000):
+    """Analyse toutes les partitions d'un intervalle de dates en parallèle"""
+    print("="*60)
+    print(f"ANALYSE PARALLÈLE DU {start_date} AU {end_date}")
+    print("="*60)
+    
+    order_files = list_partition_files("/raw/orders", start_date, end_date)
+    stock_files = list_partition_files("/raw/stock", start_date, end_date)
+    print(f"\n   {len(order_files)} fichiers de commandes, {len(stock_files)} fichiers de stock")
+    
+    total = PartialStats()
+    errors = 0
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(aggregate_orders_file, f) for f in order_files]
+        futures += [executor.submit(aggregate_stock_file, f, chunksize) for f in stock_files]
+        
+        for future in as_completed(futures):
+            try:
+                total.merge(future.result())
+            except Exception as e:
+                errors += 1
+                print(f"   ✗ Erreur: {e}")
+    
+    return print_range_report(total, errors, load_products())
+
+def analyze_range_local(start_date, end_date, data_dir, workers=8, stores=None):
+    """Même analyse sur l'arborescence locale data/, lue en parallèle en tables Arrow"""
+    print("="*60)
+    print(f"ANALYSE LOCALE DU {start_date} AU {end_date} ({data_dir})")
+    print("="*60)
+    
+    # Les partitions hors intervalle (et hors magasins demandés) ne sont pas parcourues
+    partition_filter = PartitionFilter(start_date, end_date, stores)
+    order_files = discover(os.path.join(data_dir, "raw_orders"), ORDERS_LAYOUT, partition_filter)
+    stock_files = discover(os.path.join(data_dir, "raw_stock"), STOCK_LAYOUT, partition_filter, ('.csv',))
+    print(f"\n   {len(order_files)} fichiers de commandes, {len(stock_files)} fichiers de stock")
+    
+    total = PartialStats()
+    skipped = []
+    
+    def skip(path, error):
+        # Fichier illisible : ignoré et compté, les autres sont analysés
+        skipped.append(path)
+        print(f"   ✗ Erreur {path}: {error}")
+    
+    for _, table in iter_tables(order_files, workers, ['sku_id', 'quantity'], on_error=skip):
+        total.files += 1
+        total.order_lines += table.num_rows
+        if table.num_rows:
+            by_sku = table.group_by('sku_id').aggregate([('quantity', 'sum')])
+            total.sku_quantity.update(dict(zip(by_sku['sku_id'].to_pylist(),
+                                               by_sku['quantity_sum'].to_pylist())))
+    for _, table in iter_tables(stock_files, workers, ['sku_id', 'available_stock', 'reserved_stock'],
+                                on_error=skip):
+        total.files += 1
+        total.stock_rows += table.num_rows
+        if table.num_rows:
+            by_sku = table.group_by('sku_id').aggregate([('available_stock', 'sum'), ('reserved_stock', 'sum')])
+            skus = by_sku['sku_id'].to_pylist()
+            total.stock_available.update(dict(zip(skus, by_sku['available_stock_sum'].to_pylist())))
+            total.stock_reserved.update(dict(zip(skus, by_sku['reserved_stock_sum'].to_pylist())))
+    
+    return print_range_report(total, len(skipped), load_products(data_dir))
+
+def print_range_report(total, errors, products=None):
+    """Affiche le résultat agrégé d'une analyse sur un intervalle (errors = fichiers ignorés)"""
+    print(f"\n1. Commandes ({total.order_lines} lignes):")
+    print(f"   SKU distincts: {len(total.sku_quantity)}")
+    print(f"   Quantité totale: {sum(total.sku_quantity.values())}")
+    print(f"\n   Quantités par SKU (top 10):")
+    for sku_id, qty in total.sku_quantity.most_common(10):
+        print(f"   {sku_id}  {qty}")
+    
+    print(f"\n2. Stock ({total.stock_rows} lignes):")
+    print(f"   Nombre unique de SKUs: {len(total.stock_available)}")
+    print(f"   Stock total disponible: {sum(total.stock_available.values())}")
+    print(f"   Stock total réservé: {sum(total.stock_reserved.values())}")
+    
+    if products is not None:
+        categories = dict(zip(products['sku_id'], products['category']))
+        demand_by_category = Counter()
+        stock_by_category = Counter()
+        for sku_id, qty in total.sku_quantity.items():
+            demand_by_category[categories.get(sku_id, 'Inconnue')] += qty
+        for sku_id, qty in total.stock_available.items():
+            stock_by_category[categories.get(sku_id, 'Inconnue')] += qty
+        
+        print(f"\n3. Par catégorie:")
+        print(f"   Catégories: {products['category'].nunique()}")
+        print(f"   Pack size distribution: {products['pack_size'].value_counts().to_dict()}")
+        for category in sorted(set(demand_by_category) | set(stock_by_category)):
+            print(f"   {category:<15} demande={demand_by_category[category]:<8} stock={stock_by_category[category]}")
+    
+    print(f"\n   {total.files} fichiers analysés, {errors} erreurs")
+    if errors:
+        print(f"   ⚠️  {errors} fichiers ignorés : totaux partiels")
+    return total
+
 def main():
     """Fonction principale"""
+    parser = argparse.ArgumentParser(description='Analyse des données dans HDFS')
+    parser.add_argument('--start', help='Début de la période (YYYY-MM-DD) pour l\'analyse parallèle')
+    parser.add_argument('--end', help='Fin de la période (défaut: --start)')
+    parser.add_argument('--workers', type=int, default=8, help='Lectures HDFS simultanées')
+    parser.add_argument('--chunksize', type=int, default=50000, help='Lignes par bloc pour les CSV de stock')
+    parser.add_argument('--local', metavar='DATA_DIR', nargs='?', const=str(Config.BASE_LOCAL_DATA),
+                        help='Analyser l\'arborescence locale (défaut: PROCURE_BASE_LOCAL_DATA) au lieu de HDFS')
+    parser.add_argument('--stores', help='Magasins à analyser, séparés par des virgules (avec --local)')
+    args = parser.parse_args()
+    
+    if args.start and args.local:
+        stores = args.stores.split(',') if args.stores else None
+        analyze_range_local(args.start, args.end or args.start, args.local, args.workers, stores)
+        return
+    
+    if args.start:
+        analyze_range(args.start, args.end or args.start, args.workers, args.chunksize)
+        return
+    
     print("="*60)
     print("ANALYSE COMPLÈTE DES DONNÉES DANS HDFS")
     print("="*60)
     
     verify_hdfs_structure()
     analyze_orders()
+    analyze_demand_rollup()
     analyze_stock()
     analyze_master()
     
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+DISPOSITION DES TABLES CASSANDRA PAR DATE
+Calcul des buckets (stable entre processus, contrairement à hash()) et
+génération des écritures doubles vers les tables orientées requêtes
+définies dans create_cassandra_tables.cql.
+"""
+
+import zlib
+
+NUM_BUCKETS = 16
+
+
+def sku_bucket(sku_id):
+    """Bucket d'un SKU dans les partitions (date, bucket)"""
+    return zlib.crc32(sku_id.encode('utf-8')) % NUM_BUCKETS
+
+
+def month_bucket(date):
+    """Partition mensuelle de l'historique fournisseur (YYYY-MM)"""
+    return date[:7]
+
+
+def quote(value):
+    """Échappe une chaîne pour CQL"""
+    return str(value).replace("'", "''")
+
+
+def supplier_order_inserts(order, target_date):
+    """Insertions d'une commande dans la table d'origine et les tables par date/fournisseur"""
+    supplier_id = quote(order['supplier_id'])
+    sku_id = quote(order['sku_id'])
+    order_id = order['order_id']
+    quantity = int(order['order_quantity'])
+    values = f"{order_id}, {quantity}, 'GENERATED', toTimestamp(now())"
+
+    return [
+        f"INSERT INTO procurement.supplier_orders "
+        f"(order_date, supplier_id, sku_id, order_id, quantity, status, generated_at) "
+        f"VALUES ('{target_date}', '{supplier_id}', '{sku_id}', {values});",
+        f"INSERT INTO procurement.supplier_orders_by_date "
+        f"(order_date, bucket, supplier_id, sku_id, order_id, quantity, status, generated_at) "
+        f"VALUES ('{target_date}', {sku_bucket(order['sku_id'])}, '{supplier_id}', '{sku_id}', {values});",
+        f"INSERT INTO procurement.supplier_order_history "
+        f"(supplier_id, month, order_date, sku_id, order_id, quantity, status, generated_at) "
+        f"VALUES ('{supplier_id}', '{month_bucket(target_date)}', '{target_date}', '{sku_id}', {values});",
+    ]
+
+
+def demand_calculation_insert_by_date(target_date, sku_id, demand, available_stock, net_demand,
+                                      final_order_quantity):
+    """Insertion d'un calcul de demande dans la table par date"""
+    return (
+        f"INSERT INTO procurement.demand_calculations_by_date "
+        f"(calculation_date, bucket, sku_id, total_demand, available_stock, net_demand, "
+        f"final_order_quantity, calculated_at) "
+        f"VALUES ('{target_date}', {sku_bucket(sku_id)}, '{quote(sku_id)}', {demand}, {available_stock}, "
+        f"{net_demand}, {final_order_quantity}, toTimestamp(now()));"
+    )
+
+
+def logged_batch(statements):
+    """Regroupe les écritures doubles dans un batch journalisé (tout ou rien)"""
+    return "BEGIN BATCH\n" + "\n".join(statements) + "\nAPPLY BATCH;"
+
+
+def date_read_queries(target_date, table="supplier_orders_by_date", date_column="order_date", columns="*"):
+    """Requêtes lisant toute une date : une par bucket, chacune sur une seule partition"""
+    return [
+        f"SELECT {columns} FROM procurement.{table} WHERE {date_column} = '{target_date}' AND bucket = {bucket};"
+        for bucket in range(NUM_BUCKETS)
+    ]
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+RÉCONCILIATION CASSANDRA PAR PARTITION
+La clé de partition de supplier_orders est (supplier_id, order_date) : un
+COUNT(*) filtré sur order_date seul impose un scan complet. Ici on énumère
+les partitions attendues à partir de l'archive Parquet des commandes (les
+fichiers fournisseurs ne servent que si l'archive n'a pas la date), on lit
+chacune directement (en parallèle) et on compare ligne à ligne.
+Avec by_date, la table d'écriture double supplier_orders_by_date est aussi
+contrôlée, lue bucket par bucket (une partition par requête).
+"""
+
+import argparse
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+import subprocess
+
+from cassandra_layout import date_read_queries
+from order_archive import OrderArchive
+from settings import Config
+
+PARTITION_QUERY = ("SELECT JSON sku_id, quantity FROM procurement.supplier_orders "
+                   "WHERE supplier_id = '{supplier_id}' AND order_date = '{order_date}'")
+
+
+def expected_partitions(output_dir, target_date, archive=None):
+    """Lignes attendues par fournisseur : archive Parquet, sinon fichiers supplier_*_{date}.json"""
+    partitions = {}
+    if archive is not None:
+        for order in archive.orders(target_date):
+            partitions.setdefault(order['supplier_id'], {})[order['sku_id']] = int(order['order_quantity'])
+    if partitions:
+        return partitions
+
+    for path in sorted(Path(output_dir).glob(f"supplier_*_{target_date}.json")):
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        partitions[data['supplier_id']] = {item['sku_id']: int(item['order_quantity'])
+                                           for item in data.get('items', [])}
+    return partitions
+
+
+def read_partition_cqlsh(supplier_id, order_date):
+    """Lit une partition via cqlsh (une lecture ciblée par clé de partition)"""
+    query = PARTITION_QUERY.format(supplier_id=supplier_id.replace("'", "''"), order_date=order_date)
+    cmd = ['docker-compose', 'exec', '-T', 'cassandra', 'cqlsh', '-e', query]
+    result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip()[:200])
+
+    rows = {}
+    for line in result.stdout.splitlines():
+        line = line.strip()
+        if line.startswith('{'):
+            row = json.loads(line)
+            rows[row['sku_id']] = int(row['quantity'])
+    return rows
+
+
+def read_date_buckets_cqlsh(target_date):
+    """Lignes de supplier_orders_by_date pour une date, par fournisseur (une session cqlsh)"""
+    queries = date_read_queries(target_date, columns="JSON supplier_id, sku_id, quantity")
+    cmd = ['docker-compose', 'exec', '-T', 'cassandra', 'cqlsh', '-e', " ".join(queries)]
+    result = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip()[:200])
+
+    partitions = {}
+    for line in result.stdout.splitlines():
+        line = line.strip()
+        if line.startswith('{'):
+            row = json.loads(line)
+            partitions.setdefault(row['supplier_id'], {})[row['sku_id']] = int(row['quantity'])
+    return partitions
+
+
+def reconcile_by_date(target_date, expected):
+    """Compare la table par date (buckets) aux lignes attendues, fournisseur par fournisseur"""
+    try:
+        found = read_date_buckets_cqlsh(target_date)
+    except Exception as e:
+        print(f"    ✗ supplier_orders_by_date: erreur de lecture ({str(e)[:200]})")
+        return {'error': str(e)[:200], 'ok': False}
+
+    suppliers = {supplier_id: compare_partition(expected.get(supplier_id, {}), found.get(supplier_id, {}))
+                 for supplier_id in set(expected) | set(found)}
+    ok = all(p['ok'] for p in suppliers.values())
+    print(f"    {'✓' if ok else '✗'} supplier_orders_by_date: "
+          f"{sum(p['found'] for p in suppliers.values())}/{sum(p['expected'] for p in suppliers.values())} lignes, "
+          f"{sum(1 for p in suppliers.values() if not p['ok'])} fournisseur(s) en écart")
+    return {'suppliers': suppliers, 'ok': ok}
+
+
+def read_partitions_driver(keys, host, workers):
+    """Lit toutes les partitions avec le driver Cassandra (requêtes concurrentes)"""
+    from cassandra.cluster import Cluster
+    from cassandra.concurrent import execute_concurrent_with_args
+
+    cluster = Cluster([host])
+    try:
+        session = cluster.connect('procurement')
+        statement = session.prepare(
+            "SELECT sku_id, quantity FROM supplier_orders WHERE supplier_id = ? AND order_date = ?")
+        results = execute_concurrent_with_args(session, statement, keys, concurrency=workers,
+                                               raise_on_first_error=False)
+        partitions = {}
+        for (supplier_id, _), (success, rows) in zip(keys, results):
+            if success:
+                partitions[supplier_id] = {row.sku_id: row.quantity for row in rows}
+            else:
+                partitions[supplier_id] = rows  # exception
+        return partitions
+    finally:
+        cluster.shutdown()
+
+
+def compare_partition(expected, found):
+    """Compare les lignes attendues et lues pour une partition"""
+    missing = sorted(set(expected) - set(found))
+    extra = sorted(set(found) - set(expected))
+    mismatched = sorted(sku for sku in set(expected) & set(found) if expected[sku] != found[sku])
+    return {
+        'expected': len(expected),
+        'found': len(found),
+        'missing': missing,
+        'extra': extra,
+        'quantity_mismatch': mismatched,
+        'ok': not (missing or extra or mismatched)
+    }
+
+
+def reconcile(target_date, output_dir=None, use_driver=False,
+              host="localhost", workers=16, archive=None, by_date=False):
+    """Réconcilie toutes les partitions (supplier_id, date) d'une exécution"""
+    print(f"\n    Réconciliation Cassandra pour {target_date}...")
+
+    expected = expected_partitions(output_dir or Config.OUTPUT_DIR, target_date, archive)
+    if not expected:
+        print(f"    Aucune commande fournisseur (fichiers ou archive) pour {target_date}")
+        return None
+
+    keys = [(supplier_id, target_date) for supplier_id in expected]
+
+    if use_driver:
+        found = read_partitions_driver(keys, host, workers)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {supplier_id: executor.submit(read_partition_cqlsh, supplier_id, target_date)
+                       for supplier_id, _ in keys}
+        found = {}
+        for supplier_id, future in futures.items():
+            try:
+                found[supplier_id] = future.result()
+            except Exception as e:
+                found[supplier_id] = e
+
+    partitions = {}
+    for supplier_id, rows in expected.items():
+        result = found.get(supplier_id)
+        if isinstance(result, Exception):
+            partitions[supplier_id] = {'expected': len(rows), 'error': str(result)[:200], 'ok': False}
+        else:
+            partitions[supplier_id] = compare_partition(rows, result or {})
+
+    report = {
+        'date': target_date,
+        'timestamp': datetime.now().isoformat(),
+        'partitions_checked': len(partitions),
+        'partitions_ok': sum(1 for p in partitions.values() if p['ok']),
+        'rows_expected': sum(p['expected'] for p in partitions.values()),
+        'rows_found': sum(p.get('found', 0) for p in partitions.values()),
+        'partitions': partitions
+    }
+    if by_date:
+        report['by_date'] = reconcile_by_date(target_date, expected)
+
+    for supplier_id, p in partitions.items():
+        if 'error' in p:
+            print(f"    ✗ {supplier_id}: erreur de lecture ({p['error']})")
+        elif not p['ok']:
+            print(f"    ✗ {supplier_id}: {p['found']}/{p['expected']} lignes, "
+                  f"{len(p['missing'])} manquantes, {len(p['extra'])} en trop, "
+                  f"{len(p['quantity_mismatch'])} quantités différentes")
+    print(f"    📊 {report['partitions_ok']}/{report['partitions_checked']} partitions conformes, "
+          f"{report['rows_found']}/{report['rows_expected']} lignes")
+    return report
+
+
+def save_report(report, report_dir=None):
+    """Écrit le rapport de réconciliation en JSON"""
+    report_dir = Path(report_dir or Config.CASSANDRA_CHECKS_DIR)
+    report_dir.mkdir(parents=True, exist_ok=True)
+    path = report_dir / f"reconciliation_{report['date']}.json"
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    return path
+
+
+def main():
+    """Fonction principale"""
+    parser = argparse.ArgumentParser(description='Réconciliation Cassandra / fichiers fournisseurs par partition')
+    parser.add_argument('--date', required=True, help='Date à vérifier (YYYY-MM-DD)')
+    parser.add_argument('--output-dir', default=str(Config.OUTPUT_DIR), help='Répertoire des fichiers fournisseurs')
+    parser.add_argument('--driver', action='store_true', help='Utiliser cassandra-driver au lieu de cqlsh')
+    parser.add_argument('--host', default='localhost', help='Hôte Cassandra (avec --driver)')
+    parser.add_argument('--workers', type=int, default=16, help='Lectures simultanées')
+    parser.add_argument('--archive-root', default=str(Config.ORDER_ARCHIVE_DIR), help='Archive Parquet des commandes (lue avant les fichiers)')
+    parser.add_argument('--by-date', action='store_true',
+                        help='Contrôler aussi supplier_orders_by_date (écriture double, lecture par bucket)')
+    args = parser.parse_args()
+
+    report = reconcile(args.date, args.output_dir, args.driver, args.host, args.workers,
+                       OrderArchive(args.archive_root), args.by_date)
+    if report is None:
+        exit(1)
+    print(f"    Rapport: {save_report(report)}")
+    ok = report['partitions_ok'] == report['partitions_checked']
+    exit(0 if ok and report.get('by_date', {'ok': True})['ok'] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,83 @@
-import json,sys
-p=r'c:\Users\admin\Desktop\procurement_pipeline\data\raw_orders\date=2025-12-02\store_id=ST0002\orders_fixed.json'
-with open(p,encoding='utf-8') as f:
-    for i,line in enumerate(f,1):
-        try:
-            json.loads(line)
-        except Exception as e:
-            print(i, e)
-            sys.exit(0)
-print('all good')
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from raw_dataset import ORDERS_LAYOUT, PartitionFilter, discover, iter_records
+from settings import Config
+
+
+def is_json_array(path):
+    """Vrai si le fichier est un tableau JSON (premier caractère non blanc '['), comme iter_records"""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            stripped = line.lstrip()
+            if stripped:
+                return stripped.startswith('[')
+    return False
+
+
+def check_file(path):
+    """
+    Première erreur d'un fichier de commandes : (ligne, erreur) en JSON lines,
+    (enregistrement, erreur) pour un tableau JSON (format du générateur), ou None
+    """
+    if is_json_array(path):
+        count = 0
+        last = ''
+
+        def lines(f):
+            nonlocal last
+            for line in f:
+                if line.strip():
+                    last = line
+                yield line
+
+        with open(path, encoding='utf-8') as f:
+            try:
+                for count, _ in enumerate(iter_records(lines(f)), 1):
+                    pass
+            except ValueError as e:
+                return f"enregistrement {count + 1}", str(e)
+        if not last.rstrip().endswith(']'):
+            return f"enregistrement {count + 1}", "tableau JSON non fermé"
+        return None
+
+    with open(path, encoding='utf-8') as f:
+        for i, line in enumerate(f, 1):
+            try:
+                json.loads(line)
+            except Exception as e:
+                return i, str(e)
+    return None
+
+
+def main():
+    """Fonction principale"""
+    parser = argparse.ArgumentParser(description='Vérifie que les fichiers de commandes (JSON lines ou tableau JSON) sont valides')
+    parser.add_argument('paths', nargs='*', help='Fichiers à vérifier (défaut: partitions de --root)')
+    parser.add_argument('--root', default=str(Config.BASE_LOCAL_DATA / "raw_orders"), help='Racine raw_orders')
+    parser.add_argument('--date', help='Limiter à une date (YYYY-MM-DD)')
+    parser.add_argument('--store', help='Limiter à un magasin (ex: ST0002)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Processus de vérification')
+    args = parser.parse_args()
+
+    paths = args.paths or [path for path, _ in discover(
+        args.root, ORDERS_LAYOUT, PartitionFilter(args.date, args.date, [args.store] if args.store else None))]
+    if not paths:
+        print('no file')
+        sys.exit(1)
+
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as executor:
+        errors = [(p, e) for p, e in zip(paths, executor.map(check_file, paths)) if e]
+
+    for path, (line, error) in errors:
+        print(path, line, error)
+    if errors:
+        sys.exit(1)
+    print(f'all good ({len(paths)} files)')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+POINTS DE REPRISE PAR DATE
+Un répertoire local par date (checkpoints/date=YYYY-MM-DD/) conserve la
+sortie de chaque étape du pipeline : données d'entrée en Parquet, commandes
+calculées, fichiers fournisseurs et insertions Cassandra déjà faits.
+Chaque exécution enregistre ses points de reprise ; seule une relance
+explicite (resume) les réutilise, et seulement si elle a les mêmes
+paramètres de calcul. Sinon ils sont effacés et tout est recalculé.
+"""
+
+import json
+import shutil
+from datetime import datetime
+from pathlib import Path
+
+from settings import Config
+from trino_stream import ColumnResult
+
+
+class CheckpointStore:
+    """Étapes terminées et sorties intermédiaires d'une exécution"""
+
+    def __init__(self, target_date, root=None, params=None):
+        # params: paramètres de calcul (options du pipeline) ayant produit les sorties
+        self.target_date = target_date
+        self.params = params or {}
+        self.dir = Path(root or Config.CHECKPOINT_DIR) / f"date={target_date}"
+        self.manifest_path = self.dir / "manifest.json"
+        self.manifest = {'date': target_date, 'params': self.params, 'stages': {}}
+        if self.manifest_path.exists():
+            with open(self.manifest_path, encoding='utf-8') as f:
+                self.manifest = json.load(f)
+
+    def reset(self):
+        """Efface tous les points de reprise de la date"""
+        if self.dir.exists():
+            shutil.rmtree(self.dir)
+        self.manifest = {'date': self.target_date, 'params': self.params, 'stages': {}}
+
+    def start(self, resume=False):
+        """
+        Prépare une exécution : repart de zéro, sauf reprise demandée avec les
+        mêmes paramètres que l'exécution interrompue.
+        """
+        if not resume:
+            self.reset()
+        elif self.manifest['stages'] and self.manifest.get('params') != self.params:
+            print(" Paramètres différents de l'exécution interrompue : points de reprise effacés")
+            self.reset()
+        elif self.manifest['stages']:
+            print(f" Reprise: étapes déjà terminées {', '.join(self.manifest['stages'])}")
+        return self
+
+    def _write_manifest(self):
+        self.dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.manifest_path.with_suffix('.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=2)
+        tmp.replace(self.manifest_path)  # écriture atomique
+
+    def is_done(self, stage):
+        """L'étape a-t-elle déjà été menée à terme ?"""
+        return stage in self.manifest['stages']
+
+    def mark_done(self, stage, **info):
+        """Enregistre la fin d'une étape"""
+        self.manifest['stages'][stage] = dict(info, completed_at=datetime.now().isoformat())
+        self._write_manifest()
+        print(f"   ✓ Point de reprise: {stage}")
+
+    # ---------- Sorties tabulaires (Parquet) ----------
+    def save_rows(self, name, rows):
+        """Écrit un résultat en colonnes (ColumnResult) ou une liste de dictionnaires en Parquet"""
+        import pyarrow.parquet as pq
+
+        self.dir.mkdir(parents=True, exist_ok=True)
+        pq.write_table(ColumnResult.of(rows).to_arrow(), self.dir / f"{name}.parquet")
+
+    def load_rows(self, name):
+        """Relit un fichier Parquet en colonnes (ColumnResult)"""
+        import pyarrow.parquet as pq
+
+        return ColumnResult.from_arrow(pq.read_table(self.dir / f"{name}.parquet"))
+
+    # ---------- Sorties JSON (structures imbriquées) ----------
+    def save_json(self, name, data):
+        """Écrit une sortie JSON (ex: commandes avec calculation_details)"""
+        self.dir.mkdir(parents=True, exist_ok=True)
+        with open(self.dir / f"{name}.json", 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+
+    def load_json(self, name):
+        """Relit une sortie JSON"""
+        with open(self.dir / f"{name}.json", encoding='utf-8') as f:
+            return json.load(f)
+
+    # ---------- Progression élément par élément ----------
+    def done_items(self, stage):
+        """Clés déjà traitées pour une étape (fichiers, insertions...)"""
+        path = self.dir / f"{stage}.done"
+        if not path.exists():
+            return set()
+        with open(path, encoding='utf-8') as f:
+            return {line.strip() for line in f if line.strip()}
+
+    def mark_item(self, stage, key):
+        """Ajoute une clé traitée (journal en ajout seul, une ligne par clé)"""
+        self.dir.mkdir(parents=True, exist_ok=True)
+        with open(self.dir / f"{stage}.done", 'a', encoding='utf-8') as f:
+            f.write(f"{key}\n")
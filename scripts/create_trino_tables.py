@@ -1,5 +1,11 @@
 import subprocess
 import time
+import argparse
+
+from demand_rollup import create_table_sql as create_demand_daily_sql, create_stream_table_sql
+from stock_state import create_tables_sql as create_stock_state_sql
+from ingest_validation import create_table_sql as create_quarantine_sql
+from materialized_views import create_tables_sql as create_materialized_sql, primary_suppliers_sql
 
 def run_trino_command(sql_command):
     """Exécute une commande SQL dans Trino"""
@@ -19,6 +25,57 @@ def run_trino_command(sql_command):
             print(f"   ✅ Succès")
         return True, result.stdout
 
+class TrinoBatch:
+    """Accumule les instructions SQL et les exécute dans une seule session CLI"""
+    
+    def __init__(self):
+        self.statements = []
+    
+    def add(self, sql_command):
+        """Ajoute une instruction au script"""
+        self.statements.append(sql_command.strip().rstrip(';'))
+    
+    def script(self):
+        """Script SQL complet (une instruction par ligne terminée par ;)"""
+        return "".join(f"{statement};\n" for statement in self.statements)
+    
+    def run(self):
+        """Envoie le script sur l'entrée standard d'un unique CLI Trino"""
+        print(f"\n>>> Session Trino unique: {len(self.statements)} instructions")
+        
+        cmd = ['docker-compose', 'exec', '-T', 'trino', 'trino', '--catalog', 'hive', '--ignore-errors']
+        result = subprocess.run(cmd, input=self.script(), capture_output=True, text=True)
+        
+        if result.stdout.strip():
+            print(result.stdout.strip())
+        errors = [line for line in result.stderr.splitlines() if 'Query' in line and 'failed' in line]
+        for line in errors:
+            print(f"   ❌ {line}")
+        
+        if result.returncode != 0 or errors:
+            print(f"   ❌ {len(errors)} instruction(s) en erreur")
+            return False
+        print(f"   ✅ Succès")
+        return True
+
+class TrinoDirect:
+    """Même interface que TrinoBatch, une invocation du CLI par instruction (--one-by-one)"""
+    
+    def __init__(self):
+        self.failures = 0
+    
+    def add(self, sql_command):
+        """Exécute l'instruction immédiatement"""
+        success, _ = run_trino_command(sql_command.strip().rstrip(';'))
+        if not success:
+            self.failures += 1
+    
+    def run(self):
+        """Bilan des instructions déjà exécutées"""
+        if self.failures:
+            print(f"   ❌ {self.failures} instruction(s) en erreur")
+        return self.failures == 0
+
 def setup_hive_schema():
     """Configure le schéma Hive"""
     print("="*70)
@@ -36,8 +93,9 @@ def setup_hive_schema():
     
     return "procurement"
 
-def create_external_tables(schema_name):
+def create_external_tables(schema_name, batch=None):
     """Crée les tables externes"""
+    execute = batch.add if batch else run_trino_command
     print(f"\n" + "="*70)
     print(f"CRÉATION DES TABLES DANS LE SCHÉMA {schema_name}")
     print("="*70)
@@ -59,7 +117,7 @@ def create_external_tables(schema_name):
         external_location = 'hdfs://namenode:9000/raw/master/products.csv'
     )
     """
-    run_trino_command(create_products)
+    execute(create_products)
     
     # 2. Table des fournisseurs
     print("\n2. Table 'suppliers'...")
@@ -74,7 +132,7 @@ def create_external_tables(schema_name):
         external_location = 'hdfs://namenode:9000/raw/master/suppliers.csv'
     )
     """
-    run_trino_command(create_suppliers)
+    execute(create_suppliers)
     
     # 3. Table product_supplier
     print("\n3. Table 'product_supplier'...")
@@ -91,7 +149,7 @@ def create_external_tables(schema_name):
         external_location = 'hdfs://namenode:9000/raw/master/product_supplier.csv'
     )
     """
-    run_trino_command(create_product_supplier)
+    execute(create_product_supplier)
     
     # 4. Table safety_stock
     print("\n4. Table 'safety_stock'...")
@@ -107,10 +165,12 @@ def create_external_tables(schema_name):
         external_location = 'hdfs://namenode:9000/raw/master/safety_stock.csv'
     )
     """
-    run_trino_command(create_safety_stock)
+    execute(create_safety_stock)
     
     # 5. Table des commandes (JSON - nécessite un traitement spécial)
-    print("\n5. Table 'orders_raw' (JSON brut)...")
+    # date et store_id sont des colonnes de partition (date=.../store_id=...)
+    # pour que WHERE date = ... n'ouvre que les répertoires concernés
+    print("\n5. Table 'orders_raw' (JSON brut, partitionnée)...")
     create_orders_raw = f"""
     CREATE TABLE IF NOT EXISTS hive.{schema_name}.orders_raw (
         order_id VARCHAR,
@@ -122,40 +182,64 @@ def create_external_tables(schema_name):
     )
     WITH (
         format = 'JSON',
+        partitioned_by = ARRAY['date', 'store_id'],
         external_location = 'hdfs://namenode:9000/raw/orders/'
     )
     """
-    run_trino_command(create_orders_raw)
+    execute(create_orders_raw)
     
-    # 6. Table du stock (CSV brut)
-    print("\n6. Table 'stock_raw'...")
+    # 6. Table du stock (CSV brut, partitionnée par date)
+    print("\n6. Table 'stock_raw' (partitionnée)...")
     create_stock_raw = f"""
     CREATE TABLE IF NOT EXISTS hive.{schema_name}.stock_raw (
         snapshot_date VARCHAR,
         warehouse_id VARCHAR,
         sku_id VARCHAR,
         available_stock INTEGER,
-        reserved_stock INTEGER
+        reserved_stock INTEGER,
+        date VARCHAR
     )
     WITH (
         format = 'CSV',
         skip_header_line_count = 1,
+        partitioned_by = ARRAY['date'],
         external_location = 'hdfs://namenode:9000/raw/stock/'
     )
     """
-    run_trino_command(create_stock_raw)
+    execute(create_stock_raw)
+    
+    # Enregistrer les partitions déjà présentes dans HDFS
+    execute(f"CALL hive.system.sync_partition_metadata('{schema_name}', 'orders_raw', 'FULL')")
+    execute(f"CALL hive.system.sync_partition_metadata('{schema_name}', 'stock_raw', 'FULL')")
+    
+    # 7. Rollup de la demande journalière (alimenté par le pipeline) et agrégats des micro-lots
+    print("\n7. Tables 'demand_daily' (rollup) et 'demand_stream' (micro-lots)...")
+    execute(create_demand_daily_sql(schema_name))
+    execute(create_stream_table_sql(schema_name))
+    execute(f"CALL hive.system.sync_partition_metadata('{schema_name}', 'demand_stream', 'FULL')")
+    
+    # 8. Variations de stock et état compacté (mode deltas)
+    print("\n8. Tables 'stock_delta_raw' et 'stock_current'...")
+    for statement in create_stock_state_sql(schema_name):
+        execute(statement)
+    execute(f"CALL hive.system.sync_partition_metadata('{schema_name}', 'stock_delta_raw', 'FULL')")
+    
+    # 9. Quarantaine des lignes rejetées à l'ingestion
+    print("\n9. Table 'ingest_quarantine'...")
+    execute(create_quarantine_sql(schema_name))
     
     return schema_name
 
-def test_tables(schema_name):
+def test_tables(schema_name, batch=None):
     """Teste les tables créées"""
+    execute = batch.add if batch else run_trino_command
     print(f"\n" + "="*70)
     print(f"TESTS DES TABLES DANS {schema_name}")
     print("="*70)
     
     # 1. Lister toutes les tables
     print("\n1. Liste des tables créées:")
-    run_trino_command(f"SHOW TABLES FROM hive.{schema_name}")
+    execute(f"SHOW TABLES FROM hive.{schema_name}")
     
     # 2. Tester chaque table
     test_queries = [
@@ -164,26 +248,33 @@ def test_tables(schema_name):
         ("product_supplier", f"SELECT COUNT(*) as nb_liens FROM hive.{schema_name}.product_supplier"),
         ("safety_stock", f"SELECT COUNT(*) as nb_stock_securite FROM hive.{schema_name}.safety_stock"),
         ("orders_raw", f"SELECT COUNT(*) as nb_commandes FROM hive.{schema_name}.orders_raw WHERE date = '2025-12-02' AND store_id = 'ST0000'"),
-        ("stock_raw", f"SELECT COUNT(*) as nb_stock FROM hive.{schema_name}.stock_raw WHERE snapshot_date = '2025-12-02'")
+        ("stock_raw", f"SELECT COUNT(*) as nb_stock FROM hive.{schema_name}.stock_raw WHERE date = '2025-12-02'"),
+        ("demand_daily", f"SELECT COUNT(*) as nb_lignes_rollup FROM hive.{schema_name}.demand_daily WHERE date = '2025-12-02'")
     ]
     
     for table_name, query in test_queries:
         print(f"\n2. Test table '{table_name}':")
-        run_trino_command(query)
+        execute(query)
     
     # 3. Aperçu des données
     print("\n3. Aperçu des données:")
-    run_trino_command(f"SELECT * FROM hive.{schema_name}.products LIMIT 3")
-    run_trino_command(f"SELECT * FROM hive.{schema_name}.orders_raw WHERE date = '2025-12-02' AND store_id = 'ST0000' LIMIT 3")
+    execute(f"SELECT * FROM hive.{schema_name}.products LIMIT 3")
+    execute(f"SELECT * FROM hive.{schema_name}.orders_raw WHERE date = '2025-12-02' AND store_id = 'ST0000' LIMIT 3")
 
-def create_analysis_views(schema_name):
+def create_analysis_views(schema_name, batch=None, with_tests=True):
     """Crée des vues pour l'analyse"""
+    execute = batch.add if batch else run_trino_command
     print(f"\n" + "="*70)
     print(f"CRÉATION DES VUES D'ANALYSE")
     print("="*70)
     
-    # 1. Vue pour les commandes nettoyées
-    print("\n1. Vue 'orders_clean'...")
+    # 1. Tables matérialisées (partitions remplies par le pipeline)
+    print("\n1. Tables matérialisées...")
+    for statement in create_materialized_sql(schema_name) + primary_suppliers_sql(schema_name):
+        execute(statement)
+    
+    # 2. Vue pour les commandes nettoyées (lignes validées, déjà typées)
+    print("\n2. Vue 'orders_clean'...")
     view_orders = f"""
     CREATE OR REPLACE VIEW hive.{schema_name}.orders_clean AS
     SELECT 
@@ -191,17 +282,14 @@ def create_analysis_views(schema_name):
         store_id,
         sku_id,
         quantity,
-        CAST(order_timestamp AS TIMESTAMP) as order_timestamp,
+        order_timestamp,
         date as order_date
-    FROM hive.{schema_name}.orders_raw
-    WHERE date IS NOT NULL 
-      AND store_id IS NOT NULL 
-      AND sku_id IS NOT NULL
+    FROM hive.{schema_name}.orders_clean_daily
     """
-    run_trino_command(view_orders)
+    execute(view_orders)
     
-    # 2. Vue pour le stock nettoyé
-    print("\n2. Vue 'stock_clean'...")
+    # 3. Vue pour le stock nettoyé
+    print("\n3. Vue 'stock_clean'...")
     view_stock = f"""
     CREATE OR REPLACE VIEW hive.{schema_name}.stock_clean AS
     SELECT 
@@ -209,70 +297,71 @@ def create_analysis_views(schema_name):
         sku_id,
         available_stock,
         reserved_stock,
-        CAST(snapshot_date AS DATE) as stock_date
-    FROM hive.{schema_name}.stock_raw
-    WHERE snapshot_date IS NOT NULL 
-      AND sku_id IS NOT NULL
+        stock_date
+    FROM hive.{schema_name}.stock_clean_daily
     """
-    run_trino_command(view_stock)
+    execute(view_stock)
+    
+    if not with_tests:
+        return
     
-    # 3. Test des vues
-    print("\n3. Test des vues...")
-    run_trino_command(f"SELECT COUNT(*) as nb FROM hive.{schema_name}.orders_clean")
-    run_trino_command(f"SELECT COUNT(*) as nb FROM hive.{schema_name}.stock_clean")
+    # 4. Test des vues
+    print("\n4. Test des vues...")
+    execute(f"SELECT COUNT(*) as nb FROM hive.{schema_name}.orders_clean")
+    execute(f"SELECT COUNT(*) as nb FROM hive.{schema_name}.stock_clean")
 
-def demonstrate_queries(schema_name):
+def demonstrate_queries(schema_name, batch=None):
     """Montre des exemples de requêtes utiles"""
+    execute = batch.add if batch else run_trino_command
     print(f"\n" + "="*70)
     print(f"EXEMPLES DE REQUÊTES UTILES")
     print("="*70)
     
+    # Lecture des tables matérialisées (voir materialized_views.py)
     queries = [
         ("Top 10 produits par quantité vendue", f"""
-        SELECT 
-            p.sku_id,
-            p.product_name,
-            SUM(o.quantity) as total_vendu
-        FROM hive.{schema_name}.orders_clean o
-        JOIN hive.{schema_name}.products p ON o.sku_id = p.sku_id
-        WHERE o.order_date = DATE '2025-12-02'
-        GROUP BY p.sku_id, p.product_name
+        SELECT sku_id, product_name, total_vendu
+        FROM hive.{schema_name}.top_skus_daily
+        WHERE date = '2025-12-02'
         ORDER BY total_vendu DESC
         LIMIT 10
         """),
         
         ("Stock par catégorie", f"""
-        SELECT 
-            p.category,
-            SUM(s.available_stock) as stock_disponible,
-            SUM(s.reserved_stock) as stock_reserve
-        FROM hive.{schema_name}.stock_clean s
-        JOIN hive.{schema_name}.products p ON s.sku_id = p.sku_id
-        WHERE s.stock_date = DATE '2025-12-02'
-        GROUP BY p.category
+        SELECT category, stock_disponible, stock_reserve
+        FROM hive.{schema_name}.stock_by_category_daily
+        WHERE date = '2025-12-02'
         ORDER BY stock_disponible DESC
         """),
         
         ("Fournisseurs principaux par produit", f"""
-        SELECT 
-            p.sku_id,
-            p.product_name,
-            s.supplier_name,
-            ps.lead_time_days
-        FROM hive.{schema_name}.products p
-        JOIN hive.{schema_name}.product_supplier ps ON p.sku_id = ps.sku_id
-        JOIN hive.{schema_name}.suppliers s ON ps.supplier_id = s.supplier_id
-        WHERE ps.is_primary = true
+        SELECT sku_id, product_name, supplier_name, lead_time_days
+        FROM hive.{schema_name}.primary_suppliers
         LIMIT 10
         """)
     ]
     
     for title, query in queries:
         print(f"\n{title}:")
-        run_trino_command(query)
+        execute(query)
+
+def drop_raw_tables(schema_name, batch=None):
+    """Supprime orders_raw/stock_raw (tables externes : les fichiers HDFS restent)"""
+    execute = batch.add if batch else run_trino_command
+    execute(f"DROP TABLE IF EXISTS hive.{schema_name}.orders_raw")
+    execute(f"DROP TABLE IF EXISTS hive.{schema_name}.stock_raw")
 
 def main():
     """Fonction principale"""
+    parser = argparse.ArgumentParser(description='Configuration des tables Trino/Hive')
+    parser.add_argument('--skip-tests', action='store_true',
+                        help='Ne pas exécuter les requêtes de test et de démonstration')
+    parser.add_argument('--one-by-one', action='store_true',
+                        help='Une invocation du CLI Trino par instruction (ancien comportement)')
+    parser.add_argument('--recreate-raw', action='store_true',
+                        help='Recréer orders_raw/stock_raw avec les colonnes de partition')
+    args = parser.parse_args()
+    
     print("="*70)
     print("CONFIGURATION COMPLÈTE TRINO/HIVE")
     print("="*70)
@@ -289,24 +378,38 @@ def main():
     if hdfs_test.returncode != 0:
         print("❌ ERREUR: Fichiers HDFS non accessibles!")
         print("   Vérifiez que les données sont bien dans HDFS")
-        return
+        exit(1)
     
     print("✅ HDFS accessible")
     
-    # Configurer le schéma
+    # Configurer le schéma (exécuté seul : le nom du schéma en dépend)
     schema_name = setup_hive_schema()
     
+    # Tout le reste part dans une seule session Trino
+    batch = TrinoDirect() if args.one_by_one else TrinoBatch()
+    
+    if args.recreate_raw:
+        drop_raw_tables(schema_name, batch)
+    
     # Créer les tables
-    create_external_tables(schema_name)
+    create_external_tables(schema_name, batch)
     
     # Tester
-    test_tables(schema_name)
+    if not args.skip_tests:
+        test_tables(schema_name, batch)
     
     # Créer les vues
-    create_analysis_views(schema_name)
+    create_analysis_views(schema_name, batch, with_tests=not args.skip_tests)
     
     # Montrer des exemples
-    demonstrate_queries(schema_name)
+    if not args.skip_tests:
+        demonstrate_queries(schema_name, batch)
+    
+    if not batch.run():
+        print(f"\n" + "="*70)
+        print("❌ CONFIGURATION INCOMPLÈTE : certaines instructions ont échoué (voir ci-dessus)")
+        print("="*70)
+        exit(1)
     
     print(f"\n" + "="*70)
     print("✅ CONFIGURATION TERMINÉE AVEC SUCCÈS!")
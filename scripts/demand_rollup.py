@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+ROLLUP DE LA DEMANDE JOURNALIÈRE
+Matérialise demand_daily(date, store_id, sku_id, qty, order_count) dans Hive,
+une fois par chargement de partition, pour que les traitements en aval
+lisent quelques milliers de lignes agrégées au lieu des lignes de commande brutes.
+L'ingestion continue (order_stream.py) écrit un fichier d'agrégats par
+micro-lot dans demand_stream (partition date/batch_id, réécrite à
+l'identique par une nouvelle tentative) ; la partition journalière peut
+alors être construite en sommant ces fichiers plutôt que les lignes brutes.
+"""
+
+import argparse
+import subprocess
+
+from query_cache import record_write
+from ingest_validation import clean_sql
+
+SCHEMA = "procurement"
+ROLLUP_TABLE = f"hive.{SCHEMA}.demand_daily"
+STREAM_TABLE = f"hive.{SCHEMA}.demand_stream"
+HDFS_DEMAND_STREAM = "/raw/demand_stream"
+
+
+def create_table_sql(schema_name=SCHEMA):
+    """DDL de la table de rollup (partitionnée par date, colonne de partition en dernier)"""
+    return f"""
+    CREATE TABLE IF NOT EXISTS hive.{schema_name}.demand_daily (
+        store_id VARCHAR,
+        sku_id VARCHAR,
+        qty BIGINT,
+        order_count BIGINT,
+        date VARCHAR
+    )
+    WITH (
+        format = 'ORC',
+        partitioned_by = ARRAY['date']
+    )
+    """
+
+
+def create_stream_table_sql(schema_name=SCHEMA):
+    """DDL des agrégats par micro-lot (JSON, un répertoire date=.../batch_id=... par lot)"""
+    return f"""
+    CREATE TABLE IF NOT EXISTS hive.{schema_name}.demand_stream (
+        store_id VARCHAR,
+        sku_id VARCHAR,
+        qty BIGINT,
+        order_count BIGINT,
+        date VARCHAR,
+        batch_id VARCHAR
+    )
+    WITH (
+        format = 'JSON',
+        partitioned_by = ARRAY['date', 'batch_id'],
+        external_location = 'hdfs://namenode:9000{HDFS_DEMAND_STREAM}/'
+    )
+    """
+
+
+def stream_demand_sql(target_date, schema_name=SCHEMA):
+    """Demande d'une date par magasin et SKU, somme des agrégats des micro-lots"""
+    return f"""
+    SELECT
+        store_id,
+        sku_id,
+        SUM(qty) as qty,
+        SUM(order_count) as order_count,
+        date
+    FROM hive.{schema_name}.demand_stream
+    WHERE date = '{target_date}'
+    GROUP BY date, store_id, sku_id
+    """
+
+
+def refresh_partition_sql(target_date, schema_name=SCHEMA, from_stream=False):
+    """Agrège les commandes valides (ou les micro-lots) d'une date dans la partition correspondante"""
+    if from_stream:
+        return f"""
+    INSERT INTO hive.{schema_name}.demand_daily (store_id, sku_id, qty, order_count, date)
+    {stream_demand_sql(target_date, schema_name)}
+    """
+    return f"""
+    INSERT INTO hive.{schema_name}.demand_daily (store_id, sku_id, qty, order_count, date)
+    SELECT
+        store_id,
+        sku_id,
+        SUM(quantity) as qty,
+        COUNT(*) as order_count,
+        date
+    FROM ({clean_sql('orders', target_date, schema_name)})
+    GROUP BY date, store_id, sku_id
+    """
+
+
+def refresh_demand_rollup(target_date, schema_name=SCHEMA, from_stream=False):
+    """(Re)construit la partition du rollup pour une date (from_stream : depuis demand_stream)"""
+    source = "micro-lots" if from_stream else "commandes valides"
+    print(f"\n Rollup demand_daily pour {target_date} ({source})...")
+
+    # La partition existante est remplacée : le rollup reste idempotent
+    cmd = ['docker-compose', 'exec', '-T', 'trino', 'trino',
+           '--session', 'hive.insert_existing_partitions_behavior=OVERWRITE',
+           '--execute', f"{create_table_sql(schema_name)}; {refresh_partition_sql(target_date, schema_name, from_stream)}"]
+
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
+    except Exception as e:
+        print(f"  Erreur rollup: {e}")
+        return False
+
+    if result.returncode != 0:
+        print(f"  Erreur rollup: {result.stderr.strip()[:300]}")
+        return False
+
+    record_write(ROLLUP_TABLE, target_date)
+    print(" Rollup à jour")
+    return True
+
+
+def main():
+    """Fonction principale"""
+    parser = argparse.ArgumentParser(description='Reconstruit le rollup demand_daily pour une date')
+    parser.add_argument('--date', required=True, help='Date à agréger (YYYY-MM-DD)')
+    parser.add_argument('--from-stream', action='store_true',
+                        help='Sommer les agrégats des micro-lots (demand_stream) au lieu des lignes brutes')
+    args = parser.parse_args()
+
+    exit(0 if refresh_demand_rollup(args.date, from_stream=args.from_stream) else 1)
+
+
+if __name__ == "__main__":
+    main()
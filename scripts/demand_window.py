@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+FENÊTRE GLISSANTE DE DEMANDE
+Maintient par SKU la somme, la somme des carrés et le nombre de jours observés
+sur les N derniers jours, mis à jour incrémentalement à chaque date traitée,
+et en déduit un stock de sécurité dynamique : SS = z * sigma_jour * sqrt(délai).
+Persistance : un fichier par jour (demand_window_days/date=...json) et un
+petit état avec les sommes ; une mise à jour écrit le jour traité et
+supprime le jour sorti de la fenêtre.
+"""
+
+import json
+import math
+from datetime import datetime, timedelta
+from pathlib import Path
+from statistics import NormalDist
+
+from settings import Config
+
+
+class RollingDemandWindow:
+    """Agrégats glissants par SKU, coût O(SKU) par jour quelle que soit la fenêtre"""
+
+    def __init__(self, window_days=28, state_path=None):
+        self.window_days = window_days
+        self.state_path = Path(state_path or Config.DEMAND_WINDOW_STATE)
+        # Un fichier par jour : seuls le jour traité et le jour sorti sont lus ou écrits
+        self.days_dir = self.state_path.with_name(f"{self.state_path.stem}_days")
+        self.sums = {}       # sku -> somme des quantités
+        self.sumsq = {}      # sku -> somme des carrés
+        self.days = {}       # date -> {sku: quantité}, None tant que le fichier du jour n'est pas lu
+        self.newest = None
+        self._written = set()   # jours à écrire à la prochaine sauvegarde
+        self._dropped = set()   # jours sortis de la fenêtre, fichiers à supprimer
+
+    def load(self):
+        """Recharge l'état persistant s'il existe (sommes et liste des jours, pas les jours)"""
+        if self.state_path.exists():
+            with open(self.state_path, encoding='utf-8') as f:
+                state = json.load(f)
+            if state.get('window_days') == self.window_days:
+                self.sums = state['sums']
+                self.sumsq = state['sumsq']
+                self.newest = state['newest']
+                if isinstance(state.get('days'), dict):
+                    # Ancien format : tous les jours dans le fichier d'état
+                    self.days = state['days']
+                    self._written = set(self.days)
+                else:
+                    self.days = dict.fromkeys(state['days'])
+            else:
+                print(f"   Taille de fenêtre modifiée, état {self.state_path} ignoré")
+        return self
+
+    def _day_path(self, date):
+        return self.days_dir / f"date={date}.json"
+
+    def _day(self, date):
+        """Demande d'un jour de la fenêtre, lue depuis son fichier au premier besoin"""
+        if self.days[date] is None:
+            with open(self._day_path(date), encoding='utf-8') as f:
+                self.days[date] = json.load(f)
+        return self.days[date]
+
+    def save(self):
+        """Persiste les jours modifiés, les sommes, puis supprime les jours sortis"""
+        self.days_dir.mkdir(parents=True, exist_ok=True)
+        for date in sorted(self._written & set(self.days)):
+            with open(self._day_path(date), 'w', encoding='utf-8') as f:
+                json.dump(self.days[date], f)
+        # L'état ne référence que des jours déjà écrits
+        tmp = self.state_path.with_suffix('.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({
+                'window_days': self.window_days,
+                'newest': self.newest,
+                'sums': self.sums,
+                'sumsq': self.sumsq,
+                'days': sorted(self.days)
+            }, f)
+        tmp.replace(self.state_path)  # écriture atomique
+        for date in self._dropped - set(self.days):
+            self._day_path(date).unlink(missing_ok=True)
+        self._written = set()
+        self._dropped = set()
+
+    def _apply(self, values, sign):
+        for sku, qty in values.items():
+            self.sums[sku] = self.sums.get(sku, 0) + sign * qty
+            self.sumsq[sku] = self.sumsq.get(sku, 0) + sign * qty * qty
+            if self.sums[sku] == 0 and self.sumsq[sku] == 0:
+                del self.sums[sku]
+                del self.sumsq[sku]
+
+    def update(self, date, demand_by_sku):
+        """
+        Ajoute la demande d'une date et retire les jours sortis de la fenêtre.
+        Une date déjà intégrée est remplacée (données tardives ou corrigées) ;
+        retourne False si rien n'a changé.
+        """
+        if self.newest and date <= self._cutoff(self.newest):
+            print(f"   {date} hors fenêtre, ignorée")
+            return False
+
+        values = {sku: int(qty) for sku, qty in demand_by_sku.items() if qty}
+        if date in self.days:
+            if self._day(date) == values:
+                return False  # relance sans changement : idempotent
+            self._apply(self.days[date], -1)
+        self.days[date] = values
+        self._written.add(date)
+        self._apply(values, +1)
+
+        if self.newest is None or date > self.newest:
+            self.newest = date
+            cutoff = self._cutoff(date)
+            for old_date in [d for d in self.days if d <= cutoff]:
+                self._apply(self._day(old_date), -1)
+                del self.days[old_date]
+                self._dropped.add(old_date)
+
+        return True
+
+    def _cutoff(self, date):
+        """Dernière date exclue de la fenêtre se terminant à `date`"""
+        end = datetime.strptime(date, "%Y-%m-%d")
+        return (end - timedelta(days=self.window_days)).strftime("%Y-%m-%d")
+
+    def stats(self, sku_id):
+        """
+        Moyenne et écart-type journaliers sur les jours traités de la fenêtre
+        (un jour traité sans demande du SKU compte pour 0). Le dénominateur est
+        le nombre de jours traités et non window_days : tant que la fenêtre
+        n'est pas pleine, ou si des dates n'ont pas été traitées, la moyenne
+        n'est pas diluée par des jours inconnus.
+        """
+        n = len(self.days)
+        if n == 0:
+            return 0.0, 0.0
+        mean = self.sums.get(sku_id, 0) / n
+        variance = max(0.0, self.sumsq.get(sku_id, 0) / n - mean * mean)
+        return mean, math.sqrt(variance)
+
+    def safety_stock(self, lead_times, service_level=0.95, min_days=7):
+        """
+        Stock de sécurité dynamique par SKU à partir de la variance de la demande
+        sur le délai fournisseur. Vide tant que la fenêtre compte moins de min_days.
+        """
+        if len(self.days) < min_days:
+            return {}
+
+        z = NormalDist().inv_cdf(service_level)
+        result = {}
+        for sku_id in self.sums:
+            _, sigma = self.stats(sku_id)
+            lead_time = max(1, int(lead_times.get(sku_id, 7)))
+            result[sku_id] = int(math.ceil(z * sigma * math.sqrt(lead_time)))
+        return result
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+SESSION D'EXÉCUTION GROUPÉE
+Regroupe plusieurs commandes shell dans un seul script exécuté par un
+unique `docker-compose exec`, et renvoie un statut structuré par opération.
+Une opération peut dépendre d'autres (after=...) : elle n'est lancée que si
+elles ont réussi, sinon elle est marquée non exécutée.
+"""
+
+import argparse
+import subprocess
+import uuid
+
+
+class ExecSession:
+    """Accumule des opérations shell et les exécute en un seul appel"""
+
+    def __init__(self, container="namenode", shell_cmd=None, timeout=600):
+        self.container = container
+        # Le script est envoyé sur l'entrée standard d'un shell unique
+        self.shell_cmd = shell_cmd or ['docker-compose', 'exec', '-T', container, 'sh', '-s']
+        self.timeout = timeout
+        self.operations = []
+        self.marker = f"__OP_{uuid.uuid4().hex[:8]}__"
+
+    @classmethod
+    def local(cls, timeout=600):
+        """Session sur le shell local (remplace le conteneur pour les tests)"""
+        return cls(container="local", shell_cmd=['sh', '-s'], timeout=timeout)
+
+    def add(self, cmd, label=None, after=None):
+        """
+        Ajoute une opération et retourne son index.
+        after : index (ou liste d'index) des opérations qui doivent avoir réussi.
+        """
+        if after is None:
+            after = []
+        elif isinstance(after, int):
+            after = [after]
+        self.operations.append({'label': label or cmd, 'cmd': cmd, 'after': list(after)})
+        return len(self.operations) - 1
+
+    def build_script(self):
+        """Génère le script shell encadrant chaque opération par des marqueurs"""
+        lines = []
+        for i, op in enumerate(self.operations):
+            lines.append(f"echo '{self.marker} BEGIN {i}'")
+            # stdin fermé : une commande ne doit pas consommer la suite du script
+            run = f"{{ {op['cmd']} ; }} < /dev/null 2>&1; rc_{i}=$?; echo \"{self.marker} END {i} $rc_{i}\""
+            if op['after']:
+                guard = " && ".join(f'[ "$rc_{j}" = 0 ]' for j in op['after'])
+                lines.append(f"if {guard}; then {run}; else rc_{i}=skip; echo '{self.marker} SKIP {i}'; fi")
+            else:
+                lines.append(run)
+        return "\n".join(lines) + "\n"
+
+    def parse_output(self, stdout):
+        """Découpe la sortie du script en résultats par opération"""
+        results = [
+            {'label': op['label'], 'cmd': op['cmd'], 'returncode': None, 'output': '', 'skipped': False}
+            for op in self.operations
+        ]
+        current = None
+        buffer = []
+
+        for line in stdout.splitlines():
+            if line.startswith(self.marker):
+                parts = line.split()
+                if parts[1] == 'BEGIN':
+                    current = int(parts[2])
+                    buffer = []
+                elif parts[1] == 'END' and current is not None:
+                    results[current]['returncode'] = int(parts[3])
+                    results[current]['output'] = "\n".join(buffer).strip()
+                    current = None
+                elif parts[1] == 'SKIP':
+                    results[int(parts[2])]['skipped'] = True
+                    current = None
+            elif current is not None:
+                buffer.append(line)
+
+        # Opération interrompue en cours de route (shell tué, timeout...)
+        if current is not None:
+            results[current]['output'] = "\n".join(buffer).strip()
+
+        return results
+
+    def run(self):
+        """Exécute toutes les opérations en un seul aller-retour"""
+        if not self.operations:
+            return []
+
+        print(f"→ [session {self.container}] {len(self.operations)} opérations")
+        script = self.build_script()
+
+        try:
+            result = subprocess.run(self.shell_cmd, input=script, capture_output=True,
+                                    text=True, timeout=self.timeout)
+            results = self.parse_output(result.stdout)
+            if result.returncode != 0 and result.stderr.strip():
+                print(f"  Erreur session: {result.stderr.strip()[:300]}")
+        except Exception as e:
+            print(f"  Erreur session: {e}")
+            results = self.parse_output("")
+
+        self.operations = []
+        return results
+
+    @staticmethod
+    def succeeded(results):
+        """Nombre d'opérations terminées avec le code 0"""
+        return sum(1 for r in results if r['returncode'] == 0)
+
+    @staticmethod
+    def report(results):
+        """Affiche les opérations en échec"""
+        for r in results:
+            if r['skipped']:
+                print(f"  Non exécutée (dépendance en échec): {r['label']}")
+            elif r['returncode'] is None:
+                print(f"  Non exécutée: {r['label']}")
+            elif r['returncode'] != 0:
+                print(f"  Échec ({r['returncode']}): {r['label']}")
+                if r['output']:
+                    print(f"    {r['output'][:300]}")
+
+
+def self_check():
+    """Vérifie le découpage par marqueurs et les codes retour sur le shell local"""
+    session = ExecSession.local(timeout=30)
+    ok = session.add("echo un; echo deux", "sortie multiligne")
+    failed = session.add("(exit 3)", "code retour 3")
+    skipped = session.add("echo jamais", "dépend d'un échec", after=failed)
+    chained = session.add("echo suite", "dépend d'un succès", after=[ok])
+    silent = session.add("true", "sans sortie")
+    results = session.run()
+
+    expected = {
+        ok: (0, "un\ndeux", False),
+        failed: (3, "", False),
+        skipped: (None, "", True),
+        chained: (0, "suite", False),
+        silent: (0, "", False),
+    }
+    errors = 0
+    for index, (returncode, output, was_skipped) in expected.items():
+        r = results[index]
+        if (r['returncode'], r['output'], r['skipped']) != (returncode, output, was_skipped):
+            errors += 1
+            print(f"  ✗ {r['label']}: {r['returncode']!r} {r['output']!r} skipped={r['skipped']}")
+        else:
+            print(f"  ✓ {r['label']}")
+    return errors == 0
+
+
+def main():
+    """Fonction principale"""
+    parser = argparse.ArgumentParser(description='Session d\'exécution groupée')
+    parser.add_argument('--self-check', action='store_true',
+                        help='Vérifier marqueurs, codes retour et dépendances sur le shell local')
+    args = parser.parse_args()
+
+    if args.self_check:
+        exit(0 if self_check() else 1)
+    parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
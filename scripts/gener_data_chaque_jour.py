@@ -1,27 +1,26 @@
-import pandas as pd
-import numpy as np
-from faker import Faker
+import argparse
 from datetime import datetime, timedelta
 import os
 import json
 
+from settings import Config
+
 # =========================
 # CONFIGURATION
 # =========================
-fake = Faker()
-np.random.seed(42)
-
+# pandas, numpy et Faker sont importés à la génération (import du module sans coût)
 NUM_SKUS = 2000
 NUM_STORES = 50
 NUM_WAREHOUSES = 5
 MAX_ORDERS_PER_DAY_PER_STORE = 200
 
-BASE_DIR = "./data"  # dossier de sortie
-
 # =========================
 # DONNÉES MAÎTRES
 # =========================
-def generate_master_data(num_skus):
+def generate_master_data(num_skus, base_dir, fake):
+    import numpy as np
+    import pandas as pd
+
     print("Génération des données maîtres...")
 
     categories = [
@@ -42,7 +41,7 @@ def generate_master_data(num_skus):
             "min_order_quantity": np.random.choice([1, 5, 10, 24])
         })
 
-    master_dir = os.path.join(BASE_DIR, "master")
+    master_dir = os.path.join(base_dir, "master")
     os.makedirs(master_dir, exist_ok=True)
 
     pd.DataFrame(products).to_csv(
@@ -83,7 +82,10 @@ def generate_master_data(num_skus):
 # =========================
 # DONNÉES DU JOUR
 # =========================
-def generate_today_data(date):
+def generate_today_data(date, base_dir, fake):
+    import numpy as np
+    import pandas as pd
+
     print(f"Génération des données pour : {date}")
 
     all_skus = [f"SKU{i:06d}" for i in range(NUM_SKUS)]
@@ -107,7 +109,7 @@ def generate_today_data(date):
                 })
 
         store_dir = os.path.join(
-            BASE_DIR, "raw_orders", f"date={date}", f"store_id={store}"
+            base_dir, "raw_orders", f"date={date}", f"store_id={store}"
         )
         os.makedirs(store_dir, exist_ok=True)
 
@@ -126,7 +128,7 @@ def generate_today_data(date):
                 "reserved_stock": np.random.randint(0, 50)
             })
 
-        wh_dir = os.path.join(BASE_DIR, "raw_stock", f"date={date}")
+        wh_dir = os.path.join(base_dir, "raw_stock", f"date={date}")
         os.makedirs(wh_dir, exist_ok=True)
 
         pd.DataFrame(stock).to_csv(
@@ -139,16 +141,32 @@ def generate_today_data(date):
 # =========================
 # MAIN
 # =========================
-if __name__ == "__main__":
-
-    os.makedirs(BASE_DIR, exist_ok=True)
+def main(argv=None):
+    """Fonction principale"""
+    parser = argparse.ArgumentParser(description='Génération des données maîtres et du jour')
+    parser.add_argument('--date', default=Config.get_today(), help='Date générée (YYYY-MM-DD, défaut: aujourd\'hui)')
+    parser.add_argument('--output', default=str(Config.BASE_LOCAL_DATA), help='Dossier de sortie (défaut: PROCURE_BASE_LOCAL_DATA)')
+    parser.add_argument('--skip-master', action='store_true', help='Ne pas régénérer les données maîtres')
+    parser.add_argument('--seed', type=int, default=42, help='Graine du générateur aléatoire')
+    args = parser.parse_args(argv)
+
+    import numpy as np
+    from faker import Faker
+
+    np.random.seed(args.seed)
+    fake = Faker()
+    os.makedirs(args.output, exist_ok=True)
 
     # Générer les données maîtres (une seule fois)
-    generate_master_data(NUM_SKUS)
+    if not args.skip_master:
+        generate_master_data(NUM_SKUS, args.output, fake)
 
-    # Générer uniquement aujourd'hui
-    today = datetime.now().strftime("%Y-%m-%d")
-    generate_today_data(today)
+    # Générer uniquement la date demandée
+    generate_today_data(args.date, args.output, fake)
 
     print("\n--- FIN ---")
-    print(f"Données disponibles dans : {os.path.abspath(BASE_DIR)}")
+    print(f"Données disponibles dans : {os.path.abspath(args.output)}")
+
+
+if __name__ == "__main__":
+    main()
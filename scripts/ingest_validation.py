@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+VALIDATION DES DONNÉES BRUTES À L'INGESTION
+Une passe SQL par partition contrôle types (TRY_CAST), bornes et intégrité
+référentielle (SKU présents dans products, données maîtres PostgreSQL tenues
+par master_data_sync.py). Les lignes rejetées sont écrites
+avec leur motif dans ingest_quarantine (partition date/source) ; les lectures
+en aval passent par clean_sql, qui applique les mêmes règles et renvoie des
+colonnes déjà typées : plus de conversion ni de valeur par défaut ligne à ligne.
+"""
+
+import argparse
+import subprocess
+
+from trino_stream import iter_trino_rows
+from query_cache import record_write
+
+SCHEMA = "procurement"
+QUARANTINE_TABLE = f"hive.{SCHEMA}.ingest_quarantine"
+# Données maîtres de référence (master_data_sync.py), pas les copies CSV de Hive
+MASTER_SCHEMA = "postgresql.public"
+MAX_ORDER_QUANTITY = 1000
+MAX_STOCK_LEVEL = 1000000
+DEFAULT_SAFETY_STOCK = 10
+
+# Règles évaluées dans l'ordre : le premier motif vérifié est retenu.
+# Les colonnes *_value sont les valeurs converties (NULL si non convertibles),
+# master_sku est NULL si le SKU est absent des données maîtres.
+SOURCES = {
+    'orders': {
+        'table': 'orders_raw',
+        'raw': ['order_id', 'store_id', 'sku_id', 'quantity', 'order_timestamp'],
+        'typed': {'quantity': 'BIGINT'},
+        'rules': [
+            ("order_id manquant", "NULLIF(TRIM(order_id), '') IS NULL"),
+            ("sku_id manquant", "NULLIF(TRIM(sku_id), '') IS NULL"),
+            ("quantité non entière", "quantity_value IS NULL"),
+            ("quantité hors bornes", f"quantity_value NOT BETWEEN 1 AND {MAX_ORDER_QUANTITY}"),
+            ("SKU inconnu", "master_sku IS NULL"),
+        ],
+    },
+    'stock': {
+        'table': 'stock_raw',
+        'raw': ['snapshot_date', 'warehouse_id', 'sku_id', 'available_stock', 'reserved_stock'],
+        'typed': {'available_stock': 'BIGINT', 'reserved_stock': 'BIGINT'},
+        'rules': [
+            ("warehouse_id manquant", "NULLIF(TRIM(warehouse_id), '') IS NULL"),
+            ("sku_id manquant", "NULLIF(TRIM(sku_id), '') IS NULL"),
+            ("stock disponible non entier", "available_stock_value IS NULL"),
+            ("stock réservé non entier", "reserved_stock_value IS NULL"),
+            ("stock hors bornes", f"available_stock_value NOT BETWEEN 0 AND {MAX_STOCK_LEVEL} "
+                                  f"OR reserved_stock_value NOT BETWEEN 0 AND {MAX_STOCK_LEVEL}"),
+            ("SKU inconnu", "master_sku IS NULL"),
+        ],
+    },
+}
+
+
+def create_table_sql(schema_name=SCHEMA):
+    """DDL de la quarantaine : ligne brute (JSON) et motif, par date et source"""
+    return f"""
+    CREATE TABLE IF NOT EXISTS hive.{schema_name}.ingest_quarantine (
+        record VARCHAR,
+        reason VARCHAR,
+        date VARCHAR,
+        source VARCHAR
+    )
+    WITH (
+        format = 'ORC',
+        partitioned_by = ARRAY['date', 'source']
+    )
+    """
+
+
+def checked_sql(source, target_date, schema_name=SCHEMA):
+    """Lignes brutes d'une partition avec valeurs typées et motif de rejet (NULL = valide)"""
+    spec = SOURCES[source]
+    typed = "".join(f",\n            TRY_CAST(r.{column} AS {sql_type}) as {column}_value"
+                    for column, sql_type in spec['typed'].items())
+    reason = "\n".join(f"            WHEN {predicate} THEN '{label}'" for label, predicate in spec['rules'])
+    return f"""
+    SELECT *,
+        CASE
+{reason}
+        END as reason
+    FROM (
+        SELECT
+            {', '.join(f'r.{column}' for column in spec['raw'])}{typed},
+            m.sku_id as master_sku
+        FROM hive.{schema_name}.{spec['table']} r
+        LEFT JOIN {MASTER_SCHEMA}.products m ON r.sku_id = m.sku_id
+        WHERE r.date = '{target_date}'
+    )
+    """
+
+
+def clean_sql(source, target_date, schema_name=SCHEMA):
+    """Lignes valides d'une partition, colonnes numériques déjà converties"""
+    spec = SOURCES[source]
+    columns = [f"{column}_value as {column}" if column in spec['typed'] else column
+               for column in spec['raw']]
+    return f"""
+    SELECT {', '.join(columns)}, '{target_date}' as date
+    FROM ({checked_sql(source, target_date, schema_name)})
+    WHERE reason IS NULL
+    """
+
+
+def with_safety_stock_sql(stock_sql, default=DEFAULT_SAFETY_STOCK):
+    """Ajoute le stock de sécurité (données maîtres par entrepôt et SKU) à une relation de stock"""
+    return f"""
+    SELECT
+        s.warehouse_id,
+        s.sku_id,
+        s.available_stock,
+        s.reserved_stock,
+        COALESCE(CAST(ss.safety_stock_level AS BIGINT), {default}) as safety_stock
+    FROM ({stock_sql}) s
+    LEFT JOIN {MASTER_SCHEMA}.safety_stock ss
+        ON s.warehouse_id = ss.warehouse_id AND s.sku_id = ss.sku_id
+    """
+
+
+def quarantine_sql(source, target_date, schema_name=SCHEMA):
+    """Remplace la partition de quarantaine (date, source) par les rejets de la partition brute"""
+    spec = SOURCES[source]
+    keys = ", ".join(f"'{column}'" for column in spec['raw'])
+    values = ", ".join(f"CAST({column} AS VARCHAR)" for column in spec['raw'])
+    return [
+        f"DELETE FROM hive.{schema_name}.ingest_quarantine "
+        f"WHERE date = '{target_date}' AND source = '{source}'",
+        f"""
+        INSERT INTO hive.{schema_name}.ingest_quarantine (record, reason, date, source)
+        SELECT
+            json_format(CAST(MAP(ARRAY[{keys}], ARRAY[{values}]) AS JSON)),
+            reason,
+            '{target_date}',
+            '{source}'
+        FROM ({checked_sql(source, target_date, schema_name)})
+        WHERE reason IS NOT NULL
+        """
+    ]
+
+
+def quarantine_summary(target_date, schema_name=SCHEMA):
+    """Rejets par source et motif pour une date : {source: {motif: lignes}}"""
+    query = f"""
+    SELECT source, reason, COUNT(*) as rejected
+    FROM hive.{schema_name}.ingest_quarantine
+    WHERE date = '{target_date}'
+    GROUP BY source, reason
+    """
+    summary = {}
+    for row in iter_trino_rows(query, {'rejected': int}):
+        summary.setdefault(row['source'], {})[row['reason']] = row['rejected']
+    return summary
+
+
+def validate_partition(target_date, sources=tuple(SOURCES), schema_name=SCHEMA):
+    """Écrit les rejets de la date en quarantaine et affiche leur répartition par motif"""
+    print(f"\n Validation des partitions brutes du {target_date} ({', '.join(sources)})...")
+
+    statements = [create_table_sql(schema_name)]
+    for source in sources:
+        statements.extend(quarantine_sql(source, target_date, schema_name))
+
+    cmd = ['docker-compose', 'exec', '-T', 'trino', 'trino', '--execute', "; ".join(statements)]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
+    except Exception as e:
+        print(f"  Erreur validation: {e}")
+        return False
+
+    if result.returncode != 0:
+        print(f"  Erreur validation: {result.stderr.strip()[:300]}")
+        return False
+    record_write(QUARANTINE_TABLE, target_date)
+
+    try:
+        summary = quarantine_summary(target_date, schema_name)
+    except Exception as e:
+        print(f"  Erreur lecture de la quarantaine: {e}")
+        return False
+
+    for source in sources:
+        reasons = summary.get(source, {})
+        print(f"   {source}: {sum(reasons.values())} lignes en quarantaine")
+        for reason, count in sorted(reasons.items(), key=lambda item: -item[1]):
+            print(f"     - {reason}: {count}")
+    return summary
+
+
+def main():
+    """Fonction principale"""
+    parser = argparse.ArgumentParser(description='Validation des partitions brutes et mise en quarantaine des rejets')
+    parser.add_argument('--date', required=True, help='Date à valider (YYYY-MM-DD)')
+    parser.add_argument('--source', choices=sorted(SOURCES), action='append',
+                        help='Source à valider (répétable, défaut: toutes)')
+    parser.add_argument('--show', type=int, default=0, metavar='N',
+                        help='Afficher N lignes en quarantaine après validation')
+    args = parser.parse_args()
+
+    sources = tuple(args.source or SOURCES)
+    summary = validate_partition(args.date, sources)
+    if summary is False:
+        exit(1)
+
+    if args.show:
+        query = f"""
+        SELECT source, reason, record FROM {QUARANTINE_TABLE}
+        WHERE date = '{args.date}' LIMIT {args.show}
+        """
+        for row in iter_trino_rows(query):
+            print(f"   [{row['source']}] {row['reason']}: {row['record']}")
+
+
+if __name__ == "__main__":
+    main()
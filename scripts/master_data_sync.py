@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+SYNCHRONISATION DES DONNÉES MAÎTRES POSTGRESQL
+Charge les CSV de generate_master_data dans des tables temporaires avec
+COPY FROM STDIN, puis fusionne chaque table par un unique
+INSERT ... ON CONFLICT DO UPDATE. Rapporte insérés / mis à jour / inchangés.
+Rafraîchit ensuite la vue matérialisée primary_supplier_by_sku
+(sql/03_primary_supplier_index.sql).
+"""
+
+import argparse
+import os
+from pathlib import Path
+
+from query_cache import record_write
+from settings import Config
+
+MIGRATION_FILE = Path(__file__).resolve().parent.parent / "sql" / "03_primary_supplier_index.sql"
+PRIMARY_SUPPLIER_VIEW = "primary_supplier_by_sku"
+
+# Ordre de chargement compatible avec les clés étrangères
+MASTER_TABLES = [
+    {
+        'table': 'suppliers',
+        'file': 'suppliers.csv',
+        'columns': ['supplier_id', 'supplier_name'],
+        'key': ['supplier_id'],
+    },
+    {
+        'table': 'products',
+        'file': 'products.csv',
+        'columns': ['sku_id', 'product_name', 'category', 'unit_price', 'pack_size', 'min_order_quantity'],
+        'key': ['sku_id'],
+    },
+    {
+        'table': 'product_supplier',
+        'file': 'product_supplier.csv',
+        'columns': ['sku_id', 'supplier_id', 'lead_time_days', 'is_primary'],
+        'key': ['sku_id', 'supplier_id'],
+    },
+    {
+        'table': 'safety_stock',
+        'file': 'safety_stock.csv',
+        'columns': ['sku_id', 'warehouse_id', 'safety_stock_level'],
+        'key': ['sku_id', 'warehouse_id'],
+    },
+    {
+        'table': 'supplier_terms',
+        'file': 'supplier_terms.csv',
+        'columns': ['supplier_id', 'min_order_value', 'truck_capacity_units', 'max_trucks'],
+        'key': ['supplier_id'],
+    },
+]
+
+
+def get_connection():
+    """Connexion PostgreSQL à partir des variables d'environnement du docker-compose"""
+    import psycopg2
+
+    return psycopg2.connect(
+        host=os.environ.get('POSTGRES_HOST', 'localhost'),
+        port=int(os.environ.get('POSTGRES_PORT', 5432)),
+        dbname=os.environ.get('POSTGRES_DB', 'procurement_db'),
+        user=os.environ.get('POSTGRES_USER', 'procurement_user'),
+        password=os.environ.get('POSTGRES_PASSWORD', 'procurement_pass'),
+    )
+
+
+def merge_sql(spec):
+    """INSERT ... ON CONFLICT depuis la table temporaire (une seule instruction)"""
+    table = spec['table']
+    columns = ", ".join(spec['columns'])
+    key = ", ".join(spec['key'])
+    updates = [c for c in spec['columns'] if c not in spec['key']]
+    set_clause = ", ".join(f"{c} = EXCLUDED.{c}" for c in updates)
+    current = ", ".join(f"{table}.{c}" for c in updates)
+    incoming = ", ".join(f"EXCLUDED.{c}" for c in updates)
+
+    # DISTINCT ON : une clé en double dans le CSV ferait échouer ON CONFLICT
+    # RETURNING (xmax = 0) : vrai pour une insertion, faux pour une mise à jour
+    return f"""
+        WITH merged AS (
+            INSERT INTO {table} ({columns})
+            SELECT DISTINCT ON ({key}) {columns} FROM stg_{table}
+            ON CONFLICT ({key}) DO UPDATE SET {set_clause}
+            WHERE ({current}) IS DISTINCT FROM ({incoming})
+            RETURNING (xmax = 0) AS inserted
+        )
+        SELECT
+            COUNT(*) FILTER (WHERE inserted),
+            COUNT(*) FILTER (WHERE NOT inserted),
+            (SELECT COUNT(DISTINCT ({key})) FROM stg_{table})
+        FROM merged
+    """
+
+
+def sync_table(cursor, spec, master_dir):
+    """Charge un CSV en staging puis fusionne dans la table réelle"""
+    path = Path(master_dir) / spec['file']
+    if not path.exists():
+        return None
+
+    table = spec['table']
+    columns = ", ".join(spec['columns'])
+    # Colonnes du CSV uniquement : ni id SERIAL (séquence consommée), ni NOT NULL hérités
+    cursor.execute(f"CREATE TEMP TABLE stg_{table} ON COMMIT DROP AS "
+                   f"SELECT {columns} FROM {table} WITH NO DATA")
+
+    # Le CSV est envoyé tel quel au serveur : pas de parsing ligne par ligne en Python
+    with open(path, encoding='utf-8') as f:
+        header = f.readline().strip().split(',')
+        if header != spec['columns']:
+            raise ValueError(f"{spec['file']}: colonnes {header}, attendues {spec['columns']}")
+        cursor.copy_expert(f"COPY stg_{table} ({columns}) FROM STDIN WITH (FORMAT csv)", f)
+
+    cursor.execute(merge_sql(spec))
+    inserted, updated, staged = cursor.fetchone()
+    return {
+        'table': table,
+        'staged': staged,
+        'inserted': inserted,
+        'updated': updated,
+        'unchanged': staged - inserted - updated,
+    }
+
+
+def apply_migration(cursor, path=MIGRATION_FILE):
+    """Applique la migration des index et de la vue (idempotente)"""
+    with open(path, encoding='utf-8') as f:
+        cursor.execute(f.read())
+    print(f"   Migration appliquée: {Path(path).name}")
+
+
+def refresh_primary_supplier_view(cursor):
+    """Rafraîchit la projection fournisseur principal par SKU après un chargement"""
+    cursor.execute("SELECT to_regclass(%s)", (PRIMARY_SUPPLIER_VIEW,))
+    if cursor.fetchone()[0] is None:
+        print(f"   Vue {PRIMARY_SUPPLIER_VIEW} absente (migration non appliquée), ignorée")
+        return False
+    # CONCURRENTLY : les lectures Trino en cours ne sont pas bloquées
+    cursor.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {PRIMARY_SUPPLIER_VIEW}")
+    cursor.execute(f"SELECT COUNT(*) FROM {PRIMARY_SUPPLIER_VIEW}")
+    print(f"   Vue {PRIMARY_SUPPLIER_VIEW} rafraîchie ({cursor.fetchone()[0]} SKU)")
+    return True
+
+
+def sync_master_data(master_dir, migrate=False):
+    """Synchronise toutes les tables maîtres dans une seule transaction"""
+    print("="*70)
+    print(f"SYNCHRONISATION DES DONNÉES MAÎTRES ({master_dir})")
+    print("="*70)
+
+    results = []
+    conn = get_connection()
+    try:
+        with conn:
+            with conn.cursor() as cursor:
+                if migrate:
+                    apply_migration(cursor)
+                for spec in MASTER_TABLES:
+                    result = sync_table(cursor, spec, master_dir)
+                    if result is None:
+                        print(f"   {spec['table']:<18} fichier {spec['file']} absent, ignoré")
+                        continue
+                    results.append(result)
+                    print(f"   {result['table']:<18} {result['staged']:>9} lignes │ "
+                          f"{result['inserted']:>8} insérées │ {result['updated']:>8} mises à jour │ "
+                          f"{result['unchanged']:>8} inchangées")
+                if any(r['inserted'] or r['updated'] for r in results):
+                    refresh_primary_supplier_view(cursor)
+    finally:
+        conn.close()
+
+    # Données maîtres modifiées : résultats en cache lisant ces tables invalidés
+    for result in results:
+        if result['inserted'] or result['updated']:
+            record_write(f"postgresql.public.{result['table']}")
+    if any(r['inserted'] or r['updated'] for r in results):
+        record_write("postgresql.public.primary_supplier_by_sku")
+
+    print("✅ Synchronisation terminée")
+    return results
+
+
+def main():
+    """Fonction principale"""
+    parser = argparse.ArgumentParser(description='Chargement en masse des données maîtres (COPY + fusion)')
+    parser.add_argument('--master-dir', default=str(Config.BASE_LOCAL_DATA / "master"), help='Répertoire des CSV maîtres')
+    parser.add_argument('--migrate', action='store_true',
+                        help='Appliquer sql/03_primary_supplier_index.sql avant le chargement')
+    parser.add_argument('--refresh-only', action='store_true',
+                        help='Rafraîchir primary_supplier_by_sku sans charger de CSV')
+    args = parser.parse_args()
+
+    if args.refresh_only:
+        conn = get_connection()
+        try:
+            with conn:
+                with conn.cursor() as cursor:
+                    refresh_primary_supplier_view(cursor)
+        finally:
+            conn.close()
+        return
+
+    sync_master_data(args.master_dir, args.migrate)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+VUES MATÉRIALISÉES D'ANALYSE
+Écrit les requêtes d'analyse (commandes et stock nettoyés, top SKU, stock par
+catégorie, fournisseurs principaux) dans des tables partitionnées par date.
+Après chaque exécution du pipeline, seule la partition de la date traitée
+est recalculée à partir des lignes validées (ingest_validation.clean_sql) :
+les tableaux de bord et les vues orders_clean/stock_clean ne relisent plus
+le JSON/CSV brut. Chaque table est rafraîchie dans sa propre session Trino,
+l'échec de l'une n'empêche pas les autres.
+"""
+
+import argparse
+import subprocess
+
+from ingest_validation import clean_sql
+from query_cache import record_write
+
+SCHEMA = "procurement"
+
+
+def materialized_tables(schema_name=SCHEMA):
+    """Définitions : nom, DDL, requête de rafraîchissement d'une date"""
+    h = f"hive.{schema_name}"
+    return [
+        {
+            'name': 'orders_clean_daily',
+            'ddl': f"""
+            CREATE TABLE IF NOT EXISTS {h}.orders_clean_daily (
+                order_id VARCHAR,
+                store_id VARCHAR,
+                sku_id VARCHAR,
+                quantity INTEGER,
+                order_timestamp TIMESTAMP,
+                date VARCHAR
+            )
+            WITH (format = 'ORC', partitioned_by = ARRAY['date'])
+            """,
+            # Horodatage ISO 8601 (séparateur 'T') converti une fois ici ;
+            # une valeur illisible donne NULL au lieu de faire échouer la partition
+            'refresh': lambda d: f"""
+            INSERT INTO {h}.orders_clean_daily
+            SELECT order_id, store_id, sku_id, CAST(quantity AS INTEGER),
+                   CAST(TRY(from_iso8601_timestamp(order_timestamp)) AS TIMESTAMP), date
+            FROM ({clean_sql('orders', d, schema_name)})
+            WHERE store_id IS NOT NULL
+            """
+        },
+        {
+            'name': 'stock_clean_daily',
+            'ddl': f"""
+            CREATE TABLE IF NOT EXISTS {h}.stock_clean_daily (
+                warehouse_id VARCHAR,
+                sku_id VARCHAR,
+                available_stock BIGINT,
+                reserved_stock BIGINT,
+                stock_date DATE,
+                date VARCHAR
+            )
+            WITH (format = 'ORC', partitioned_by = ARRAY['date'])
+            """,
+            'refresh': lambda d: f"""
+            INSERT INTO {h}.stock_clean_daily
+            SELECT warehouse_id, sku_id, available_stock, reserved_stock,
+                   COALESCE(TRY_CAST(snapshot_date AS DATE), CAST(date AS DATE)), date
+            FROM ({clean_sql('stock', d, schema_name)})
+            """
+        },
+        {
+            'name': 'top_skus_daily',
+            'ddl': f"""
+            CREATE TABLE IF NOT EXISTS {h}.top_skus_daily (
+                sku_id VARCHAR,
+                product_name VARCHAR,
+                total_vendu BIGINT,
+                date VARCHAR
+            )
+            WITH (format = 'ORC', partitioned_by = ARRAY['date'])
+            """,
+            'refresh': lambda d: f"""
+            INSERT INTO {h}.top_skus_daily
+            SELECT p.sku_id, p.product_name, SUM(dd.qty), dd.date
+            FROM {h}.demand_daily dd
+            JOIN {h}.products p ON dd.sku_id = p.sku_id
+            WHERE dd.date = '{d}'
+            GROUP BY p.sku_id, p.product_name, dd.date
+            """
+        },
+        {
+            'name': 'stock_by_category_daily',
+            'ddl': f"""
+            CREATE TABLE IF NOT EXISTS {h}.stock_by_category_daily (
+                category VARCHAR,
+                stock_disponible BIGINT,
+                stock_reserve BIGINT,
+                date VARCHAR
+            )
+            WITH (format = 'ORC', partitioned_by = ARRAY['date'])
+            """,
+            'refresh': lambda d: f"""
+            INSERT INTO {h}.stock_by_category_daily
+            SELECT p.category, SUM(s.available_stock), SUM(s.reserved_stock), s.date
+            FROM ({clean_sql('stock', d, schema_name)}) s
+            JOIN {h}.products p ON s.sku_id = p.sku_id
+            GROUP BY p.category, s.date
+            """
+        },
+    ]
+
+
+def primary_suppliers_sql(schema_name=SCHEMA):
+    """Fournisseurs principaux : données maîtres, recalculées en entier"""
+    h = f"hive.{schema_name}"
+    return [
+        f"DROP TABLE IF EXISTS {h}.primary_suppliers",
+        f"""
+        CREATE TABLE {h}.primary_suppliers WITH (format = 'ORC') AS
+        SELECT p.sku_id, p.product_name, s.supplier_name, ps.lead_time_days
+        FROM {h}.products p
+        JOIN {h}.product_supplier ps ON p.sku_id = ps.sku_id
+        JOIN {h}.suppliers s ON ps.supplier_id = s.supplier_id
+        WHERE ps.is_primary = true
+        """
+    ]
+
+
+def create_tables_sql(schema_name=SCHEMA):
+    """DDL de toutes les tables matérialisées partitionnées"""
+    return [table['ddl'] for table in materialized_tables(schema_name)]
+
+
+def refresh_sql(target_date, schema_name=SCHEMA, include_master=False):
+    """Scripts de rafraîchissement de la partition d'une date : {table: [instructions]}"""
+    scripts = {table['name']: [table['ddl'], table['refresh'](target_date)]
+               for table in materialized_tables(schema_name)}
+    if include_master:
+        scripts['primary_suppliers'] = primary_suppliers_sql(schema_name)
+    return scripts
+
+
+def run_refresh(statements, timeout=600):
+    """Exécute les instructions d'une table dans une session Trino ; retourne l'erreur ou None"""
+    script = "".join(f"{statement.strip()};\n" for statement in statements)
+    # Les partitions existantes de la date sont remplacées, pas dupliquées
+    cmd = ['docker-compose', 'exec', '-T', 'trino', 'trino',
+           '--session', 'hive.insert_existing_partitions_behavior=OVERWRITE']
+
+    try:
+        result = subprocess.run(cmd, input=script, capture_output=True, text=True, timeout=timeout)
+    except Exception as e:
+        return str(e)
+    if result.returncode != 0:
+        return result.stderr.strip()[:300]
+    return None
+
+
+def refresh_materialized_views(target_date, schema_name=SCHEMA, include_master=False):
+    """Recalcule la partition `target_date` de chaque table, table par table"""
+    print(f"\n Rafraîchissement des vues matérialisées pour {target_date}...")
+
+    failed = []
+    for name, statements in refresh_sql(target_date, schema_name, include_master).items():
+        error = run_refresh(statements)
+        if error:
+            failed.append(name)
+            print(f"  Erreur rafraîchissement {name}: {error}")
+            continue
+        record_write(f"hive.{schema_name}.{name}", None if name == 'primary_suppliers' else target_date)
+        print(f"   {name} à jour")
+
+    if failed:
+        print(f"  {len(failed)} table(s) non rafraîchie(s): {', '.join(failed)}")
+        return False
+    print(" Vues matérialisées à jour")
+    return True
+
+
+def main():
+    """Fonction principale"""
+    parser = argparse.ArgumentParser(description='Rafraîchit les vues matérialisées pour une date')
+    parser.add_argument('--date', required=True, help='Date à rafraîchir (YYYY-MM-DD)')
+    parser.add_argument('--include-master', action='store_true',
+                        help='Recalculer aussi primary_suppliers (données maîtres)')
+    args = parser.parse_args()
+
+    exit(0 if refresh_materialized_views(args.date, include_master=args.include_master) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+ARCHIVE DES COMMANDES FOURNISSEURS
+Chaque exécution écrit ses lignes de commande dans un jeu Parquet compressé
+(zstd) partitionné par date : order_archive/date=.../orders.parquet, trié par
+fournisseur puis SKU. Un index (index.json) associe chaque SKU et chaque
+fournisseur à ses dates : une question comme « commandes du SKU X sur 90
+jours » n'ouvre que les partitions concernées. Les fichiers JSON/CSV par
+fournisseur sont produits à la demande pour la livraison.
+"""
+
+import argparse
+import csv
+import json
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from settings import Config
+
+# Colonnes de l'archive ; les autres champs (calculation_details, routed_from,
+# price_source, covers_until, constraint_adjustment...) sont conservés en JSON dans 'extra'
+STRING_COLUMNS = ['order_id', 'order_date', 'supplier_id', 'supplier_name', 'sku_id',
+                  'product_name', 'calculated_at']
+INT_COLUMNS = ['demand', 'available_stock', 'reserved_stock', 'safety_stock', 'net_demand',
+               'order_quantity', 'pack_size', 'min_order_quantity', 'lead_time_days']
+FLOAT_COLUMNS = ['unit_price', 'total_price']
+CSV_HEADER = ['SKU', 'PRODUIT', 'DEMANDE', 'STOCK_DISPONIBLE', 'STOCK_SECURITE',
+              'BESOIN_NET', 'QUANTITE_COMMANDEE', 'TAILLE_PACK', 'PRIX_UNITAIRE', 'TOTAL']
+
+
+# ---------- Fichiers de livraison par fournisseur ----------
+def supplier_file_path(output_dir, supplier_id, order_date, suffix):
+    """Chemin supplier_<id>_<date>.<suffix>"""
+    safe_id = supplier_id.replace('/', '_')
+    return Path(output_dir) / f"supplier_{safe_id}_{order_date}.{suffix}"
+
+
+def write_supplier_json(path, supplier_id, supplier_name, order_date, items):
+    """Fichier JSON d'un fournisseur (lignes complètes avec détail du calcul)"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'supplier_id': supplier_id,
+            'supplier_name': supplier_name,
+            'order_date': order_date,
+            'total_items': len(items),
+            'total_value': sum(o['total_price'] for o in items),
+            'generated_at': datetime.now().isoformat(),
+            'items': items
+        }, f, indent=2, ensure_ascii=False)
+
+
+def write_supplier_csv(path, items):
+    """Fichier CSV d'un fournisseur (une ligne par SKU commandé)"""
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_HEADER)
+        for order in items:
+            writer.writerow([
+                order['sku_id'],
+                order['product_name'],
+                order['demand'],
+                order['available_stock'],
+                order['safety_stock'],
+                order['net_demand'],
+                order['order_quantity'],
+                order['pack_size'],
+                f"{order['unit_price']:.2f}",
+                f"{order['total_price']:.2f}"
+            ])
+
+
+# ---------- Archive Parquet ----------
+def orders_to_table(orders):
+    """Lignes de commande -> table Arrow typée, triée par fournisseur puis SKU"""
+    import pyarrow as pa
+
+    known = set(STRING_COLUMNS + INT_COLUMNS + FLOAT_COLUMNS)
+    orders = sorted(orders, key=lambda o: (o['supplier_id'], o['sku_id']))
+    arrays = {}
+    for columns, arrow_type in ((STRING_COLUMNS, pa.string()), (INT_COLUMNS, pa.int64()),
+                                (FLOAT_COLUMNS, pa.float64())):
+        for column in columns:
+            arrays[column] = pa.array([o.get(column) for o in orders], arrow_type)
+    arrays['extra'] = pa.array([
+        json.dumps({k: v for k, v in o.items() if k not in known}, ensure_ascii=False) for o in orders
+    ], pa.string())
+    return pa.table(arrays)
+
+
+def table_to_orders(table):
+    """Table Arrow de l'archive -> lignes de commande (format des fichiers fournisseurs)"""
+    orders = []
+    for row in table.to_pylist():
+        extra = json.loads(row.pop('extra', None) or '{}')
+        order = {k: v for k, v in row.items() if v is not None}
+        order.update(extra)
+        orders.append(order)
+    return orders
+
+
+class OrderArchive:
+    """Partitions Parquet par date et index SKU / fournisseur -> dates"""
+
+    def __init__(self, root=None):
+        self.root = Path(root or Config.ORDER_ARCHIVE_DIR)
+        self.index_path = self.root / "index.json"
+        self.index = {'dates': {}, 'skus': {}, 'suppliers': {}}
+        if self.index_path.exists():
+            with open(self.index_path, encoding='utf-8') as f:
+                self.index = json.load(f)
+
+    def partition_path(self, order_date):
+        return self.root / f"date={order_date}" / "orders.parquet"
+
+    def _save_index(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.index_path.with_suffix('.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.index, f, separators=(',', ':'), sort_keys=True)
+        tmp.replace(self.index_path)  # écriture atomique
+
+    def _unindex(self, order_date):
+        """Retire une date de l'index (avant réécriture de sa partition)"""
+        self.index['dates'].pop(order_date, None)
+        for key in ('skus', 'suppliers'):
+            entries = self.index[key]
+            for value in [v for v, dates in entries.items() if order_date in dates]:
+                entries[value].remove(order_date)
+                if not entries[value]:
+                    del entries[value]
+
+    def append(self, orders, order_date):
+        """
+        Écrit les lignes d'une exécution comme partition de order_date.
+        Une nouvelle exécution pour la même date remplace la partition (idempotent).
+        """
+        import pyarrow.parquet as pq
+
+        table = orders_to_table(orders)
+        path = self.partition_path(order_date)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix('.tmp')
+        pq.write_table(table, tmp, compression='zstd')
+        tmp.replace(path)
+
+        self._unindex(order_date)
+        self.index['dates'][order_date] = {
+            'rows': table.num_rows,
+            'bytes': path.stat().st_size,
+            'written_at': time.time()
+        }
+        for key, column in (('skus', 'sku_id'), ('suppliers', 'supplier_id')):
+            for value in set(table[column].to_pylist()):
+                dates = self.index[key].setdefault(value, [])
+                dates.append(order_date)
+                dates.sort()
+        self._save_index()
+        return table.num_rows
+
+    def dates(self, sku_id=None, supplier_id=None, start_date=None, end_date=None):
+        """Dates archivées pouvant contenir des lignes du SKU / fournisseur dans l'intervalle"""
+        candidates = set(self.index['dates'])
+        if sku_id is not None:
+            candidates &= set(self.index['skus'].get(sku_id, []))
+        if supplier_id is not None:
+            candidates &= set(self.index['suppliers'].get(supplier_id, []))
+        return sorted(d for d in candidates
+                      if (start_date is None or d >= start_date) and (end_date is None or d <= end_date))
+
+    def query(self, sku_id=None, supplier_id=None, start_date=None, end_date=None, columns=None):
+        """Lignes archivées filtrées, en une table Arrow (seules les partitions indexées sont lues)"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        filters = []
+        if sku_id is not None:
+            filters.append(('sku_id', '=', sku_id))
+        if supplier_id is not None:
+            filters.append(('supplier_id', '=', supplier_id))
+
+        tables = [pq.read_table(self.partition_path(d), columns=columns, filters=filters or None)
+                  for d in self.dates(sku_id, supplier_id, start_date, end_date)]
+        tables = [t for t in tables if t.num_rows]
+        if not tables:
+            return pa.table({})
+        return pa.concat_tables(tables)
+
+    def orders(self, order_date, supplier_id=None):
+        """Lignes de commande complètes d'une date (format des fichiers fournisseurs)"""
+        return table_to_orders(self.query(supplier_id=supplier_id, start_date=order_date, end_date=order_date))
+
+    def export_supplier_files(self, order_date, output_dir, supplier_id=None, formats=('json', 'csv')):
+        """Produit à la demande les fichiers de livraison d'une date (un fournisseur ou tous)"""
+        by_supplier = {}
+        for order in self.orders(order_date, supplier_id):
+            by_supplier.setdefault(order['supplier_id'], []).append(order)
+
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+        written = []
+        for sid, items in sorted(by_supplier.items()):
+            if 'json' in formats:
+                path = supplier_file_path(output_dir, sid, order_date, 'json')
+                write_supplier_json(path, sid, items[0].get('supplier_name'), order_date, items)
+                written.append(path)
+            if 'csv' in formats:
+                path = supplier_file_path(output_dir, sid, order_date, 'csv')
+                write_supplier_csv(path, items)
+                written.append(path)
+        return written
+
+    def import_supplier_files(self, output_dir):
+        """Archive les fichiers supplier_*_<date>.json déjà produits (migration)"""
+        by_date = {}
+        for path in sorted(Path(output_dir).glob("supplier_*.json")):
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            by_date.setdefault(data['order_date'], []).extend(data.get('items', []))
+        for order_date, orders in sorted(by_date.items()):
+            self.append(orders, order_date)
+        return {order_date: len(orders) for order_date, orders in by_date.items()}
+
+
+def main():
+    """Fonction principale"""
+    parser = argparse.ArgumentParser(description='Archive Parquet des commandes fournisseurs')
+    parser.add_argument('--root', default=str(Config.ORDER_ARCHIVE_DIR), help='Répertoire de l\'archive')
+    parser.add_argument('--sku', help='Filtrer sur un SKU')
+    parser.add_argument('--supplier', help='Filtrer sur un fournisseur')
+    parser.add_argument('--days', type=int, help='Les N derniers jours jusqu\'à --end')
+    parser.add_argument('--start', help='Première date (YYYY-MM-DD)')
+    parser.add_argument('--end', help='Dernière date (défaut: aujourd\'hui avec --days)')
+    parser.add_argument('--limit', type=int, default=20, help='Lignes affichées')
+    parser.add_argument('--export', metavar='DATE', help='Produire les fichiers JSON/CSV fournisseurs d\'une date')
+    parser.add_argument('--output-dir', default=str(Config.OUTPUT_DIR), help='Répertoire des fichiers fournisseurs')
+    parser.add_argument('--import-files', metavar='DIR', help='Archiver les fichiers fournisseurs existants')
+    args = parser.parse_args()
+
+    archive = OrderArchive(args.root)
+
+    if args.import_files:
+        imported = archive.import_supplier_files(args.import_files)
+        print(f" {sum(imported.values())} lignes archivées sur {len(imported)} dates")
+        return
+
+    if args.export:
+        written = archive.export_supplier_files(args.export, args.output_dir, args.supplier)
+        print(f" {len(written)} fichiers générés dans {args.output_dir}")
+        return
+
+    if not (args.sku or args.supplier or args.days or args.start):
+        total_rows = sum(entry['rows'] for entry in archive.index['dates'].values())
+        total_bytes = sum(entry['bytes'] for entry in archive.index['dates'].values())
+        print(f" {len(archive.index['dates'])} dates, {total_rows} lignes, {total_bytes / 1024:.0f} Ko, "
+              f"{len(archive.index['skus'])} SKU, {len(archive.index['suppliers'])} fournisseurs")
+        return
+
+    end_date = args.end
+    start_date = args.start
+    if args.days:
+        end_date = end_date or datetime.now().strftime("%Y-%m-%d")
+        start_date = (datetime.strptime(end_date, "%Y-%m-%d") - timedelta(days=args.days - 1)).strftime("%Y-%m-%d")
+
+    started = time.time()
+    dates = archive.dates(args.sku, args.supplier, start_date, end_date)
+    table = archive.query(args.sku, args.supplier, start_date, end_date,
+                          columns=['order_date', 'supplier_id', 'sku_id', 'order_quantity', 'total_price'])
+    elapsed = time.time() - started
+
+    print(f" {table.num_rows} lignes sur {len(dates)} partitions lues "
+          f"({start_date or 'début'} → {end_date or 'fin'}) en {elapsed * 1000:.0f} ms")
+    if table.num_rows:
+        rows = table.to_pylist()
+        for row in rows[:args.limit]:
+            print(f"   {row['order_date']}  {row['supplier_id']:<8} {row['sku_id']:<12} "
+                  f"{row['order_quantity']:>6}  {row['total_price']:>10.2f}€")
+        print(f"   Total: {sum(r['order_quantity'] for r in rows)} unités, "
+              f"{sum(r['total_price'] for r in rows):.2f}€")
+
+
+if __name__ == "__main__":
+    main()
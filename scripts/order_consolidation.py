@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+CONSOLIDATION DES COMMANDES SUR L'HORIZON DU DÉLAI FOURNISSEUR
+Netting de couverture, SKU par SKU : les lignes d'un même fournisseur ne sont
+pas regroupées entre elles. Une petite ligne est agrandie pour couvrir la
+demande prévue jusqu'à l'arrivée de la commande suivante (lead_time_days).
+Le surplus est suivi comme quantité en commande : les besoins des jours
+suivants qu'il couvre ne génèrent plus de ligne. Les couvertures expirées
+sont retirées via une file de priorité par fournisseur (tas indexé par date
+de fin). L'état d'avant chaque date traitée est conservé (MAX_HISTORY_DAYS
+jours) pour pouvoir relancer n'importe laquelle de ces dates.
+"""
+
+import heapq
+import json
+import math
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from order_rules import round_order_quantity
+from settings import Config
+
+MAX_HISTORY_DAYS = 60
+
+
+class OrderConsolidator:
+    """Reporte le surplus des petites lignes d'un SKU sur ses besoins des jours suivants"""
+
+    def __init__(self, state_path=None, min_line_value=50.0,
+                 max_history_days=MAX_HISTORY_DAYS):
+        self.state_path = Path(state_path or Config.CONSOLIDATION_STATE)
+        self.min_line_value = min_line_value
+        self.max_history_days = max_history_days
+        self.coverage = {}   # (supplier_id, sku_id) -> {'until': date, 'remaining': qté}
+        self.expiry = {}     # supplier_id -> tas [(until, sku_id)]
+        self.last_date = None
+        self.history = {}    # date traitée -> couvertures avant cette date (relances)
+        self.trimmed_until = None  # dernière date dont l'état antérieur a été oublié
+
+    def load(self):
+        """Recharge l'état persistant s'il existe"""
+        if self.state_path.exists():
+            with open(self.state_path, encoding='utf-8') as f:
+                state = json.load(f)
+            self.last_date = state.get('last_date')
+            self.history = state.get('history', {})
+            self.trimmed_until = state.get('trimmed_until')
+            if not self.history and state.get('previous') is not None and self.last_date:
+                self.history = {self.last_date: state['previous']}  # ancien format
+            self._restore(state.get('coverage', []))
+        return self
+
+    def save(self):
+        """Persiste les couvertures en cours"""
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_path.with_suffix('.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({
+                'last_date': self.last_date,
+                'history': self.history,
+                'trimmed_until': self.trimmed_until,
+                'coverage': self._dump()
+            }, f)
+        tmp.replace(self.state_path)  # écriture atomique
+
+    def _dump(self):
+        return [[supplier_id, sku_id, cov['until'], cov['remaining']]
+                for (supplier_id, sku_id), cov in self.coverage.items()]
+
+    def _restore(self, entries):
+        self.coverage = {}
+        self.expiry = {}
+        for supplier_id, sku_id, until, remaining in entries:
+            self._cover(supplier_id, sku_id, until, remaining)
+
+    def _cover(self, supplier_id, sku_id, until, remaining):
+        self.coverage[(supplier_id, sku_id)] = {'until': until, 'remaining': remaining}
+        heapq.heappush(self.expiry.setdefault(supplier_id, []), (until, sku_id))
+
+    def expire(self, date):
+        """Retire les couvertures terminées avant `date`"""
+        for supplier_id, heap in self.expiry.items():
+            while heap and heap[0][0] < date:
+                until, sku_id = heapq.heappop(heap)
+                cov = self.coverage.get((supplier_id, sku_id))
+                # Une entrée plus récente a pu remplacer celle du tas
+                if cov and cov['until'] == until:
+                    del self.coverage[(supplier_id, sku_id)]
+
+    def rewind(self, date):
+        """
+        Revient à l'état d'avant `date` pour la relancer : état conservé de la
+        première date traitée >= `date`. Les dates ultérieures sont oubliées
+        (à relancer dans l'ordre). Retourne False si cet état n'est plus connu.
+        """
+        later = sorted(d for d in self.history if d >= date)
+        if not later or (self.trimmed_until and date <= self.trimmed_until):
+            return False
+        self._restore(self.history[later[0]])
+        for stale in later:
+            del self.history[stale]
+        stale_dates = [d for d in later if d != date]
+        if stale_dates:
+            print(f"   Relance du {date} : consolidation des {', '.join(stale_dates)} à relancer")
+        return True
+
+    def _trim_history(self, date):
+        cutoff = (datetime.strptime(date, "%Y-%m-%d") - timedelta(days=self.max_history_days)).strftime("%Y-%m-%d")
+        for old in [d for d in self.history if d < cutoff]:
+            del self.history[old]
+            self.trimmed_until = max(self.trimmed_until or old, old)
+
+    def consolidate(self, date, orders, daily_forecast):
+        """
+        Applique la consolidation aux lignes du jour. Chaque ligne reste une
+        ligne (fournisseur, SKU) : seul le surplus déjà commandé est déduit.
+        daily_forecast: sku_id -> demande journalière prévue.
+        """
+        if self.last_date and date <= self.last_date and not self.rewind(date):
+            print(f"   État d'avant le {date} indisponible, consolidation ignorée")
+            return orders
+
+        self.history[date] = self._dump()
+        self._trim_history(date)
+        self.last_date = date
+        self.expire(date)
+
+        result = []
+        merged = 0
+        for order in orders:
+            key = (order['supplier_id'], order['sku_id'])
+            net_demand = order['net_demand']
+
+            # 1. Besoin déjà couvert par une ligne consolidée précédente
+            cov = self.coverage.get(key)
+            if cov:
+                covered = min(cov['remaining'], net_demand)
+                cov['remaining'] -= covered
+                net_demand -= covered
+            if net_demand <= 0:
+                merged += 1
+                continue
+
+            pack_size = order['pack_size']
+            min_order_qty = int(order.get('min_order_quantity', 0))
+            lead_time = max(1, int(order.get('lead_time_days', 1)))
+            quantity = round_order_quantity(net_demand, pack_size, min_order_qty)
+
+            # 2. Petite ligne : couvrir aussi les jours suivants jusqu'au délai
+            if order['unit_price'] * quantity < self.min_line_value:
+                horizon = math.ceil(daily_forecast.get(order['sku_id'], 0) * (lead_time - 1))
+                quantity = round_order_quantity(net_demand + horizon, pack_size, min_order_qty)
+
+            until = (datetime.strptime(date, "%Y-%m-%d") + timedelta(days=lead_time - 1)).strftime("%Y-%m-%d")
+            if quantity > net_demand:
+                self._cover(order['supplier_id'], order['sku_id'], until, quantity - net_demand)
+
+            result.append(dict(order,
+                               net_demand=net_demand,
+                               order_quantity=quantity,
+                               total_price=order['unit_price'] * quantity,
+                               covers_until=until))
+
+        print(f"    Consolidation: {len(orders)} → {len(result)} lignes ({merged} couvertes par des commandes en cours)")
+        return result
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+RÈGLES MÉTIER DES QUANTITÉS COMMANDÉES
+Partagées par le calcul des commandes et les étapes d'optimisation.
+"""
+
+
+def round_order_quantity(net_demand, pack_size, min_order_qty):
+    """Arrondit au pack supérieur puis respecte la quantité minimale"""
+    pack_size = max(1, int(pack_size))
+    packs_needed = max(1, (net_demand + pack_size - 1) // pack_size)
+    order_quantity = packs_needed * pack_size
+
+    if min_order_qty > 0 and order_quantity < min_order_qty:
+        order_quantity = min_order_qty
+    return order_quantity
+
+
+def round_order_quantity_nearest(net_demand, pack_size, min_order_qty):
+    """Arrondit au pack le plus proche (au moins un pack) puis respecte la quantité minimale"""
+    pack_size = max(1, int(pack_size))
+    packs_needed = max(1, (net_demand + pack_size // 2) // pack_size)
+    order_quantity = packs_needed * pack_size
+
+    if min_order_qty > 0 and order_quantity < min_order_qty:
+        order_quantity = min_order_qty
+    return order_quantity
+
+
+ROUNDING_RULES = {
+    'up': round_order_quantity,
+    'nearest': round_order_quantity_nearest,
+}
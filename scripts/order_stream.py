@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+INGESTION CONTINUE DES COMMANDES MAGASINS (MICRO-LOTS)
+Voie alternative aux fichiers journaliers : les événements de commande
+arrivent en continu dans une file (répertoire de segments JSONL local, ou
+flux Redis compatible), sont agrégés en mémoire par (date, magasin, SKU) et
+publiés toutes les N secondes : lignes brutes dans les partitions HDFS de
+orders_raw et agrégats du lot dans demand_stream (date=.../batch_id=...),
+un fichier par micro-lot au même nom à chaque tentative. Une publication
+ne coûte que la taille du lot ; la partition journalière de demand_daily
+somme ces fichiers (demand_rollup.py --date ... --from-stream).
+La file n'est acquittée qu'après publication (au moins une fois) ; une
+nouvelle tentative réécrit les mêmes fichiers, sans doublon.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+from exec_session import ExecSession
+from demand_rollup import HDFS_DEMAND_STREAM, STREAM_TABLE, create_stream_table_sql
+from ingest_validation import MAX_ORDER_QUANTITY
+from query_cache import record_write
+from settings import Config
+
+HDFS_RAW_ORDERS = "/raw/orders"
+CONTAINER_TMP = "/tmp/data_stream"
+
+
+# ---------- Files de messages ----------
+class FileQueue:
+    """File locale : segments JSONL en ajout seul, positions de lecture validées dans offsets.json"""
+
+    def __init__(self, root=None, retention=3600):
+        self.root = Path(root or Config.ORDER_QUEUE_DIR)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.offsets_path = self.root / "offsets.json"
+        self.retention = retention
+        self.segment = self.root / f"segment-{datetime.now():%Y%m%d%H%M%S}-{os.getpid()}.jsonl"
+        self.committed = {}
+        if self.offsets_path.exists():
+            with open(self.offsets_path, encoding='utf-8') as f:
+                self.committed = json.load(f)
+        self.positions = dict(self.committed)
+
+    def publish(self, events):
+        """Ajoute des événements (une écriture par lot, lignes complètes uniquement)"""
+        payload = "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in events)
+        with open(self.segment, 'a', encoding='utf-8') as f:
+            f.write(payload)
+            f.flush()
+
+    def consume(self, max_events=5000, timeout=1.0):
+        """Événements non lus (les lignes incomplètes en fin de segment sont laissées)"""
+        events = []
+        for path in sorted(self.root.glob("segment-*.jsonl")):
+            position = self.positions.get(path.name, 0)
+            if path.stat().st_size <= position:
+                continue
+            with open(path, 'rb') as f:
+                f.seek(position)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # écriture en cours
+                    position += len(line)
+                    if line.strip():
+                        events.append(json.loads(line))
+                    if len(events) >= max_events:
+                        break
+            self.positions[path.name] = position
+            if len(events) >= max_events:
+                return events
+        if not events:
+            time.sleep(timeout)
+        return events
+
+    def commit(self):
+        """Valide les positions lues et purge les segments consommés anciens"""
+        now = time.time()
+        for path in self.root.glob("segment-*.jsonl"):
+            stat = path.stat()
+            if (self.positions.get(path.name, 0) >= stat.st_size and path != self.segment
+                    and now - stat.st_mtime > self.retention):
+                path.unlink()
+                self.positions.pop(path.name, None)
+        self.committed = dict(self.positions)
+        tmp = self.offsets_path.with_suffix('.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.committed, f)
+        tmp.replace(self.offsets_path)  # écriture atomique
+
+
+class RedisQueue:
+    """Flux Redis (XADD / XREADGROUP / XACK) : Redis, KeyDB, Valkey..."""
+
+    def __init__(self, url="redis://localhost:6379/0", stream="procurement:orders",
+                 group="procurement-stream", consumer=None):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.stream = stream
+        self.group = group
+        self.consumer = consumer or f"consumer-{os.getpid()}"
+        self.pending = []
+        try:
+            self.client.xgroup_create(stream, group, id='0', mkstream=True)
+        except redis.ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+    def publish(self, events):
+        """Ajoute des événements au flux (pipeline Redis, un aller-retour)"""
+        pipe = self.client.pipeline(transaction=False)
+        for event in events:
+            pipe.xadd(self.stream, {'event': json.dumps(event, ensure_ascii=False)})
+        pipe.execute()
+
+    def consume(self, max_events=5000, timeout=1.0):
+        """Événements livrés à ce consommateur, en attente d'acquittement"""
+        response = self.client.xreadgroup(self.group, self.consumer, {self.stream: '>'},
+                                          count=max_events, block=int(timeout * 1000))
+        events = []
+        for _, messages in response or []:
+            for message_id, fields in messages:
+                self.pending.append(message_id)
+                events.append(json.loads(fields[b'event']))
+        return events
+
+    def commit(self):
+        """Acquitte les messages publiés"""
+        if self.pending:
+            self.client.xack(self.stream, self.group, *self.pending)
+            self.pending = []
+
+
+def open_queue(spec):
+    """'file:<répertoire>' ou URL redis://..."""
+    if spec.startswith(('redis://', 'rediss://')):
+        return RedisQueue(spec)
+    return FileQueue(spec[len('file:'):] if spec.startswith('file:') else spec)
+
+
+# ---------- Agrégation en mémoire ----------
+class MicroBatch:
+    """Compteurs par (date, magasin, SKU) et lignes brutes par partition pour une fenêtre"""
+
+    def __init__(self):
+        self.started = time.time()
+        # Identifiant fixe du lot : les tentatives successives écrivent les mêmes fichiers
+        self.batch_id = f"{datetime.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}"
+        self.counters = {}   # (date, store_id, sku_id) -> [quantité, lignes]
+        self.rows = {}       # (date, store_id) -> lignes brutes
+        self.rejected = 0
+
+    def demand_rows(self):
+        """Agrégats du lot par date : {date: [lignes demand_stream]}"""
+        by_date = {}
+        for (target_date, store_id, sku_id), (qty, count) in sorted(self.counters.items()):
+            by_date.setdefault(target_date, []).append(
+                {'store_id': store_id, 'sku_id': sku_id, 'qty': qty, 'order_count': count})
+        return by_date
+
+    def __len__(self):
+        return sum(len(rows) for rows in self.rows.values())
+
+    def add(self, event):
+        """Ajoute un événement de commande (ignoré s'il est incomplet)"""
+        try:
+            sku_id = event['sku_id']
+            store_id = event['store_id']
+            quantity = int(event['quantity'])
+            target_date = event.get('date') or event['order_timestamp'][:10]
+        except (KeyError, TypeError, ValueError):
+            self.rejected += 1
+            return
+        # Quantité hors bornes : ligne brute conservée (mise en quarantaine à la
+        # validation) mais exclue des agrégats, comme dans le rollup des lignes valides
+        if 1 <= quantity <= MAX_ORDER_QUANTITY:
+            counter = self.counters.setdefault((target_date, store_id, sku_id), [0, 0])
+            counter[0] += quantity
+            counter[1] += 1
+        self.rows.setdefault((target_date, store_id), []).append({
+            'order_id': event.get('order_id'),
+            'sku_id': sku_id,
+            'quantity': quantity,
+            'order_timestamp': event.get('order_timestamp')
+        })
+
+
+# ---------- Publication d'un micro-lot ----------
+def flush_batch(batch, spool_dir=None):
+    """Écrit les lignes brutes et les agrégats d'un micro-lot dans HDFS ; True si tout est publié"""
+    batch_id = batch.batch_id
+    spool = Path(spool_dir or Config.STREAM_SPOOL_DIR) / batch_id
+    spool.mkdir(parents=True, exist_ok=True)
+
+    # 1. Un fichier JSONL par partition : (date, magasin) pour orders_raw, (date, lot) pour demand_stream
+    files = []
+    for (target_date, store_id), rows in batch.rows.items():
+        local = spool / "orders" / f"date={target_date}" / f"store_id={store_id}"
+        local.mkdir(parents=True, exist_ok=True)
+        with open(local / f"orders_{batch_id}.json", 'w', encoding='utf-8') as f:
+            f.writelines(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+        files.append((target_date, store_id))
+
+    demand = batch.demand_rows()
+    for target_date, rows in demand.items():
+        local = spool / "demand" / f"date={target_date}" / f"batch_id={batch_id}"
+        local.mkdir(parents=True, exist_ok=True)
+        with open(local / "demand.json", 'w', encoding='utf-8') as f:
+            f.writelines(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+
+    container_dir = f"{CONTAINER_TMP}/{batch_id}"
+    session = ExecSession("namenode")
+    session.add(f"mkdir -p {container_dir}", "mkdir conteneur")
+    ExecSession.report(session.run())
+    copy = subprocess.run(['docker', 'cp', f"{spool}/.", f"namenode:{container_dir}/"],
+                          capture_output=True, text=True)
+    if copy.returncode != 0:
+        print(f"  Échec copie du micro-lot: {copy.stderr.strip()[:200]}")
+        return False
+
+    session = ExecSession("namenode")
+    for target_date, store_id in files:
+        partition = f"date={target_date}/store_id={store_id}"
+        mkdir = session.add(f"hdfs dfs -mkdir -p {HDFS_RAW_ORDERS}/{partition}", f"{partition}: mkdir")
+        session.add(f"hdfs dfs -copyFromLocal -f {container_dir}/orders/{partition}/orders_{batch_id}.json "
+                    f"{HDFS_RAW_ORDERS}/{partition}/", f"{partition}: put", after=mkdir)
+    for target_date in demand:
+        partition = f"date={target_date}/batch_id={batch_id}"
+        mkdir = session.add(f"hdfs dfs -mkdir -p {HDFS_DEMAND_STREAM}/{partition}", f"{partition}: mkdir")
+        session.add(f"hdfs dfs -copyFromLocal -f {container_dir}/demand/{partition}/demand.json "
+                    f"{HDFS_DEMAND_STREAM}/{partition}/", f"{partition}: put agrégats", after=mkdir)
+    session.add(f"rm -rf {container_dir}", "nettoyage")
+    results = session.run()
+    ExecSession.report(results)
+    if ExecSession.succeeded(results) != len(results):
+        return False
+
+    # 2. Partitions nouvelles de orders_raw et demand_stream (enregistrement ciblé)
+    statements = [
+        f"CALL hive.system.register_partition('procurement', 'orders_raw', "
+        f"ARRAY['date', 'store_id'], ARRAY['{target_date}', '{store_id}'])"
+        for target_date, store_id in files
+    ] + [
+        f"CALL hive.system.register_partition('procurement', 'demand_stream', "
+        f"ARRAY['date', 'batch_id'], ARRAY['{target_date}', '{batch_id}'])"
+        for target_date in demand
+    ]
+    for statement in statements:
+        result = subprocess.run(['docker-compose', 'exec', '-T', 'trino', 'trino', '--execute', statement],
+                                capture_output=True, text=True)
+        if result.returncode != 0 and 'already exists' not in result.stderr:
+            print(f"  Erreur Trino: {result.stderr.strip()[:300]}")
+            return False
+
+    for target_date in sorted({target_date for target_date, _ in files}):
+        record_write("hive.procurement.orders_raw", target_date)
+    for target_date in demand:
+        record_write(STREAM_TABLE, target_date)
+
+    for path in sorted(spool.rglob("*"), reverse=True):
+        path.unlink() if path.is_file() else path.rmdir()
+    spool.rmdir()
+    return True
+
+
+def create_stream_table():
+    """Crée demand_stream si besoin (une fois au démarrage du consommateur)"""
+    session = ExecSession("namenode")
+    session.add(f"hdfs dfs -mkdir -p {HDFS_DEMAND_STREAM}", "mkdir demand_stream")
+    ExecSession.report(session.run())
+    result = subprocess.run(['docker-compose', 'exec', '-T', 'trino', 'trino',
+                             '--execute', create_stream_table_sql()],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"  Erreur création de demand_stream: {result.stderr.strip()[:300]}")
+        return False
+    return True
+
+
+def run_consumer(queue, flush_seconds=30, max_events=5000):
+    """Boucle de consommation : agrégation continue, publication toutes les N secondes"""
+    print(f"INGESTION CONTINUE (micro-lots de {flush_seconds:g}s)")
+    if not create_stream_table():
+        return False
+    batch = MicroBatch()
+    while True:
+        for event in queue.consume(max_events, timeout=min(1.0, flush_seconds)):
+            batch.add(event)
+
+        if time.time() - batch.started < flush_seconds:
+            continue
+        if not len(batch):
+            batch.started = time.time()
+            continue
+
+        skus = len({sku for _, _, sku in batch.counters})
+        print(f" {datetime.now():%H:%M:%S} micro-lot: {len(batch)} lignes, {skus} SKU, "
+              f"{len(batch.rows)} partitions, {batch.rejected} rejetées")
+        if flush_batch(batch):
+            queue.commit()
+            batch = MicroBatch()
+        else:
+            # Lot conservé : nouvelle tentative à la prochaine échéance
+            print("  Publication en échec, micro-lot conservé")
+            batch.started = time.time()
+
+
+def publish_file(queue, path, store_id=None, target_date=None):
+    """Rejoue un fichier orders.json journalier dans la file (tests, reprise)"""
+    with open(path, encoding='utf-8') as f:
+        orders = json.load(f)
+    for order in orders:
+        if store_id:
+            order.setdefault('store_id', store_id)
+        if target_date:
+            order.setdefault('date', target_date)
+    queue.publish(orders)
+    return len(orders)
+
+
+def main():
+    """Fonction principale"""
+    parser = argparse.ArgumentParser(description='Ingestion continue des commandes par micro-lots')
+    parser.add_argument('--queue', default=f'file:{Config.ORDER_QUEUE_DIR}',
+                        help='File de messages : file:<répertoire> ou redis://hôte:port/db')
+    parser.add_argument('--flush-seconds', type=float, default=30, help='Intervalle de publication des micro-lots')
+    parser.add_argument('--publish', nargs='+', metavar='ORDERS_JSON',
+                        help='Publier des fichiers orders.json journaliers dans la file puis sortir')
+    args = parser.parse_args()
+
+    queue = open_queue(args.queue)
+
+    if args.publish:
+        for path in args.publish:
+            # Le magasin et la date se déduisent du chemin date=.../store_id=.../orders.json
+            parts = dict(p.split('=', 1) for p in Path(path).parts if '=' in p)
+            count = publish_file(queue, path, parts.get('store_id'), parts.get('date'))
+            print(f" {count} événements publiés depuis {path}")
+        return
+
+    try:
+        if run_consumer(queue, args.flush_seconds) is False:
+            exit(1)
+    except KeyboardInterrupt:
+        print("\n Arrêt de l'ingestion (micro-lot en cours non acquitté)")
+
+
+if __name__ == "__main__":
+    main()
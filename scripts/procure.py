@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+POINT D'ENTRÉE UNIQUE DES OUTILS
+procure upload|process|run|generate|analyze|bootstrap|config [options...]
+Le module d'une sous-commande n'est importé qu'à son exécution : pandas,
+Faker, numpy ou les pilotes ne sont chargés que par les commandes qui s'en
+servent, et `procure --help` / `procure config` démarrent sans eux.
+Les options après la sous-commande sont transmises au script correspondant.
+"""
+
+import argparse
+import os
+import sys
+from pathlib import Path
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+
+# Sous-commande -> (module, arguments imposés, description)
+COMMANDS = {
+    'upload': ('procurement_pipeline', ['--upload-only'], "Upload HDFS des fichiers d'une date"),
+    'process': ('procurement_pipeline', ['--process-only'], "Calcul des commandes fournisseurs d'une date"),
+    'run': ('procurement_pipeline', [], "Upload puis traitement (pipeline complet)"),
+    'generate': ('gener_data_chaque_jour', [], "Génération des données maîtres et du jour"),
+    'analyze': ('analyze_data', [], "Analyse des données (HDFS ou --local)"),
+}
+
+
+def run_module(command, module_name, argv):
+    """Importe le module à la demande et exécute son main() avec les arguments donnés"""
+    import importlib
+
+    module = importlib.import_module(module_name)
+    sys.argv = [f"procure {command}"] + list(argv)
+    try:
+        module.main()
+    except SystemExit as e:
+        return e.code or 0  # exit(0/1) des scripts
+    return 0
+
+
+def bootstrap(argv):
+    """Tables Trino/Hive, schéma Cassandra et données maîtres PostgreSQL"""
+    parser = argparse.ArgumentParser(prog='procure bootstrap', description=bootstrap.__doc__)
+    parser.add_argument('--skip-trino', action='store_true', help='Ne pas créer les tables Trino/Hive')
+    parser.add_argument('--skip-cassandra', action='store_true', help='Ne pas créer le schéma Cassandra')
+    parser.add_argument('--skip-master', action='store_true', help='Ne pas charger les données maîtres')
+    args = parser.parse_args(argv)
+
+    failures = 0
+    if not args.skip_trino:
+        print("\n[1/3] Tables Trino/Hive")
+        failures += run_module('bootstrap', 'create_trino_tables', ['--skip-tests']) != 0
+
+    if not args.skip_cassandra:
+        print("\n[2/3] Schéma Cassandra")
+        import subprocess
+        with open(SCRIPTS_DIR / "create_cassandra_tables.cql", encoding='utf-8') as f:
+            result = subprocess.run(['docker-compose', 'exec', '-T', 'cassandra', 'cqlsh'],
+                                    stdin=f, capture_output=True, text=True)
+        if result.returncode != 0:
+            failures += 1
+            print(f"  Erreur cqlsh: {result.stderr.strip()[:300]}")
+        else:
+            print(" Schéma Cassandra à jour")
+
+    if not args.skip_master:
+        print("\n[3/3] Données maîtres PostgreSQL")
+        failures += run_module('bootstrap', 'master_data_sync', ['--migrate']) != 0
+
+    return 1 if failures else 0
+
+
+def show_config(argv):
+    """Configuration effective (variables PROCURE_*, fichier .env, défauts)"""
+    from settings import Config
+
+    for name, value in Config.as_dict().items():
+        print(f" {name:<20} {value}")
+    return 0
+
+
+def main():
+    """Fonction principale"""
+    described = {name: spec[2] for name, spec in COMMANDS.items()}
+    described['bootstrap'] = "Création des tables et chargement des données maîtres"
+    described['config'] = "Afficher la configuration effective"
+    parser = argparse.ArgumentParser(
+        prog='procure',
+        description='Outils du pipeline d\'approvisionnement',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="Sous-commandes:\n" + "\n".join(f"  {name:<10} {text}" for name, text in described.items())
+               + "\n\nprocure <sous-commande> --help : options de la sous-commande"
+    )
+    parser.add_argument('--config', help='Fichier .env de configuration (sinon PROCURE_CONFIG ou .env du dépôt)')
+    parser.add_argument('command', choices=list(described), metavar='sous-commande')
+    parser.add_argument('args', nargs=argparse.REMAINDER, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.config:
+        # Lu par settings.Config à sa première utilisation, y compris dans les sous-processus
+        os.environ['PROCURE_CONFIG'] = os.path.abspath(args.config)
+
+    if args.command == 'bootstrap':
+        return bootstrap(args.args)
+    if args.command == 'config':
+        return show_config(args.args)
+
+    module_name, fixed_args, _ = COMMANDS[args.command]
+    return run_module(args.command, module_name, fixed_args + args.args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
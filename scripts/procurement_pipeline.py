@@ -6,33 +6,41 @@ Gère l'upload dans HDFS et le traitement des commandes
 
 import os
 import subprocess
-import json
-import csv
 import uuid
 import argparse
 from datetime import datetime, timedelta
-from pathlib import Path
 
-class Config:
-    """Configuration globale"""
-    BASE_LOCAL_DATA = os.path.abspath("../data")
-    HDFS_RAW_ORDERS = "/raw/orders"
-    HDFS_RAW_STOCK = "/raw/stock"
-    CONTAINER_TMP = "/tmp/data_today"
-    OUTPUT_DIR = Path("./supplier_orders")
-    OUTPUT_DIR.mkdir(exist_ok=True)
-    
-    @staticmethod
-    def get_today():
-        """Retourne la date du jour au format YYYY-MM-DD"""
-        return datetime.now().strftime("%Y-%m-%d")
+from exec_session import ExecSession
+from demand_rollup import ROLLUP_TABLE, refresh_demand_rollup, stream_demand_sql
+from demand_window import RollingDemandWindow
+from trino_stream import ColumnResult, iter_trino_rows
+from materialized_views import refresh_materialized_views
+from order_rules import round_order_quantity
+from order_consolidation import OrderConsolidator
+from supplier_constraints import SupplierConstraintSolver, print_report
+from supplier_index import SupplierIndex
+from checkpoint_store import CheckpointStore
+from cassandra_verify import reconcile, save_report
+from cassandra_layout import supplier_order_inserts, demand_calculation_insert_by_date, logged_batch
+from stock_state import HDFS_RAW_STOCK_DELTA, as_of_sql as stock_as_of_sql, compact_if_due, last_compaction_date
+from query_cache import QueryCache, record_write
+from order_archive import OrderArchive, supplier_file_path, write_supplier_csv, write_supplier_json
+from ingest_validation import DEFAULT_SAFETY_STOCK, clean_sql, validate_partition, with_safety_stock_sql
+from settings import Config
+
+# Options dont dépendent les sorties des étapes : une reprise exige les mêmes valeurs
+CHECKPOINT_PARAMS = ['rebuild_rollup', 'window_days', 'service_level', 'consolidate', 'min_line_value',
+                     'supplier_constraints', 'constraint_budget', 'failover', 'embargo', 'dual_write',
+                     'stock_deltas', 'compact_every', 'no_archive', 'supplier_files']
 
 class HDFSUploader:
     """Gère l'upload des fichiers vers HDFS"""
     
-    def __init__(self, target_date=None):
+    def __init__(self, target_date=None, batch_exec=False):
         self.target_date = target_date or Config.get_today()
         self.copied_files = []
+        # Regrouper les commandes namenode dans une seule session exec
+        self.batch_exec = batch_exec
     
     def run_cmd(self, cmd):
         """Exécute une commande"""
@@ -64,16 +72,26 @@ class HDFSUploader:
             print(f" Dossier non trouvé: {local_orders}")
             return []
         
-        # Nettoyer le répertoire temporaire
-        self.run_cmd(f"docker-compose exec namenode rm -rf {Config.CONTAINER_TMP}")
-        self.run_cmd(f"docker-compose exec namenode mkdir -p {Config.CONTAINER_TMP}")
-        
         # Lister tous les dossiers store_id
         store_dirs = [d for d in os.listdir(local_orders) 
                      if os.path.isdir(os.path.join(local_orders, d)) and d.startswith("store_id=")]
         
         print(f" {len(store_dirs)} dossiers store_id à copier")
         
+        # Nettoyer le répertoire temporaire
+        if self.batch_exec:
+            # Un seul exec pour le nettoyage et tous les mkdir
+            session = ExecSession("namenode")
+            session.add(f"rm -rf {Config.CONTAINER_TMP}")
+            tmp_dir = session.add(f"mkdir -p {Config.CONTAINER_TMP}")
+            for store_dir in store_dirs:
+                session.add(f"mkdir -p {Config.CONTAINER_TMP}/raw_orders/date={self.target_date}/{store_dir}/",
+                            after=tmp_dir)
+            ExecSession.report(session.run())
+        else:
+            self.run_cmd(f"docker-compose exec namenode rm -rf {Config.CONTAINER_TMP}")
+            self.run_cmd(f"docker-compose exec namenode mkdir -p {Config.CONTAINER_TMP}")
+        
         self.copied_files = []
         
         for store_dir in store_dirs:
@@ -83,7 +101,8 @@ class HDFSUploader:
             if os.path.exists(local_file):
                 # Créer le répertoire dans le conteneur
                 container_dir = f"{Config.CONTAINER_TMP}/raw_orders/date={self.target_date}/{store_dir}/"
-                self.run_cmd(f"docker-compose exec namenode mkdir -p {container_dir}")
+                if not self.batch_exec:
+                    self.run_cmd(f"docker-compose exec namenode mkdir -p {container_dir}")
                 
                 # Copier le fichier
                 container_file = f"{container_dir}orders.json"
@@ -114,6 +133,9 @@ class HDFSUploader:
             print(" Aucun fichier à uploader")
             return False
         
+        if self.batch_exec:
+            return self.upload_to_hdfs_batch()
+        
         success_count = 0
         
         for file_info in self.copied_files:
@@ -150,10 +172,74 @@ class HDFSUploader:
         print(f"\n📊 Résultat: {success_count}/{len(self.copied_files)} fichiers uploadés")
         return success_count > 0
     
+    def upload_to_hdfs_batch(self):
+        """Upload vers HDFS en un seul exec (mkdir/put/test générés en script)"""
+        session = ExecSession("namenode")
+        put_ops = {}
+        
+        for file_info in self.copied_files:
+            store_id = file_info['store_id']
+            hdfs_dir = f"{Config.HDFS_RAW_ORDERS}/date={self.target_date}/store_id={store_id}/"
+            hdfs_file = f"{hdfs_dir}orders.json"
+            
+            # put seulement si mkdir a réussi, test seulement si put a réussi
+            mkdir = session.add(f"hdfs dfs -mkdir -p {hdfs_dir}", f"{store_id}: mkdir")
+            put_ops[store_id] = session.add(
+                f"hdfs dfs -copyFromLocal -f {file_info['container_path']} {hdfs_file}", f"{store_id}: put",
+                after=mkdir)
+            session.add(f"hdfs dfs -test -e {hdfs_file}", f"{store_id}: test", after=put_ops[store_id])
+        
+        results = session.run()
+        ExecSession.report(results)
+        
+        success_count = 0
+        for store_id, index in put_ops.items():
+            put_ok = results[index]['returncode'] == 0
+            test_ok = results[index + 1]['returncode'] == 0
+            if put_ok and test_ok:
+                success_count += 1
+            print(f"   store_id={store_id}: {'Upload réussi' if put_ok and test_ok else 'Échec upload'}")
+        
+        print(f"\n📊 Résultat: {success_count}/{len(self.copied_files)} fichiers uploadés")
+        return success_count > 0
+    
+    def upload_stock_deltas(self):
+        """Upload des fichiers de variation de stock du jour (mode deltas)"""
+        local_dir = os.path.join(Config.BASE_LOCAL_DATA, "raw_stock_delta", f"date={self.target_date}")
+        if not os.path.exists(local_dir):
+            return 0
+        
+        print(f"\n Upload des deltas de stock pour {self.target_date}...")
+        container_dir = f"{Config.CONTAINER_TMP}/raw_stock_delta/date={self.target_date}"
+        hdfs_dir = f"{HDFS_RAW_STOCK_DELTA}/date={self.target_date}"
+        
+        self.run_cmd(f"docker-compose exec namenode mkdir -p {container_dir}")
+        copy_result = self.run_cmd(f'docker cp "{local_dir}/." namenode:{container_dir}/')
+        if copy_result.returncode != 0:
+            print("   Échec copie des deltas")
+            return 0
+        
+        self.run_cmd(f"docker-compose exec namenode hdfs dfs -mkdir -p {hdfs_dir}")
+        put_result = self.run_cmd(f"docker-compose exec namenode hdfs dfs -put -f {container_dir}/. {hdfs_dir}/")
+        count = len([f for f in os.listdir(local_dir) if f.endswith('.csv')])
+        print(f"   {count if put_result.returncode == 0 else 0} fichiers delta uploadés")
+        return count if put_result.returncode == 0 else 0
+    
     def verify_hdfs_upload(self):
         """Vérification de l'upload HDFS"""
         print(f"\n Vérification HDFS pour {self.target_date}...")
         
+        if self.batch_exec:
+            date_dir = f"{Config.HDFS_RAW_ORDERS}/date={self.target_date}"
+            session = ExecSession("namenode")
+            session.add(f"hdfs dfs -test -d {date_dir}", "Répertoire date")
+            session.add(f"hdfs dfs -ls -R {date_dir}", "Fichiers dans HDFS")
+            results = session.run()
+            print(f" {'✅' if results[0]['returncode'] == 0 else '❌'} Répertoire date")
+            if results[1]['output']:
+                print(results[1]['output'])
+            return True
+        
         # Vérifier le répertoire date
         self.run_cmd(f"docker-compose exec namenode hdfs dfs -test -d {Config.HDFS_RAW_ORDERS}/date={self.target_date} && echo '✅ Répertoire date présent' || echo '❌ Répertoire date absent'")
         
@@ -173,6 +259,11 @@ class HDFSUploader:
         
         self.run_cmd('docker-compose exec trino trino --execute "CALL hive.system.sync_partition_metadata(\'procurement\', \'orders_raw\', \'FULL\')"')
         self.run_cmd('docker-compose exec trino trino --execute "CALL hive.system.sync_partition_metadata(\'procurement\', \'stock_raw\', \'FULL\')"')
+        self.run_cmd('docker-compose exec trino trino --execute "CALL hive.system.sync_partition_metadata(\'procurement\', \'stock_delta_raw\', \'FULL\')"')
+        
+        # Les résultats en cache lisant ces partitions ne sont plus valides
+        for table in ('orders_raw', 'stock_raw', 'stock_delta_raw'):
+            record_write(f"hive.procurement.{table}", self.target_date)
         
         print(" Synchronisation terminée")
         return True
@@ -200,9 +291,18 @@ class HDFSUploader:
             # 3. Vérification
             self.verify_hdfs_upload()
             
+            # Deltas de stock du jour (s'il y en a)
+            self.upload_stock_deltas()
+            
             # 4. Synchronisation Hive
             self.sync_hive_partitions()
             
+            # 5. Validation : rejets en quarantaine avant toute agrégation
+            validate_partition(self.target_date)
+            
+            # 6. Rollup de la demande (une fois par chargement de partition)
+            refresh_demand_rollup(self.target_date)
+            
             print(f"\n Upload HDFS terminé avec succès")
             return True
             
@@ -215,56 +315,168 @@ class HDFSUploader:
 class ProcurementGenerator:
     """Génère les commandes fournisseurs"""
     
-    def __init__(self, target_date='2025-12-02'):
+    def __init__(self, target_date='2025-12-02', demand_window=None, service_level=0.95, consolidator=None,
+                 constraint_budget=None, failover_embargo=None, checkpoint=None, verify_cassandra=False,
+                 dual_write=False, stock_compact_every=None, query_cache=None, archive=None,
+                 supplier_files=True):
         self.target_date = target_date
         self.output_dir = Config.OUTPUT_DIR
-        
-    def run_trino_query_jsonl(self, query):
-        """Exécute une requête Trino et parse le JSONL"""
-        cmd = ['docker-compose', 'exec', '-T', 'trino', 'trino', '--output-format', 'JSON', '--execute', query]
+        # Fenêtre glissante optionnelle pour le stock de sécurité dynamique
+        self.demand_window = demand_window
+        self.service_level = service_level
+        # Consolidation optionnelle des commandes sur l'horizon du délai
+        self.consolidator = consolidator
+        # Budget (s) du solveur de contraintes fournisseur, None = désactivé
+        self.constraint_budget = constraint_budget
+        # Bascule sur fournisseur secondaire : liste d'embargo, None = désactivé
+        self.failover_embargo = failover_embargo
+        self.supplier_index = None
+        # Points de reprise de la date (CheckpointStore), None = désactivé
+        self.checkpoint = checkpoint
+        # Réconciliation Cassandra / fichiers après le stockage
+        self.verify_cassandra = verify_cassandra
+        # Écriture double vers les tables Cassandra par date / par fournisseur
+        self.dual_write = dual_write
+        # Stock lu depuis l'état compacté + deltas (compaction tous les N jours), None = instantanés
+        self.stock_compact_every = stock_compact_every
+        # Cache disque des résultats Trino (QueryCache), None = désactivé
+        self.query_cache = query_cache
+        # Archive Parquet des commandes (OrderArchive), None = désactivée
+        self.archive = archive
+        # Fichiers JSON/CSV par fournisseur à chaque exécution (sinon à la demande depuis l'archive)
+        self.supplier_files = supplier_files
+        self._sku_dictionary = None
+        
+    @property
+    def sku_dictionary(self):
+        """Dictionnaire SKU <-> int32 partagé, ouvert à la première utilisation"""
+        if self._sku_dictionary is None:
+            from sku_dictionary import SkuDictionary
+            self._sku_dictionary = SkuDictionary(Config.SKU_DICTIONARY)
+        return self._sku_dictionary
+    
+    def encode_sku_arrays(self, demand_data, stock_data, safety_overrides=None):
+        """
+        Demande et stock en tableaux indexés par code SKU.
+        Les lignes arrivent validées et typées (ingest_validation) : un SKU absent
+        du stock validé a un stock nul et le stock de sécurité par défaut.
+        Les colonnes de ColumnResult sont lues telles quelles, sans ligne intermédiaire.
+        """
+        import numpy as np
+        
+        skus = self.sku_dictionary
+        demand = ColumnResult.of(demand_data).nonempty('sku_id')
+        stock = ColumnResult.of(stock_data).nonempty('sku_id')
+        demand_codes = skus.encode(demand.column('sku_id'))
+        stock_codes = skus.encode(stock.column('sku_id'))
+        override_codes = skus.encode(list(safety_overrides or {}))
+        # Taille fixée après tous les encodages : les SKU encodés plus tôt y ont leur case
+        size = len(skus)
+        
+        arrays = {
+            'demand_codes': demand_codes,
+            'has_demand': np.zeros(size, dtype=bool),
+            'demand': np.zeros(size, dtype=np.int64),
+            'order_count': np.zeros(size, dtype=np.int64),
+            'available_stock': np.zeros(size, dtype=np.int64),
+            'reserved_stock': np.zeros(size, dtype=np.int64),
+            'safety_stock': np.full(size, DEFAULT_SAFETY_STOCK, dtype=np.int64),
+        }
+        arrays['has_demand'][demand_codes] = True
+        arrays['demand'][demand_codes] = demand.column('total_demand')
+        arrays['order_count'][demand_codes] = demand.column('order_count')
+        
+        for column in ('available_stock', 'reserved_stock', 'safety_stock'):
+            arrays[column][stock_codes] = stock.column(column)
+        
+        if safety_overrides:
+            arrays['safety_stock'][override_codes] = list(safety_overrides.values())
+        return arrays
+        
+    def run_trino_query_jsonl(self, query, types=None, required=False):
+        """
+        Exécute une requête Trino et range le JSONL en colonnes au fil du flux
+        (ni stdout ni une liste de lignes ne sont chargés en entier). Le
+        ColumnResult est mis en cache tel quel et lu par encode_sku_arrays.
+        required=True : une erreur interrompt l'exécution (RuntimeError) au lieu
+        d'être confondue avec un résultat vide.
+        """
+        key = self.query_cache.key(query, types) if self.query_cache else None
+        if key:
+            result = self.query_cache.get(key)
+            if result is not None:
+                print(f"    (cache: {len(result)} lignes, Trino non sollicité)")
+                return result
         
         try:
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True, timeout=30)
-            
-            if not result.stdout.strip():
-                return []
-            
-            # Parser le JSONL (une ligne = un objet JSON)
-            data = []
-            for line in result.stdout.strip().split('\n'):
-                if line.strip():
-                    try:
-                        data.append(json.loads(line))
-                    except json.JSONDecodeError:
-                        continue
-            
-            return data
+            # Une ligne = un objet JSON, décodé puis rangé dans ses colonnes dès sa lecture
+            result = ColumnResult.from_rows(iter_trino_rows(query, types), types)
+            # Seuls les résultats complets sont mis en cache, jamais les erreurs
+            if key:
+                self.query_cache.put(key, result, query)
+            return result
             
         except subprocess.CalledProcessError as e:
             print(f"Erreur Trino: {e.stderr}")
-            return []
+            if required:
+                raise RuntimeError(f"requête Trino en échec (code {e.returncode})") from e
+            return ColumnResult()
         except Exception as e:
             print(f"Erreur: {e}")
-            return []
+            if required:
+                raise RuntimeError(f"requête Trino en échec ({e})") from e
+            return ColumnResult()
     
     def get_aggregated_demand(self):
         """Récupère la demande agrégée"""
+        types = {'total_demand': int, 'order_count': int}
         print(f"1. Calcul de la demande pour {self.target_date}...")
         
+        # Lecture du rollup demand_daily (quelques lignes par SKU et magasin)
         query = f"""
         SELECT 
             sku_id,
-            SUM(CAST(quantity AS INTEGER)) as total_demand,
-            COUNT(*) as order_count
-        FROM hive.procurement.orders_raw 
+            SUM(qty) as total_demand,
+            SUM(order_count) as order_count
+        FROM {ROLLUP_TABLE}
         WHERE date = '{self.target_date}'
-        AND sku_id IS NOT NULL
         GROUP BY sku_id
-        HAVING SUM(CAST(quantity AS INTEGER)) > 0
+        HAVING SUM(qty) > 0
         ORDER BY total_demand DESC
         """
         
-        data = self.run_trino_query_jsonl(query)
+        data = self.run_trino_query_jsonl(query, types)
+        
+        if not data:
+            # Date alimentée par l'ingestion continue : somme des agrégats des micro-lots
+            query = f"""
+            SELECT 
+                sku_id,
+                SUM(qty) as total_demand,
+                SUM(order_count) as order_count
+            FROM ({stream_demand_sql(self.target_date)})
+            GROUP BY sku_id
+            HAVING SUM(qty) > 0
+            ORDER BY total_demand DESC
+            """
+            data = self.run_trino_query_jsonl(query, types)
+            if data:
+                print("    Rollup absent, demande lue depuis les micro-lots (demand_stream)")
+        
+        if not data:
+            # Partition du rollup absente : retour aux lignes brutes
+            print("    Rollup absent pour cette date, lecture des lignes valides de orders_raw")
+            query = f"""
+            SELECT 
+                sku_id,
+                SUM(quantity) as total_demand,
+                COUNT(*) as order_count
+            FROM ({clean_sql('orders', self.target_date)})
+            GROUP BY sku_id
+            ORDER BY total_demand DESC
+            """
+            data = self.run_trino_query_jsonl(query, types)
+        
         print(f"    {len(data)} SKU avec demande")
         
         if data:
@@ -273,21 +485,30 @@ class ProcurementGenerator:
         return data
     
     def get_stock_data(self):
-        """Récupère les données de stock"""
-        print(f"2. Récupération du stock pour {self.target_date}...")
-        
-        query = f"""
-        SELECT 
-            sku_id,
-            CAST(available_stock AS INTEGER) as available_stock,
-            CAST(reserved_stock AS INTEGER) as reserved_stock,
-            CAST(safety_stock AS INTEGER) as safety_stock
-        FROM hive.procurement.stock_raw 
-        WHERE date = '{self.target_date}'
-        AND sku_id IS NOT NULL
         """
-        
-        data = self.run_trino_query_jsonl(query)
+        Récupère les données de stock validées, avec le stock de sécurité maître.
+        Une erreur de requête interrompt l'exécution : un stock vide ferait
+        commander tout le catalogue.
+        """
+        print(f"2. Récupération du stock pour {self.target_date}...")
+        types = {'available_stock': int, 'reserved_stock': int, 'safety_stock': int}
+        
+        if self.stock_compact_every:
+            # Sans compaction antérieure, les deltas seuls ne donnent pas le stock
+            base = last_compaction_date(as_of_date=self.target_date)
+            if base is None:
+                print("    stock_current non amorcé à cette date (stock_state.py --seed), "
+                      "lecture de l'instantané stock_raw")
+            else:
+                # État courant : dernière compaction + variations jusqu'à la date
+                data = self.run_trino_query_jsonl(with_safety_stock_sql(stock_as_of_sql(self.target_date)), types,
+                                                  required=True)
+                print(f"    {len(data)} éléments de stock (état compacté du {base} + deltas)")
+                return data
+        
+        # Lignes rejetées par la validation exclues (voir ingest_quarantine)
+        query = with_safety_stock_sql(clean_sql('stock', self.target_date))
+        data = self.run_trino_query_jsonl(query, types, required=True)
         print(f"    {len(data)} éléments de stock trouvés")
         
         if data:
@@ -299,6 +520,30 @@ class ProcurementGenerator:
         """Récupère les produits avec leurs fournisseurs"""
         print("3. Récupération des produits et fournisseurs...")
         
+        # Projection précalculée côté PostgreSQL (sql/03_primary_supplier_index.sql) :
+        # lecture d'une seule relation étroite, entièrement poussée au connecteur
+        query = """
+        SELECT 
+            sku_id,
+            product_name,
+            CAST(unit_price AS DOUBLE) as unit_price,
+            pack_size,
+            min_order_quantity,
+            supplier_id,
+            lead_time_days,
+            supplier_name
+        FROM postgresql.public.primary_supplier_by_sku
+        """
+        
+        data = self.run_trino_query_jsonl(query)
+        
+        if data:
+            print(f"    {len(data)} produits avec fournisseurs")
+            print(f"   Exemple: {data[0].get('sku_id')} - {data[0].get('product_name')[:20]}...")
+            return data
+        
+        # Vue absente ou vide : jointure fédérée sur les tables maîtres
+        print("    Vue primary_supplier_by_sku absente, jointure des tables maîtres")
         query = """
         SELECT 
             p.sku_id,
@@ -323,89 +568,177 @@ class ProcurementGenerator:
         
         return data
     
-    def calculate_orders(self, demand_data, stock_data, product_data):
-        """Calcule les commandes avec affichage détaillé des calculs"""
-        print("4. Calcul des commandes...")
-        print("   ──────────────────────────────────────────────────────────")
-        print("   FORMULE DE CALCUL :")
-        print("   Demande Nette = MAX(0, Demande Client + Stock Sécurité - Stock Disponible)")
-        print("   ──────────────────────────────────────────────────────────")
-        
-        # Créer des dictionnaires pour un accès rapide
-        demand_dict = {}
-        for item in demand_data:
-            sku = item.get('sku_id')
-            if sku:
-                demand_dict[sku] = {
-                    'total_demand': int(item.get('total_demand', 0)),
-                    'order_count': int(item.get('order_count', 0))
-                }
+    def compute_dynamic_safety_stock(self, demand_data, product_data):
+        """Met à jour la fenêtre glissante et calcule le stock de sécurité par SKU"""
+        print(f"   Fenêtre glissante ({self.demand_window.window_days} jours)...")
         
-        stock_dict = {}
-        for item in stock_data:
-            sku = item.get('sku_id')
-            if sku:
-                try:
-                    stock_dict[sku] = {
-                        'available_stock': int(float(item.get('available_stock', 50))),
-                        'reserved_stock': int(float(item.get('reserved_stock', 0))),
-                        'safety_stock': int(float(item.get('safety_stock', 10)))
-                    }
-                except:
-                    stock_dict[sku] = {
-                        'available_stock': 50,
-                        'reserved_stock': 0,
-                        'safety_stock': 10
-                    }
+        demand_by_sku = {item['sku_id']: int(item.get('total_demand', 0))
+                         for item in demand_data if item.get('sku_id')}
+        if self.demand_window.update(self.target_date, demand_by_sku):
+            self.demand_window.save()
         
-        product_dict = {}
-        for item in product_data:
-            sku = item.get('sku_id')
-            if sku:
-                product_dict[sku] = item
+        lead_times = {item['sku_id']: item.get('lead_time_days', 7)
+                      for item in product_data if item.get('sku_id')}
+        safety = self.demand_window.safety_stock(lead_times, self.service_level)
+        
+        if safety:
+            print(f"    {len(safety)} stocks de sécurité dynamiques (niveau de service {self.service_level:.0%})")
+        else:
+            print(f"    Historique insuffisant ({len(self.demand_window.days)} jours), stock de sécurité statique")
+        return safety
+    
+    def consolidate_orders(self, orders, demand_data):
+        """Reporte le surplus des petites lignes sur les besoins suivants (horizon du délai)"""
+        print("   Consolidation des commandes...")
+        
+        # Prévision journalière : moyenne de la fenêtre glissante, sinon demande du jour
+        if self.demand_window and self.demand_window.days:
+            forecast = {sku: self.demand_window.stats(sku)[0] for sku in self.demand_window.sums}
+        else:
+            forecast = {item['sku_id']: int(item.get('total_demand', 0))
+                        for item in demand_data if item.get('sku_id')}
+        
+        orders = self.consolidator.consolidate(self.target_date, orders, forecast)
+        self.consolidator.save()
+        return orders
+    
+    def get_supplier_links(self):
+        """Récupère tous les liens produit-fournisseur (principaux et secondaires)"""
+        query = """
+        SELECT 
+            ps.sku_id,
+            ps.supplier_id,
+            s.supplier_name,
+            COALESCE(ps.lead_time_days, 7) as lead_time_days,
+            ps.is_primary
+        FROM postgresql.public.product_supplier ps
+        JOIN postgresql.public.suppliers s ON ps.supplier_id = s.supplier_id
+        WHERE ps.sku_id IS NOT NULL
+        """
+        # Un index vide après une erreur bloquerait tous les SKU : l'exécution s'arrête
+        return self.run_trino_query_jsonl(query, required=True)
+    
+    def build_supplier_index(self):
+        """Construit l'index fournisseurs par SKU une fois pour l'exécution"""
+        print("   Index des fournisseurs (bascule secondaire)...")
+        
+        links = self.get_supplier_links()
+        if not links:
+            print("    Aucun lien product_supplier : chaque SKU garde son fournisseur principal")
+        capacities = {}
+        for supplier_id, terms in self.get_supplier_terms().items():
+            if terms.get('truck_capacity_units') and terms.get('max_trucks'):
+                capacities[supplier_id] = int(terms['truck_capacity_units']) * int(terms['max_trucks'])
+        
+        self.supplier_index = SupplierIndex(links, self.failover_embargo, capacities)
+        print(f"    {len(links)} liens pour {len(self.supplier_index.by_sku)} SKU, "
+              f"{len(self.supplier_index.embargo)} fournisseurs sous embargo")
+    
+    def get_supplier_terms(self):
+        """Récupère les conditions commerciales des fournisseurs"""
+        query = """
+        SELECT 
+            supplier_id,
+            CAST(min_order_value AS DOUBLE) as min_order_value,
+            truck_capacity_units,
+            max_trucks
+        FROM postgresql.public.supplier_terms
+        """
+        data = self.run_trino_query_jsonl(query)
+        return {item['supplier_id']: item for item in data if item.get('supplier_id')}
+    
+    def apply_supplier_constraints(self, orders):
+        """Ajuste les quantités pour respecter valeur minimale et capacité camion"""
+        print("   Contraintes fournisseurs...")
+        
+        terms = self.get_supplier_terms()
+        if not terms:
+            print("    Aucune condition fournisseur définie")
+            return orders
+        
+        solver = SupplierConstraintSolver(terms, self.constraint_budget)
+        orders, report = solver.solve(orders)
+        print_report(report)
+        print(f"    {len(report)} fournisseurs contrôlés, {len(orders)} lignes après ajustement")
+        return orders
+    
+    def calculate_orders(self, demand_data, stock_data, product_data, safety_overrides=None,
+                         rounding=round_order_quantity, verbose=True):
+        """Calcule les commandes avec affichage détaillé des calculs"""
+        # verbose=False : même calcul sans affichage (simulations)
+        log = print if verbose else (lambda *args, **kwargs: None)
+        log("4. Calcul des commandes...")
+        log("   ──────────────────────────────────────────────────────────")
+        log("   FORMULE DE CALCUL :")
+        log("   Demande Nette = MAX(0, Demande Client + Stock Sécurité - Stock Disponible)")
+        log("   ──────────────────────────────────────────────────────────")
+        
+        import numpy as np
+        
+        # Tableaux indexés par code SKU : les jointures deviennent de l'indexation
+        product_rows = ColumnResult.of(product_data).nonempty('sku_id')
+        product_codes = self.sku_dictionary.encode(product_rows.column('sku_id'))
+        arrays = self.encode_sku_arrays(demand_data, stock_data, safety_overrides)
+        
+        # Un produit par SKU (la dernière ligne l'emporte), limité aux SKU demandés
+        latest = np.full(len(self.sku_dictionary), -1, dtype=np.int64)
+        latest[product_codes] = np.arange(len(product_codes))
+        selected = np.flatnonzero((latest[product_codes] == np.arange(len(product_codes)))
+                                  & arrays['has_demand'][product_codes])
+        codes = product_codes[selected]
+        
+        # Demande nette vectorisée sur tous les SKU retenus
+        demands = arrays['demand'][codes]
+        available_stocks = arrays['available_stock'][codes]
+        reserved_stocks = arrays['reserved_stock'][codes]
+        safety_stocks = arrays['safety_stock'][codes]
+        availables = available_stocks - reserved_stocks
+        net_demands = np.maximum(0, demands + safety_stocks - availables)
         
         # Calculer les commandes
         orders = []
         
-        print("   ┌─────────────────────────────────────────────────────────────────────────────────────┐")
-        print("   │ DÉTAIL DES CALCULS PAR SKU                                                          │")
-        print("   ├──────────────┬──────────┬──────────────┬──────────────┬──────────────┬──────────────┤")
-        print("   │     SKU      │ Demande  │ Stock Disp.  │ Stock Secur. │ Besoin Net   │ Résultat     │")
-        print("   ├──────────────┼──────────┼──────────────┼──────────────┼──────────────┼──────────────┤")
+        log("   ┌─────────────────────────────────────────────────────────────────────────────────────┐")
+        log("   │ DÉTAIL DES CALCULS PAR SKU                                                          │")
+        log("   ├──────────────┬──────────┬──────────────┬──────────────┬──────────────┬──────────────┤")
+        log("   │     SKU      │ Demande  │ Stock Disp.  │ Stock Secur. │ Besoin Net   │ Résultat     │")
+        log("   ├──────────────┼──────────┼──────────────┼──────────────┼──────────────┼──────────────┤")
         
         orders_count = 0
         no_order_count = 0
-        
-        for sku_id, product in product_dict.items():
-            if sku_id not in demand_dict:
-                continue  # Pas de demande pour ce produit
-            
-            demand = demand_dict[sku_id]['total_demand']
-            stock = stock_dict.get(sku_id, {
-                'available_stock': 50,
-                'reserved_stock': 0,
-                'safety_stock': 10
-            })
-            
-            # CALCUL DE LA DEMANDE NETTE
-            available = stock['available_stock'] - stock['reserved_stock']
-            net_demand = max(0, demand + stock['safety_stock'] - available)
+        blocked_count = 0
+        
+        rows = zip(selected.tolist(), demands.tolist(), available_stocks.tolist(),
+                   reserved_stocks.tolist(), safety_stocks.tolist(), availables.tolist(),
+                   net_demands.tolist())
+        for index, demand, available_stock, reserved_stock, safety_stock, available, net_demand in rows:
+            product = product_rows[index]
+            sku_id = product['sku_id']
+            stock = {
+                'available_stock': available_stock,
+                'reserved_stock': reserved_stock,
+                'safety_stock': safety_stock
+            }
             
             # Afficher le calcul
-            print(f"   │ {sku_id:<12} │ {demand:<8} │ {available:<12} │ {stock['safety_stock']:<12} │ {net_demand:<12} │", end="")
+            log(f"   │ {sku_id:<12} │ {demand:<8} │ {available:<12} │ {stock['safety_stock']:<12} │ {net_demand:<12} │", end="")
             
             if net_demand > 0:
                 # Appliquer les règles métier
                 pack_size = max(1, int(product.get('pack_size', 1)))
                 min_order_qty = int(product.get('min_order_quantity', 0))
                 
-                # Arrondir au pack supérieur
-                packs_needed = max(1, (net_demand + pack_size - 1) // pack_size)
-                order_quantity = packs_needed * pack_size
+                # Arrondir au pack supérieur et respecter la quantité minimale
+                order_quantity = rounding(net_demand, pack_size, min_order_qty)
                 
-                # Respecter la quantité minimale
-                if min_order_qty > 0 and order_quantity < min_order_qty:
-                    order_quantity = min_order_qty
+                # Fournisseur retenu : principal, ou suivant si bloqué
+                supplier = product
+                if self.supplier_index:
+                    supplier = self.supplier_index.route(sku_id, order_quantity, fallback=product)
+                    if supplier is None:
+                        blocked_count += 1
+                        log(f" BLOQUÉ (aucun fourn.) │")
+                        continue
                 
                 # Créer la commande
                 order_id = str(uuid.uuid4())
@@ -414,8 +747,8 @@ class ProcurementGenerator:
                 order_item = {
                     'order_id': order_id,
                     'order_date': self.target_date,
-                    'supplier_id': product.get('supplier_id'),
-                    'supplier_name': product.get('supplier_name'),
+                    'supplier_id': supplier.get('supplier_id'),
+                    'supplier_name': supplier.get('supplier_name'),
                     'sku_id': sku_id,
                     'product_name': product.get('product_name'),
                     'demand': demand,
@@ -425,9 +758,10 @@ class ProcurementGenerator:
                     'net_demand': net_demand,
                     'order_quantity': order_quantity,
                     'pack_size': pack_size,
+                    'min_order_quantity': min_order_qty,
                     'unit_price': unit_price,
                     'total_price': unit_price * order_quantity,
-                    'lead_time_days': int(product.get('lead_time_days', 7)),
+                    'lead_time_days': int(supplier.get('lead_time_days', 7)),
                     'calculated_at': datetime.now().isoformat(),
                     'calculation_details': {
                         'formula': 'max(0, demand + safety_stock - available_stock)',
@@ -438,36 +772,51 @@ class ProcurementGenerator:
                     }
                 }
                 
+                if supplier.get('supplier_id') != product.get('supplier_id'):
+                    order_item['routed_from'] = product.get('supplier_id')
+                    # product_supplier ne porte ni prix ni pack par fournisseur :
+                    # la ligne basculée reste valorisée aux conditions du principal
+                    order_item['price_source'] = 'primary'
+                
                 orders.append(order_item)
                 orders_count += 1
-                print(f" COMMANDE {order_quantity} unités │")
+                log(f" COMMANDE {order_quantity} unités │")
                 
             else:
                 no_order_count += 1
-                print(f" PAS DE COMMANDE     │")
+                log(f" PAS DE COMMANDE     │")
         
-        print("   └──────────────┴──────────┴──────────────┴──────────────┴──────────────┴──────────────┘")
+        log("   └──────────────┴──────────┴──────────────┴──────────────┴──────────────┴──────────────┘")
         
-        print("\n   ──────────────────────────────────────────────────────────")
-        print("   RÉSUMÉ DES CALCULS :")
-        print(f"   • {orders_count} SKU nécessitent une commande")
-        print(f"   • {no_order_count} SKU n'ont pas besoin de commande (stock suffisant)")
+        log("\n   ──────────────────────────────────────────────────────────")
+        log("   RÉSUMÉ DES CALCULS :")
+        log(f"   • {orders_count} SKU nécessitent une commande")
+        log(f"   • {no_order_count} SKU n'ont pas besoin de commande (stock suffisant)")
+        if blocked_count:
+            log(f"   • {blocked_count} SKU sans fournisseur disponible (embargo/capacité)")
         
         if orders_count > 0 and len(orders) > 0:
-            print("\n   EXEMPLES DE CALCULS DÉTAILLÉS :")
-            print("   ──────────────────────────────────────────────────────────")
+            log("\n   EXEMPLES DE CALCULS DÉTAILLÉS :")
+            log("   ──────────────────────────────────────────────────────────")
             
             for i, order in enumerate(orders[:3]):  # Juste les 3 premiers
                 details = order['calculation_details']
-                print(f"   Exemple {i+1} - {order['sku_id']}:")
-                print(f"     Formule : {details['formula']}")
-                print(f"     Calcul  : {details['calculation']}")
-                print(f"     Détail  : Demande({details['demand']}) + Sécurité({details['safety_stock']}) - Disponible({details['available_stock']}) = {order['net_demand']}")
-                print()
+                log(f"   Exemple {i+1} - {order['sku_id']}:")
+                log(f"     Formule : {details['formula']}")
+                log(f"     Calcul  : {details['calculation']}")
+                log(f"     Détail  : Demande({details['demand']}) + Sécurité({details['safety_stock']}) - Disponible({details['available_stock']}) = {order['net_demand']}")
+                log()
         
-        print(f"    {len(orders)} articles à commander")
+        log(f"    {len(orders)} articles à commander")
         return orders
     
+    def archive_orders(self, orders):
+        """Ajoute les lignes de commande de l'exécution à l'archive Parquet"""
+        print("5. Archivage des commandes...")
+        rows = self.archive.append(orders, self.target_date)
+        print(f"    {rows} lignes archivées ({self.archive.partition_path(self.target_date)})")
+        return rows
+    
     def generate_supplier_files(self, orders):
         """Génère les fichiers par fournisseur"""
         print("5. Génération des fichiers fournisseurs...")
@@ -487,129 +836,86 @@ class ProcurementGenerator:
                 }
             suppliers[supplier_id]['orders'].append(order)
         
-        # Générer les fichiers
+        # Générer les fichiers (fournisseurs déjà écrits lors d'une reprise : sautés)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
         files_generated = 0
+        errors = 0
+        done = self.checkpoint.done_items('supplier_files') if self.checkpoint else set()
         
         for supplier_id, data in suppliers.items():
-            safe_id = supplier_id.replace('/', '_')
+            if supplier_id in done:
+                print(f"    {supplier_id}: déjà généré")
+                continue
             
-            # Fichier JSON
-            json_file = self.output_dir / f"supplier_{safe_id}_{self.target_date}.json"
             try:
-                with open(json_file, 'w', encoding='utf-8') as f:
-                    json.dump({
-                        'supplier_id': supplier_id,
-                        'supplier_name': data['supplier_name'],
-                        'order_date': self.target_date,
-                        'total_items': len(data['orders']),
-                        'total_value': sum(o['total_price'] for o in data['orders']),
-                        'generated_at': datetime.now().isoformat(),
-                        'items': data['orders']
-                    }, f, indent=2, ensure_ascii=False)
-                
-                # Fichier CSV
-                csv_file = self.output_dir / f"supplier_{safe_id}_{self.target_date}.csv"
-                with open(csv_file, 'w', newline='', encoding='utf-8') as f:
-                    writer = csv.writer(f)
-                    writer.writerow(['SKU', 'PRODUIT', 'DEMANDE', 'STOCK_DISPONIBLE', 'STOCK_SECURITE', 
-                                    'BESOIN_NET', 'QUANTITE_COMMANDEE', 'TAILLE_PACK', 'PRIX_UNITAIRE', 'TOTAL'])
-                    
-                    for order in data['orders']:
-                        writer.writerow([
-                            order['sku_id'],
-                            order['product_name'],
-                            order['demand'],
-                            order['available_stock'],
-                            order['safety_stock'],
-                            order['net_demand'],
-                            order['order_quantity'],
-                            order['pack_size'],
-                            f"{order['unit_price']:.2f}",
-                            f"{order['total_price']:.2f}"
-                        ])
+                # Fichiers JSON et CSV
+                write_supplier_json(supplier_file_path(self.output_dir, supplier_id, self.target_date, 'json'),
+                                    supplier_id, data['supplier_name'], self.target_date, data['orders'])
+                write_supplier_csv(supplier_file_path(self.output_dir, supplier_id, self.target_date, 'csv'),
+                                   data['orders'])
                 
                 files_generated += 2
                 total_value = sum(o['total_price'] for o in data['orders'])
                 print(f"    {supplier_id}: {len(data['orders'])} articles, {total_value:.2f}€")
+                if self.checkpoint:
+                    self.checkpoint.mark_item('supplier_files', supplier_id)
                 
             except Exception as e:
+                errors += 1
                 print(f"    Erreur pour {supplier_id}: {e}")
         
+        if errors and self.checkpoint:
+            return False  # étape à reprendre
         return files_generated
     def verify_cassandra_storage(self):
-        """Vérifie que les données ont bien été stockées dans Cassandra"""
-        print("\n    Vérification du stockage Cassandra...")
-        
+        """Vérifie que les données ont bien été stockées dans Cassandra (lecture par partition)"""
         try:
-            # Compter le nombre d'enregistrements pour cette date
-            query = f"SELECT COUNT(*) FROM procurement.supplier_orders WHERE order_date = '{self.target_date}';"
-            cmd = ['docker-compose', 'exec', '-T', 'cassandra', 'cqlsh', '-e', query]
-            result = subprocess.run(cmd, capture_output=True, text=True, check=False, timeout=10)
-            
-            if result.returncode == 0:
-                print(f"    📊 {result.stdout.strip()} commandes trouvées pour {self.target_date}")
-            else:
-                print(f"    ⚠️  Impossible de vérifier: {result.stderr[:100]}")
-                
+            # Écriture double : la table par date (buckets) est contrôlée aussi
+            report = reconcile(self.target_date, self.output_dir, archive=self.archive,
+                               by_date=self.dual_write)
+            if report:
+                print(f"    Rapport: {save_report(report)}")
+                return (report['partitions_ok'] == report['partitions_checked']
+                        and report.get('by_date', {'ok': True})['ok'])
         except Exception as e:
             print(f"    ⚠️  Erreur lors de la vérification: {e}")
-    def store_demand_calculations(self, orders, demand_data, stock_data):
+        return False
+    
+    def store_demand_calculations(self, orders, demand_data, stock_data, safety_overrides=None):
         """Stocke les calculs de demande dans Cassandra"""
         print("\n7. Stockage des calculs de demande...")
         
         stored_count = 0
         error_count = 0
         
-        # Créer des dictionnaires pour un accès rapide
-        demand_dict = {}
-        for item in demand_data:
-            sku = item.get('sku_id')
-            if sku:
-                demand_dict[sku] = int(item.get('total_demand', 0))
-        
-        stock_dict = {}
-        for item in stock_data:
-            sku = item.get('sku_id')
-            if sku:
-                try:
-                    stock_dict[sku] = {
-                        'available_stock': int(float(item.get('available_stock', 50))),
-                        'safety_stock': int(float(item.get('safety_stock', 10)))
-                    }
-                except:
-                    stock_dict[sku] = {
-                        'available_stock': 50,
-                        'safety_stock': 10
-                    }
+        import numpy as np
         
-        orders_dict = {}
-        for order in orders:
-            sku = order['sku_id']
-            orders_dict[sku] = order['order_quantity']
+        # Tableaux indexés par code SKU
+        order_codes = self.sku_dictionary.encode([order['sku_id'] for order in orders])
+        arrays = self.encode_sku_arrays(demand_data, stock_data, safety_overrides)
+        ordered = np.zeros(len(self.sku_dictionary), dtype=np.int64)
+        ordered[order_codes] = [order['order_quantity'] for order in orders]
+        
+        # Pour stocker tous les SKU avec demande (ordre de première apparition)
+        demand_codes = arrays['demand_codes']
+        _, first = np.unique(demand_codes, return_index=True)
+        codes = demand_codes[np.sort(first)]
+        total = len(codes)
         
-        # Pour stocker tous les SKU avec demande
-        skus_to_store = list(demand_dict.keys())
+        print(f"    Stockage des calculs pour {total} SKU...")
+        done = self.checkpoint.done_items('demand_calculations') if self.checkpoint else set()
         
-        print(f"    Stockage des calculs pour {len(skus_to_store)} SKU...")
+        codes = codes[:200]  # Limiter aux 200 premiers
+        demands = arrays['demand'][codes]
+        available_stocks = arrays['available_stock'][codes]
+        net_demands = np.maximum(0, demands + arrays['safety_stock'][codes] - available_stocks)
+        rows = zip(self.sku_dictionary.decode(codes), demands.tolist(), available_stocks.tolist(),
+                   net_demands.tolist(), ordered[codes].tolist())
         
-        for i, sku_id in enumerate(skus_to_store[:200], 1):  # Limiter aux 200 premiers
+        for i, (sku_id, demand, available_stock, net_demand, final_order_quantity) in enumerate(rows, 1):
+            if sku_id in done:
+                continue
             try:
-                demand = demand_dict.get(sku_id, 0)
-                
-                # Récupérer les données de stock
-                stock_info = stock_dict.get(sku_id, {
-                    'available_stock': 50,
-                    'safety_stock': 10
-                })
-                available_stock = stock_info['available_stock']
-                safety_stock = stock_info['safety_stock']
-                
-                # Calculer la demande nette
-                net_demand = max(0, demand + safety_stock - available_stock)
-                
-                # Récupérer la quantité commandée (si applicable)
-                final_order_quantity = orders_dict.get(sku_id, 0)
-                
                 # Échapper les guillemets
                 safe_sku_id = sku_id.replace("'", "''")
                 
@@ -621,16 +927,22 @@ class ProcurementGenerator:
                     f"{net_demand}, {final_order_quantity}, toTimestamp(now()));"
                 )
                 
+                if self.dual_write:
+                    query = logged_batch([query, demand_calculation_insert_by_date(
+                        self.target_date, sku_id, demand, available_stock, net_demand, final_order_quantity)])
+                
                 # Exécuter la commande
                 cmd = ['docker-compose', 'exec', '-T', 'cassandra', 'cqlsh', '-e', query]
                 result = subprocess.run(cmd, capture_output=True, text=True, check=False, timeout=5)
                 
                 if result.returncode == 0:
                     stored_count += 1
+                    if self.checkpoint:
+                        self.checkpoint.mark_item('demand_calculations', sku_id)
                     if i <= 3:  # Afficher les 3 premiers
                         print(f"    {i:3d}. ✓ {sku_id}: dmd={demand}, stk={available_stock}, net={net_demand}")
                     elif i % 20 == 0:  # Afficher la progression
-                        print(f"    Progression: {i}/{len(skus_to_store)}")
+                        print(f"    Progression: {i}/{total}")
                 else:
                     error_count += 1
                     if error_count <= 3:
@@ -640,6 +952,7 @@ class ProcurementGenerator:
                 error_count += 1
         
         print(f"\n    Résumé calculs: {stored_count} calculs stockés, {error_count} erreurs")
+        return error_count == 0
     def store_in_cassandra(self, orders):
         """Stocke les résultats dans Cassandra"""
         print("6. Stockage dans Cassandra...")
@@ -650,8 +963,12 @@ class ProcurementGenerator:
         
         stored_count = 0
         error_count = 0
+        done = self.checkpoint.done_items('cassandra_orders') if self.checkpoint else set()
         
         for i, order in enumerate(orders, 1):
+            key = f"{order['supplier_id']}/{order['sku_id']}"
+            if key in done:
+                continue  # insérée lors d'une exécution précédente
             try:
                 # Utiliser uuid() de Cassandra pour générer l'ID
                 # Échapper les guillemets simples dans les chaînes
@@ -666,6 +983,10 @@ class ProcurementGenerator:
                     f"{order['order_quantity']}, 'GENERATED', toTimestamp(now()));"
                 )
                 
+                if self.dual_write:
+                    # Même commande dans les tables par date et par fournisseur, en un batch
+                    query = logged_batch(supplier_order_inserts(order, self.target_date))
+                
                 # Afficher un exemple de requête
                 if i == 1:
                     print(f"    Exemple de requête: {query[:150]}...")
@@ -676,6 +997,8 @@ class ProcurementGenerator:
                 
                 if result.returncode == 0:
                     stored_count += 1
+                    if self.checkpoint:
+                        self.checkpoint.mark_item('cassandra_orders', key)
                     if stored_count % 10 == 0:  # Afficher la progression
                         print(f"    Progression: {stored_count}/{len(orders)}")
                 else:
@@ -691,10 +1014,23 @@ class ProcurementGenerator:
                 print(f"    {i:3d}. ❌ Exception: {str(e)[:50]}")
         
         print(f"\n    Résumé: {stored_count} commandes stockées, {error_count} erreurs")
-        
-        # Vérifier le résultat
+        if done:
+            print(f"    {len(done)} commandes déjà stockées lors d'une exécution précédente")
+        return error_count == 0
 
     
+    def run_stage(self, stage, func, *args):
+        """Exécute une étape de sortie, sautée si déjà terminée lors d'une exécution précédente"""
+        if self.checkpoint and self.checkpoint.is_done(stage):
+            print(f"\n Reprise: étape '{stage}' déjà terminée")
+            return self.checkpoint.manifest['stages'][stage].get('result')
+        
+        result = func(*args)
+        # False = étape incomplète (erreurs), à reprendre à la prochaine exécution
+        if self.checkpoint and result is not False:
+            self.checkpoint.mark_done(stage, result=result)
+        return result
+    
     def run_processing_pipeline(self):
         """Exécute le pipeline complet de traitement"""
         print(f"\n{'='*80}")
@@ -702,24 +1038,66 @@ class ProcurementGenerator:
         print(f"Date: {self.target_date}")
         print(f"{'='*80}\n")
         
+        checkpoint = self.checkpoint
+        
         try:
-            # Étape 1: Demande
-            demand_data = self.get_aggregated_demand()
-            if not demand_data:
-                print(" Aucune demande trouvée")
-                return False
-            
-            # Étape 2: Stock
-            stock_data = self.get_stock_data()
+            if checkpoint and checkpoint.is_done('inputs'):
+                # Reprise : pas de nouvelle requête Trino
+                print(" Reprise: données d'entrée relues depuis le point de reprise")
+                demand_data = checkpoint.load_rows('demand')
+                stock_data = checkpoint.load_rows('stock')
+                product_data = checkpoint.load_rows('products')
+            else:
+                # Étape 1: Demande
+                demand_data = self.get_aggregated_demand()
+                if not demand_data:
+                    print(" Aucune demande trouvée")
+                    return False
+                
+                # Étape 2: Stock
+                stock_data = self.get_stock_data()
+                
+                # Étape 3: Produits
+                product_data = self.get_products_with_suppliers()
+                if not product_data:
+                    print(" Aucun produit trouvé")
+                    return False
+                
+                if checkpoint:
+                    checkpoint.save_rows('demand', demand_data)
+                    checkpoint.save_rows('stock', stock_data)
+                    checkpoint.save_rows('products', product_data)
+                    checkpoint.mark_done('inputs', demand=len(demand_data), stock=len(stock_data),
+                                         products=len(product_data))
             
-            # Étape 3: Produits
-            product_data = self.get_products_with_suppliers()
-            if not product_data:
-                print(" Aucun produit trouvé")
-                return False
+            if self.stock_compact_every:
+                # Compaction périodique de l'état du stock (après lecture des entrées)
+                self.run_stage('stock_compaction', compact_if_due, self.target_date, self.stock_compact_every)
             
-            # Étape 4: Calcul
-            orders = self.calculate_orders(demand_data, stock_data, product_data)
+            if checkpoint and checkpoint.is_done('orders'):
+                print(" Reprise: commandes relues depuis le point de reprise")
+                saved = checkpoint.load_json('orders')
+                orders = saved['orders']
+                safety_overrides = saved['safety_overrides']
+            else:
+                if self.failover_embargo is not None:
+                    self.build_supplier_index()
+                
+                # Étape 4: Calcul (stock de sécurité dynamique si fenêtre active)
+                safety_overrides = None
+                if self.demand_window:
+                    safety_overrides = self.compute_dynamic_safety_stock(demand_data, product_data)
+                orders = self.calculate_orders(demand_data, stock_data, product_data, safety_overrides)
+                
+                if self.consolidator and orders:
+                    orders = self.consolidate_orders(orders, demand_data)
+                
+                if self.constraint_budget and orders:
+                    orders = self.apply_supplier_constraints(orders)
+                
+                if checkpoint:
+                    checkpoint.save_json('orders', {'orders': orders, 'safety_overrides': safety_overrides})
+                    checkpoint.mark_done('orders', lines=len(orders))
             
             if not orders:
                 print(f"\n{'='*60}")
@@ -727,17 +1105,25 @@ class ProcurementGenerator:
                 print("   Raison : Stock suffisant pour couvrir la demande + sécurité")
                 print(f"{'='*60}")
                 # Stocker quand même les calculs même sans commande
-                self.store_demand_calculations([], demand_data, stock_data)
+                self.run_stage('demand_calculations', self.store_demand_calculations,
+                               [], demand_data, stock_data, safety_overrides)
                 return True
             
-            # Étape 5: Génération fichiers
-            files_count = self.generate_supplier_files(orders)
+            # Étape 5: Archive Parquet, fichiers fournisseurs si demandés
+            if self.archive:
+                self.run_stage('order_archive', self.archive_orders, orders)
+            files_count = 0
+            if self.supplier_files:
+                files_count = self.run_stage('supplier_files', self.generate_supplier_files, orders)
             
             # Étape 6: Stockage des commandes dans Cassandra
-            self.store_in_cassandra(orders)
+            self.run_stage('cassandra_orders', self.store_in_cassandra, orders)
+            if self.verify_cassandra:
+                self.verify_cassandra_storage()
             
             # Étape 7: Stockage des calculs de demande
-            self.store_demand_calculations(orders, demand_data, stock_data)
+            self.run_stage('demand_calculations', self.store_demand_calculations,
+                           orders, demand_data, stock_data, safety_overrides)
             
             # Rapport final
             print(f"\n{'='*80}")
@@ -752,7 +1138,12 @@ class ProcurementGenerator:
             print(f"   Commandes générées: {total_items}")
             print(f"   Fournisseurs concernés: {supplier_count}")
             print(f"   Valeur totale des commandes: {total_value:.2f}€")
-            print(f"   Fichiers générés: {files_count}")
+            if files_count is False:
+                print("   Fichiers générés: incomplet (erreurs, voir ci-dessus)")
+            elif not self.supplier_files:
+                print("   Fichiers générés: aucun (archive Parquet, voir order_archive.py --export)")
+            else:
+                print(f"   Fichiers générés: {files_count}")
             
             # Statistiques
             if orders:
@@ -777,10 +1168,17 @@ class ProcurementGenerator:
 class CompletePipeline:
     """Pipeline complet qui combine upload et traitement"""
     
-    def __init__(self, target_date=None):
+    def __init__(self, target_date=None, batch_exec=False, demand_window=None, service_level=0.95,
+                 consolidator=None, constraint_budget=None, failover_embargo=None, checkpoint=None,
+                 verify_cassandra=False, dual_write=False, stock_compact_every=None, query_cache=None,
+                 archive=None, supplier_files=True):
         self.target_date = target_date or Config.get_today()
-        self.uploader = HDFSUploader(self.target_date)
-        self.processor = ProcurementGenerator(self.target_date)
+        self.uploader = HDFSUploader(self.target_date, batch_exec=batch_exec)
+        self.processor = ProcurementGenerator(self.target_date, demand_window, service_level, consolidator,
+                                              constraint_budget, failover_embargo, checkpoint,
+                                              verify_cassandra, dual_write, stock_compact_every, query_cache,
+                                              archive, supplier_files)
+        self.checkpoint = checkpoint
         self.start_time = datetime.now()
     
     def run(self):
@@ -796,15 +1194,21 @@ class CompletePipeline:
         print(f"ÉTAPE 1: UPLOAD VERS HDFS")
         print(f"{'='*80}")
         
-        upload_success = self.uploader.run_upload_pipeline()
-        if not upload_success:
-            print(" Échec de l'upload HDFS, arrêt du pipeline")
-            return False
-        
-        # Pause pour laisser Hive se synchroniser
-        import time
-        print("\n Attente de 5 secondes pour la synchronisation Hive...")
-        time.sleep(5)
+        if self.checkpoint and self.checkpoint.is_done('upload'):
+            print(" Reprise: upload déjà terminé pour cette date")
+            upload_success = True
+        else:
+            upload_success = self.uploader.run_upload_pipeline()
+            if not upload_success:
+                print(" Échec de l'upload HDFS, arrêt du pipeline")
+                return False
+            if self.checkpoint:
+                self.checkpoint.mark_done('upload', files=len(self.uploader.copied_files))
+            
+            # Pause pour laisser Hive se synchroniser
+            import time
+            print("\n Attente de 5 secondes pour la synchronisation Hive...")
+            time.sleep(5)
         
         # ÉTAPE 2: Traitement des données
         print(f"\n{'='*80}")
@@ -813,6 +1217,10 @@ class CompletePipeline:
         
         processing_success = self.processor.run_processing_pipeline()
         
+        # Rafraîchir uniquement la partition de la date traitée
+        if processing_success:
+            self.processor.run_stage('materialized_views', refresh_materialized_views, self.target_date)
+        
         # Rapport final
         end_time = datetime.now()
         duration = end_time - self.start_time
@@ -836,8 +1244,8 @@ class CompletePipeline:
         
         return upload_success and processing_success
 
-def main():
-    """Fonction principale"""
+def build_parser():
+    """Options de la ligne de commande (réutilisées par store_watcher.py)"""
     parser = argparse.ArgumentParser(
         description='Pipeline complet: Upload HDFS + Traitement des commandes fournisseurs',
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -847,6 +1255,8 @@ Exemples d'utilisation:
   python3 pipeline_complete.py                       # Traite la date d'aujourd'hui
   python3 pipeline_complete.py --upload-only        # Upload seulement
   python3 pipeline_complete.py --process-only       # Traitement seulement
+  python3 pipeline_complete.py --batch-exec         # Un seul exec namenode par étape
+  python3 pipeline_complete.py --date 2026-01-08 --resume  # Reprend une exécution interrompue
         """
     )
     
@@ -866,22 +1276,144 @@ Exemples d'utilisation:
                        action='store_true',
                        help='Tester la structure du stock')
     
+    parser.add_argument('--batch-exec',
+                       action='store_true',
+                       help='Regrouper les commandes namenode dans un seul exec par étape')
+    
+    parser.add_argument('--rebuild-rollup',
+                       action='store_true',
+                       help='Reconstruire le rollup demand_daily avant le traitement')
+    
+    parser.add_argument('--window-days',
+                       type=int,
+                       default=0,
+                       help='Stock de sécurité dynamique sur une fenêtre glissante de N jours (0 = statique)')
+    
+    parser.add_argument('--service-level',
+                       type=float,
+                       default=0.95,
+                       help='Niveau de service pour le stock de sécurité dynamique (défaut: 0.95)')
+    
+    parser.add_argument('--consolidate',
+                       action='store_true',
+                       help='Consolider les petites commandes sur l\'horizon du délai fournisseur')
+    
+    parser.add_argument('--min-line-value',
+                       type=float,
+                       default=50.0,
+                       help='Valeur (€) en dessous de laquelle une ligne est consolidée (défaut: 50)')
+    
+    parser.add_argument('--supplier-constraints',
+                       action='store_true',
+                       help='Appliquer les conditions supplier_terms (valeur minimale, capacité camion)')
+    
+    parser.add_argument('--constraint-budget',
+                       type=float,
+                       default=2.0,
+                       help='Budget de temps (s) du solveur de contraintes, par fournisseur (défaut: 2)')
+    
+    parser.add_argument('--failover',
+                       action='store_true',
+                       help='Router vers un fournisseur secondaire si le principal est bloqué')
+    
+    parser.add_argument('--embargo',
+                       default='',
+                       help='Fournisseurs bloqués, séparés par des virgules (ex: SUP003,SUP007)')
+    
+    parser.add_argument('--resume',
+                       action='store_true',
+                       help='Reprendre une exécution interrompue de la date (mêmes options) '
+                            'à partir de ses points de reprise (checkpoints/date=...)')
+    
+    parser.add_argument('--no-checkpoint',
+                       action='store_true',
+                       help='Ne pas enregistrer de points de reprise')
+    
+    parser.add_argument('--verify-cassandra',
+                       action='store_true',
+                       help='Réconcilier Cassandra et les fichiers fournisseurs partition par partition')
+    
+    parser.add_argument('--dual-write',
+                       action='store_true',
+                       help='Écrire aussi dans les tables Cassandra par date (buckets) et par fournisseur')
+    
+    parser.add_argument('--stock-deltas',
+                       action='store_true',
+                       help='Lire le stock depuis l\'état compacté + deltas au lieu des instantanés')
+    
+    parser.add_argument('--compact-every',
+                       type=int,
+                       default=7,
+                       help='Compacter l\'état du stock tous les N jours (avec --stock-deltas, défaut: 7)')
+    
+    parser.add_argument('--no-query-cache',
+                       action='store_true',
+                       help='Toujours interroger Trino (ignorer le cache des résultats)')
+    
+    parser.add_argument('--no-archive',
+                       action='store_true',
+                       help='Ne pas archiver les commandes en Parquet (fichiers fournisseurs toujours générés)')
+    
+    parser.add_argument('--supplier-files',
+                       action='store_true',
+                       help='Générer aussi les fichiers JSON/CSV par fournisseur (sinon: order_archive.py --export)')
+    
     parser.add_argument('--verbose', '-v',
                        action='store_true',
                        help='Afficher plus de détails')
     
-    args = parser.parse_args()
+    return parser
+
+def main():
+    """Fonction principale"""
+    args = build_parser().parse_args()
+    
+    demand_window = None
+    if args.window_days > 0:
+        demand_window = RollingDemandWindow(args.window_days).load()
+    
+    consolidator = None
+    if args.consolidate:
+        consolidator = OrderConsolidator(min_line_value=args.min_line_value).load()
+    
+    constraint_budget = args.constraint_budget if args.supplier_constraints else None
+    
+    failover_embargo = None
+    if args.failover:
+        failover_embargo = [s.strip() for s in args.embargo.split(',') if s.strip()]
+    
+    stock_compact_every = max(1, args.compact_every) if args.stock_deltas else None
+    
+    query_cache = None if args.no_query_cache else QueryCache()
+    
+    archive = None if args.no_archive else OrderArchive()
+    supplier_files = args.supplier_files or archive is None
     
     if args.upload_only:
         # Upload HDFS seulement
-        uploader = HDFSUploader(args.date)
+        uploader = HDFSUploader(args.date, batch_exec=args.batch_exec)
         success = uploader.run_upload_pipeline()
         exit(0 if success else 1)
     
-    elif args.process_only:
+    # Points de reprise : toujours enregistrés, réutilisés seulement avec --resume
+    checkpoint = None
+    if not args.no_checkpoint and not args.test_stock:
+        params = {name: getattr(args, name) for name in CHECKPOINT_PARAMS}
+        params['mode'] = 'process' if args.process_only else 'run'
+        checkpoint = CheckpointStore(args.date, params=params).start(args.resume)
+    
+    if args.process_only:
         # Traitement seulement
-        processor = ProcurementGenerator(args.date)
+        if args.rebuild_rollup:
+            validate_partition(args.date)
+            refresh_demand_rollup(args.date)
+        processor = ProcurementGenerator(args.date, demand_window, args.service_level, consolidator,
+                                         constraint_budget, failover_embargo, checkpoint,
+                                         args.verify_cassandra, args.dual_write, stock_compact_every,
+                                         query_cache, archive, supplier_files)
         success = processor.run_processing_pipeline()
+        if success:
+            processor.run_stage('materialized_views', refresh_materialized_views, args.date)
         exit(0 if success else 1)
     
     elif args.test_stock:
@@ -901,7 +1433,7 @@ Exemples d'utilisation:
         # Essayer différentes colonnes
         queries = [
             ("Test 1 - toutes colonnes", f"SELECT * FROM hive.procurement.stock_raw WHERE date = '{args.date}' LIMIT 3"),
-            ("Test 2 - colonnes individuelles", f"SELECT sku_id, available_stock, reserved_stock, safety_stock FROM hive.procurement.stock_raw WHERE date = '{args.date}' LIMIT 3"),
+            ("Test 2 - colonnes individuelles", f"SELECT sku_id, available_stock, reserved_stock FROM hive.procurement.stock_raw WHERE date = '{args.date}' LIMIT 3"),
             ("Test 3 - avec filtrage SKU", f"SELECT * FROM hive.procurement.stock_raw WHERE date = '{args.date}' AND reserved_stock LIKE 'SKU%' LIMIT 3"),
         ]
         
@@ -916,7 +1448,13 @@ Exemples d'utilisation:
     
     else:
         # Pipeline complet
-        pipeline = CompletePipeline(args.date)
+        pipeline = CompletePipeline(args.date, batch_exec=args.batch_exec,
+                                    demand_window=demand_window, service_level=args.service_level,
+                                    consolidator=consolidator, constraint_budget=constraint_budget,
+                                    failover_embargo=failover_embargo, checkpoint=checkpoint,
+                                    verify_cassandra=args.verify_cassandra, dual_write=args.dual_write,
+                                    stock_compact_every=stock_compact_every, query_cache=query_cache,
+                                    archive=archive, supplier_files=supplier_files)
         success = pipeline.run()
         exit(0 if success else 1)
 
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+CACHE DES RÉSULTATS TRINO
+Les résultats de requêtes sont conservés sur disque en Parquet, sous une clé
+= SQL normalisé + version des partitions lues. La version vient d'un
+manifeste local (Config.PARTITION_MANIFEST) que chaque écrivain du
+pipeline (upload, rollup, vues, flux, compaction, données maîtres) met à
+jour : une date close dont les entrées n'ont pas changé ne sollicite plus
+Trino. Les données maîtres (tables PostgreSQL, CSV maîtres de Hive) peuvent
+être régénérées hors du pipeline : les résultats qui en lisent expirent après
+MASTER_TTL secondes. Les résultats vides ne sont jamais conservés. Taille
+totale bornée, éviction LRU. Watcher, flux et pipeline partagent le cache :
+manifeste et index ne sont modifiés que sous verrou (relu, modifié, réécrit).
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from settings import Config
+from trino_stream import ColumnResult
+
+TABLE_PATTERN = re.compile(r'\b(hive|postgresql)\.(\w+)\."?(\w+)', re.IGNORECASE)
+DATE_PATTERN = re.compile(r"'(\d{4}-\d{2}-\d{2})'")
+ALL_DATES = '*'
+MASTER_TTL = 3600
+# Tables Hive non partitionnées sur les CSV de /raw/master, remplacés sans passer par record_write
+HIVE_MASTER_TABLES = {'hive.procurement.products', 'hive.procurement.suppliers',
+                      'hive.procurement.product_supplier', 'hive.procurement.safety_stock'}
+
+
+@contextmanager
+def file_lock(path):
+    """Verrou exclusif inter-processus (fichier <path>.lock)"""
+    import fcntl
+
+    lock_path = Path(f"{path}.lock")
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def is_master_table(table):
+    """Données maîtres modifiables hors du pipeline (expiration plutôt que manifeste)"""
+    return table.startswith('postgresql.') or table in HIVE_MASTER_TABLES
+
+
+# ---------- Manifeste des partitions écrites ----------
+def load_manifest(path=None):
+    path = Path(path or Config.PARTITION_MANIFEST)
+    if not path.exists():
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def record_write(table, target_date=None, path=None):
+    """
+    Signale une écriture dans une table (pour une date, ou toute la table).
+    Les résultats en cache qui lisent cette table à cette date ou après sont invalidés.
+    """
+    path = Path(path or Config.PARTITION_MANIFEST)
+    # Relu sous verrou : une écriture concurrente (watcher, flux) n'est pas perdue
+    with file_lock(path):
+        manifest = load_manifest(path)
+        manifest.setdefault(table.lower(), {})[target_date or ALL_DATES] = time.time()
+        tmp = path.with_suffix(f'.{time.time_ns()}.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        tmp.replace(path)  # écriture atomique
+
+
+def normalize_sql(query):
+    """Espaces et point-virgule final normalisés, littéraux intacts"""
+    parts = query.strip().rstrip(';').split("'")
+    # Indices pairs : hors littéraux
+    return "'".join(" ".join(p.split()) if i % 2 == 0 else p for i, p in enumerate(parts)).strip()
+
+
+def referenced_tables(query):
+    """Tables lues par la requête, en minuscules (catalogue.schéma.table)"""
+    return sorted({f"{c}.{s}.{t.split('$')[0]}".lower() for c, s, t in TABLE_PATTERN.findall(query)})
+
+
+def partition_version(query, manifest):
+    """
+    Version des entrées de la requête : écritures enregistrées sur les tables lues,
+    aux dates <= la plus grande date citée (toutes les dates si aucune n'est citée).
+    Conservateur pour les filtres d'égalité comme pour les bornes <= des requêtes as-of.
+    """
+    dates = DATE_PATTERN.findall(query)
+    horizon = max(dates) if dates else None
+    version = {}
+    for table in referenced_tables(query):
+        writes = manifest.get(table, {})
+        version[table] = sorted(
+            (d, stamp) for d, stamp in writes.items()
+            if d == ALL_DATES or horizon is None or d <= horizon
+        )
+    return version
+
+
+# ---------- Cache disque ----------
+class QueryCache:
+    """
+    Résultats de requêtes en Parquet, taille totale bornée (LRU).
+    L'index (taille, expiration) n'est réécrit que par put(), clear() et la purge
+    d'une entrée expirée ; une lecture ne fait que dater le fichier (mtime = dernier accès).
+    """
+
+    def __init__(self, root=None, max_bytes=256 * 1024 * 1024, manifest_path=None,
+                 master_ttl=MASTER_TTL):
+        self.root = Path(root or Config.QUERY_CACHE_DIR)
+        self.max_bytes = max_bytes
+        self.manifest_path = manifest_path
+        self.master_ttl = master_ttl
+        self.index_path = self.root / "index.json"
+        self.index = self._load_index()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, query, types=None):
+        """Clé : SQL normalisé + version des partitions + typage demandé"""
+        if not referenced_tables(query):
+            return None  # SHOW, CALL... : jamais en cache
+        payload = json.dumps({
+            'sql': normalize_sql(query),
+            'version': partition_version(query, load_manifest(self.manifest_path)),
+            'types': {column: cast.__name__ for column, cast in (types or {}).items()}
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _load_index(self):
+        if not self.index_path.exists():
+            return {}
+        with open(self.index_path, encoding='utf-8') as f:
+            return json.load(f)
+
+    @contextmanager
+    def _locked_index(self):
+        """Index relu sous verrou, modifié par l'appelant puis réécrit atomiquement"""
+        self.root.mkdir(parents=True, exist_ok=True)
+        with file_lock(self.index_path):
+            index = self._load_index()
+            yield index
+            tmp = self.index_path.with_suffix(f'.{os.getpid()}.tmp')
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(index, f)
+            tmp.replace(self.index_path)
+        self.index = index
+
+    def get(self, key):
+        """Résultat en cache (ColumnResult), ou None"""
+        entry = self.index.get(key) if key else None
+        if entry is None:
+            # Entrée ajoutée par un autre processus depuis l'ouverture
+            self.index = self._load_index()
+            entry = self.index.get(key) if key else None
+        path = self.root / f"{key}.parquet"
+        if entry is not None and entry.get('expires') and entry['expires'] < time.time():
+            with self._locked_index() as index:
+                index.pop(key, None)
+                path.unlink(missing_ok=True)  # données maîtres potentiellement régénérées
+            entry = None
+        if entry is None or not path.exists():
+            self.misses += 1
+            return None
+
+        import pyarrow.parquet as pq
+
+        try:
+            result = ColumnResult.from_arrow(pq.read_table(path))
+            os.utime(path)  # dernier accès, pour l'éviction LRU
+        except FileNotFoundError:
+            self.misses += 1  # évincé entre-temps par un autre processus
+            return None
+        self.hits += 1
+        return result
+
+    def put(self, key, result, query=""):
+        """
+        Enregistre un résultat (ColumnResult ou lignes) ; les types incohérents
+        d'une colonne sont ignorés. Un résultat vide (partition pas encore
+        chargée, vue absente) n'est pas conservé.
+        """
+        if not key or not result:
+            return False
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        try:
+            table = ColumnResult.of(result).to_arrow()
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            return False
+
+        self.root.mkdir(parents=True, exist_ok=True)
+        path = self.root / f"{key}.parquet"
+        tmp = path.with_suffix(f'.{os.getpid()}.tmp')
+        pq.write_table(table, tmp, compression='zstd')
+        tmp.replace(path)  # un lecteur concurrent ne voit jamais un fichier partiel
+        entry = {'size': path.stat().st_size, 'sql': normalize_sql(query)[:200]}
+        if any(is_master_table(name) for name in referenced_tables(query)):
+            entry['expires'] = time.time() + self.master_ttl
+        with self._locked_index() as index:
+            index[key] = entry
+            self.evict(index)
+        return True
+
+    def _last_access(self, key):
+        try:
+            return (self.root / f"{key}.parquet").stat().st_mtime
+        except FileNotFoundError:
+            return 0
+
+    def evict(self, index):
+        """Supprime les entrées les moins récemment lues au-delà de max_bytes (index verrouillé)"""
+        total = sum(entry['size'] for entry in index.values())
+        for key in sorted(index, key=self._last_access):
+            if total <= self.max_bytes:
+                break
+            (self.root / f"{key}.parquet").unlink(missing_ok=True)
+            total -= index.pop(key)['size']
+
+    def clear(self):
+        """Vide le cache"""
+        with self._locked_index() as index:
+            for key in list(index):
+                (self.root / f"{key}.parquet").unlink(missing_ok=True)
+            index.clear()
+
+
+def main():
+    """Fonction principale"""
+    parser = argparse.ArgumentParser(description='Cache des résultats de requêtes Trino')
+    parser.add_argument('--root', default=str(Config.QUERY_CACHE_DIR), help='Répertoire du cache')
+    parser.add_argument('--clear', action='store_true', help='Vider le cache')
+    parser.add_argument('--invalidate', metavar='TABLE', help='Signaler une écriture externe (ex: hive.procurement.stock_raw)')
+    parser.add_argument('--date', help='Date de l\'écriture signalée (avec --invalidate)')
+    args = parser.parse_args()
+
+    cache = QueryCache(args.root)
+    if args.clear:
+        cache.clear()
+        print(" Cache vidé")
+    elif args.invalidate:
+        record_write(args.invalidate, args.date)
+        print(f" Écriture enregistrée: {args.invalidate} {args.date or '(toutes dates)'}")
+    else:
+        total = sum(entry['size'] for entry in cache.index.values())
+        print(f" {len(cache.index)} résultats en cache, {total / 1024 / 1024:.1f} Mo / "
+              f"{cache.max_bytes / 1024 / 1024:.0f} Mo")
+
+
+if __name__ == "__main__":
+    main()
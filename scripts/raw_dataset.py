@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+LECTURE PARALLÈLE DES DONNÉES BRUTES LOCALES
+Découvre les partitions Hive locales (raw_orders/date=.../store_id=...,
+raw_stock/date=...), élague les répertoires hors des prédicats date / magasin
+sans les parcourir, puis lit les fichiers sur un pool de processus en tables
+Arrow (colonnes de partition ajoutées). Partagé par les outils hors ligne :
+analyze_data.py --local, check_json_lines.py.
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from settings import Config
+
+ORDERS_LAYOUT = ('date', 'store_id')
+STOCK_LAYOUT = ('date',)
+
+
+class PartitionFilter:
+    """Prédicats d'élagage : intervalle de dates et ensemble de magasins"""
+
+    def __init__(self, start_date=None, end_date=None, stores=None):
+        self.start_date = start_date
+        self.end_date = end_date or start_date
+        self.stores = set(stores) if stores else None
+
+    def accepts(self, column, value):
+        if column == 'date':
+            return ((self.start_date is None or value >= self.start_date)
+                    and (self.end_date is None or value <= self.end_date))
+        if column == 'store_id':
+            return self.stores is None or value in self.stores
+        return True
+
+
+def discover(root, layout=ORDERS_LAYOUT, partition_filter=None, suffixes=('.json',)):
+    """
+    Fichiers des partitions retenues : [(chemin, {colonne: valeur})].
+    Un répertoire rejeté par le filtre n'est jamais listé.
+    """
+    partition_filter = partition_filter or PartitionFilter()
+    found = []
+
+    def walk(path, depth, values):
+        if depth == len(layout):
+            for entry in sorted(os.scandir(path), key=lambda e: e.name):
+                if entry.is_file() and entry.name.endswith(suffixes):
+                    found.append((entry.path, dict(values)))
+            return
+        column = layout[depth]
+        for entry in sorted(os.scandir(path), key=lambda e: e.name):
+            if not (entry.is_dir() and entry.name.startswith(f"{column}=")):
+                continue
+            value = entry.name.split('=', 1)[1]
+            if partition_filter.accepts(column, value):
+                walk(entry.path, depth + 1, dict(values, **{column: value}))
+
+    if os.path.isdir(root):
+        walk(root, 0, {})
+    return found
+
+
+def load_records(path):
+    """Enregistrements d'un fichier JSON (tableau ou JSON lines)"""
+    with open(path, encoding='utf-8') as f:
+        content = f.read()
+    if content.lstrip().startswith('['):
+        return json.loads(content)
+    return [json.loads(line) for line in content.splitlines() if line.strip()]
+
+
+def iter_records(lines):
+    """
+    Enregistrements d'un flux JSON (tableau ou JSON lines) décodés au fil des
+    lignes lues, sans charger le contenu entier. Lève ValueError si le flux
+    s'arrête au milieu d'un enregistrement.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    in_array = None
+    for line in lines:
+        buffer += line
+        if in_array is None:
+            buffer = buffer.lstrip()
+            if not buffer:
+                continue
+            in_array = buffer.startswith('[')
+            if in_array:
+                buffer = buffer[1:]
+        while True:
+            buffer = buffer.lstrip(' \t\r\n,')
+            if not buffer or (in_array and buffer.startswith(']')):
+                break
+            try:
+                record, end = decoder.raw_decode(buffer)
+            except ValueError:
+                break  # enregistrement incomplet : ligne suivante
+            yield record
+            buffer = buffer[end:]
+    if buffer.strip() not in ('', ']'):
+        raise ValueError(f"JSON tronqué: {buffer.strip()[:80]}")
+
+
+def read_file(path, partition_values, columns=None):
+    """Lit un fichier (JSON ou CSV) en table Arrow avec ses colonnes de partition"""
+    import pyarrow as pa
+
+    if path.endswith('.csv'):
+        import pyarrow.csv as pcsv
+        table = pcsv.read_csv(path)
+    else:
+        table = pa.Table.from_pylist(load_records(path))
+
+    for column, value in partition_values.items():
+        if column in table.column_names:
+            table = table.drop_columns([column])
+        table = table.append_column(column, pa.array([value] * table.num_rows, pa.string()))
+    if columns:
+        table = table.select([c for c in columns if c in table.column_names])
+    return table
+
+
+def _read_task(task):
+    path, values, columns = task
+    return read_file(path, values, columns)
+
+
+def iter_tables(files, workers=None, columns=None, on_error=None):
+    """
+    Tables Arrow par fichier, dans l'ordre d'achèvement (pool de processus).
+    on_error(path, exception) : un fichier illisible est signalé puis ignoré ;
+    sans on_error, la première erreur interrompt la lecture.
+    """
+    workers = workers or os.cpu_count() or 1
+    tasks = [(path, values, columns) for path, values in files]
+    if workers <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            try:
+                table = _read_task(task)
+            except Exception as e:
+                if on_error is None:
+                    raise
+                on_error(task[0], e)
+                continue
+            yield task[0], table
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(_read_task, task): task[0] for task in tasks}
+        for future in as_completed(futures):
+            try:
+                table = future.result()
+            except Exception as e:
+                if on_error is None:
+                    raise
+                on_error(futures[future], e)
+                continue
+            yield futures[future], table
+
+
+def read_files(files, workers=None, columns=None):
+    """Fichiers découverts lus en parallèle puis concaténés en une table Arrow"""
+    import pyarrow as pa
+
+    tables = [table for _, table in iter_tables(files, workers, columns) if table.num_rows]
+    if not tables:
+        return pa.table({})
+    return pa.concat_tables(tables, promote_options='default')
+
+
+def read_dataset(root, layout=ORDERS_LAYOUT, partition_filter=None, workers=None, columns=None,
+                 suffixes=('.json',)):
+    """Toutes les partitions retenues en une seule table Arrow"""
+    return read_files(discover(root, layout, partition_filter, suffixes), workers, columns)
+
+
+def main():
+    """Fonction principale"""
+    parser = argparse.ArgumentParser(description='Lecture parallèle des partitions brutes locales')
+    parser.add_argument('--root', default=str(Config.BASE_LOCAL_DATA / "raw_orders"), help='Racine raw_orders')
+    parser.add_argument('--start', help='Première date (YYYY-MM-DD)')
+    parser.add_argument('--end', help='Dernière date (défaut: --start)')
+    parser.add_argument('--stores', help='Magasins, séparés par des virgules')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Processus de lecture')
+    args = parser.parse_args()
+
+    partition_filter = PartitionFilter(args.start, args.end,
+                                       args.stores.split(',') if args.stores else None)
+    started = time.time()
+    files = discover(args.root, ORDERS_LAYOUT, partition_filter)
+    table = read_files(files, args.workers)
+    print(f" {len(files)} fichiers, {table.num_rows} lignes, colonnes {table.column_names} "
+          f"en {time.time() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+SIMULATION DE SCÉNARIOS (WHAT-IF)
+Charge une seule fois demande, stock et produits pour une date, puis évalue
+K jeux de paramètres (multiplicateur de stock de sécurité, règle d'arrondi,
+quantité minimale) avec la logique de calculate_orders, en parallèle sur un
+pool de processus. Retourne un tableau comparatif : valeur, nombre de lignes,
+risque de rupture.
+"""
+
+import argparse
+import csv
+import itertools
+import math
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+
+from ingest_validation import DEFAULT_SAFETY_STOCK
+from order_rules import ROUNDING_RULES
+from procurement_pipeline import ProcurementGenerator
+
+# Données partagées par les processus du pool (chargées une fois par worker)
+_DATA = {}
+
+
+def _init_worker(data):
+    _DATA.update(data)
+
+
+def stockout_risk(orders, demand_data, stock_data, lead_times):
+    """
+    Probabilité moyenne de rupture sur les SKU demandés : la demande sur le
+    délai est supposée normale d'écart-type sqrt(demande * délai) (Poisson).
+    """
+    ordered = {o['sku_id']: o['order_quantity'] for o in orders}
+    stock = {s['sku_id']: s['available_stock'] - s['reserved_stock'] for s in stock_data}
+    normal = NormalDist()
+
+    risks = []
+    for item in demand_data:
+        sku_id = item['sku_id']
+        demand = item['total_demand']
+        if demand <= 0:
+            continue
+        buffer = stock.get(sku_id, 0) + ordered.get(sku_id, 0) - demand
+        sigma = math.sqrt(demand * max(1, int(lead_times.get(sku_id, 1))))
+        risks.append(1 - normal.cdf(buffer / sigma))
+    return sum(risks) / len(risks) if risks else 0.0
+
+
+def evaluate_scenario(scenario):
+    """Évalue un scénario sur les données chargées (exécuté dans un worker)"""
+    demand_data = _DATA['demand']
+    stock_data = _DATA['stock']
+    product_data = _DATA['products']
+
+    multiplier = scenario.get('safety_multiplier', 1.0)
+    safety = {s['sku_id']: int(round(s['safety_stock'] * multiplier)) for s in stock_data}
+    # SKU absents du stock : stock de sécurité par défaut de calculate_orders
+    for item in demand_data:
+        safety.setdefault(item['sku_id'], int(round(DEFAULT_SAFETY_STOCK * multiplier)))
+
+    products = product_data
+    if not scenario.get('respect_moq', True):
+        products = [dict(p, min_order_quantity=0) for p in product_data]
+
+    processor = ProcurementGenerator(_DATA['date'])
+    orders = processor.calculate_orders(demand_data, stock_data, products, safety,
+                                        rounding=ROUNDING_RULES[scenario.get('rounding', 'up')],
+                                        verbose=False)
+
+    lead_times = {p['sku_id']: p.get('lead_time_days', 7) for p in product_data}
+    return dict(scenario,
+                lines=len(orders),
+                units=sum(o['order_quantity'] for o in orders),
+                order_value=round(sum(o['total_price'] for o in orders), 2),
+                stockout_risk=round(stockout_risk(orders, demand_data, stock_data, lead_times), 4))
+
+
+class ScenarioSimulator:
+    """Charge les données une fois et compare plusieurs scénarios"""
+
+    def __init__(self, target_date, workers=4):
+        self.target_date = target_date
+        self.workers = workers
+        self.data = None
+
+    def load(self):
+        """Récupère demande, stock et produits via Trino (une seule fois)"""
+        processor = ProcurementGenerator(self.target_date)
+        self.data = {
+            'date': self.target_date,
+            'demand': processor.get_aggregated_demand(),
+            'stock': processor.get_stock_data(),
+            'products': processor.get_products_with_suppliers()
+        }
+        # Codes SKU attribués ici : les workers ne font que lire le dictionnaire
+        for rows in (self.data['demand'], self.data['stock'], self.data['products']):
+            processor.sku_dictionary.encode([row['sku_id'] for row in rows if row.get('sku_id')])
+        return self
+
+    def run(self, scenarios):
+        """Évalue tous les scénarios et retourne le tableau comparatif"""
+        if self.workers <= 1:
+            _init_worker(self.data)
+            return [evaluate_scenario(s) for s in scenarios]
+
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                 initargs=(self.data,)) as executor:
+            return list(executor.map(evaluate_scenario, scenarios))
+
+
+def build_scenarios(multipliers, roundings, moq_options):
+    """Produit cartésien des paramètres"""
+    return [
+        {'safety_multiplier': m, 'rounding': r, 'respect_moq': q}
+        for m, r, q in itertools.product(multipliers, roundings, moq_options)
+    ]
+
+
+def print_comparison(results):
+    """Affiche le tableau comparatif trié par valeur"""
+    print(f"\n   {'Sécurité':>8} │ {'Arrondi':<8} │ {'MOQ':<4} │ {'Lignes':>6} │ {'Unités':>7} │ {'Valeur (€)':>11} │ {'Risque rupture':>14}")
+    print("   " + "─" * 78)
+    for r in sorted(results, key=lambda r: r['order_value']):
+        print(f"   {r['safety_multiplier']:>8.2f} │ {r['rounding']:<8} │ {'oui' if r['respect_moq'] else 'non':<4} │ "
+              f"{r['lines']:>6} │ {r['units']:>7} │ {r['order_value']:>11.2f} │ {r['stockout_risk']:>14.2%}")
+
+
+def main():
+    """Fonction principale"""
+    parser = argparse.ArgumentParser(description='Simulation de scénarios sur une date chargée une seule fois')
+    parser.add_argument('--date', required=True, help='Date à simuler (YYYY-MM-DD)')
+    parser.add_argument('--safety', default='0.5,1,1.5,2', help='Multiplicateurs du stock de sécurité')
+    parser.add_argument('--rounding', default='up,nearest', help='Règles d\'arrondi au pack (up, nearest)')
+    parser.add_argument('--moq', default='yes,no', help='Respect de la quantité minimale (yes, no)')
+    parser.add_argument('--workers', type=int, default=4, help='Processus du pool (1 = séquentiel)')
+    parser.add_argument('--output', help='Fichier CSV du tableau comparatif')
+    args = parser.parse_args()
+
+    scenarios = build_scenarios(
+        [float(m) for m in args.safety.split(',')],
+        [r.strip() for r in args.rounding.split(',')],
+        [q.strip() == 'yes' for q in args.moq.split(',')]
+    )
+
+    print(f"SIMULATION DE {len(scenarios)} SCÉNARIOS POUR {args.date}")
+    simulator = ScenarioSimulator(args.date, args.workers).load()
+    if not simulator.data['demand'] or not simulator.data['products']:
+        print(" Données insuffisantes pour simuler")
+        exit(1)
+
+    results = simulator.run(scenarios)
+    print_comparison(results)
+
+    if args.output:
+        with open(args.output, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=list(results[0].keys()))
+            writer.writeheader()
+            writer.writerows(results)
+        print(f"\n Tableau écrit dans {args.output}")
+
+
+if __name__ == "__main__":
+    main()
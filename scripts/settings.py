@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+CONFIGURATION DES OUTILS
+Valeurs lues à la première utilisation, par ordre de priorité : variables
+d'environnement PROCURE_<NOM>, fichier .env (PROCURE_CONFIG, sinon .env à la
+racine du dépôt, mêmes clés), puis valeurs par défaut. Les chemins par défaut
+sont relatifs au dépôt (pas au répertoire courant) ; ceux du fichier sont
+relatifs au fichier. Les fichiers d'état suivent STATE_DIR sauf s'ils sont
+configurés un par un. Aucun répertoire n'est créé ici : chaque écrivain crée
+le sien au moment d'écrire.
+"""
+
+import os
+from datetime import datetime
+from pathlib import Path
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+PROJECT_DIR = SCRIPTS_DIR.parent
+
+# Nom -> (valeur par défaut, est un chemin) ; une valeur (NOM, fichier) est
+# relative à un autre réglage déjà résolu (déclaré plus haut)
+DEFAULTS = {
+    'BASE_LOCAL_DATA': (PROJECT_DIR / "data", True),
+    'HDFS_RAW_ORDERS': ("/raw/orders", False),
+    'HDFS_RAW_STOCK': ("/raw/stock", False),
+    'CONTAINER_TMP': ("/tmp/data_today", False),
+    'OUTPUT_DIR': (SCRIPTS_DIR / "supplier_orders", True),
+    'CHECKPOINT_DIR': (SCRIPTS_DIR / "checkpoints", True),
+    'ORDER_ARCHIVE_DIR': (SCRIPTS_DIR / "order_archive", True),
+    'CASSANDRA_CHECKS_DIR': (SCRIPTS_DIR / "cassandra_checks", True),
+    'STATE_DIR': (SCRIPTS_DIR / "state", True),
+    'SKU_DICTIONARY': (('STATE_DIR', "sku_dictionary.bin"), True),
+    'DEMAND_WINDOW_STATE': (('STATE_DIR', "demand_window.json"), True),
+    'CONSOLIDATION_STATE': (('STATE_DIR', "consolidation.json"), True),
+    'STORE_WATCHER_STATE': (('STATE_DIR', "store_watcher.json"), True),
+    'PARTITION_MANIFEST': (('STATE_DIR', "partition_manifest.json"), True),
+    'QUERY_CACHE_DIR': (('STATE_DIR', "query_cache"), True),
+    'ORDER_QUEUE_DIR': (('STATE_DIR', "order_queue"), True),
+    'STREAM_SPOOL_DIR': (('STATE_DIR', "stream_spool"), True),
+}
+
+
+def read_env_file(path):
+    """Clés d'un fichier .env (python-dotenv s'il est installé, sinon lignes CLE=valeur)"""
+    try:
+        from dotenv import dotenv_values
+        return {k: v for k, v in dotenv_values(path).items() if v is not None}
+    except ImportError:
+        values = {}
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#') and '=' in line:
+                    key, value = line.split('=', 1)
+                    values[key.strip()] = value.strip().strip('"\'')
+        return values
+
+
+class Settings:
+    """Configuration résolue paresseusement : Config.OUTPUT_DIR, Config.BASE_LOCAL_DATA..."""
+
+    def __init__(self, path=None, environ=None):
+        self._path = path
+        self._environ = os.environ if environ is None else environ
+        self._values = None
+
+    def _load(self):
+        environ = self._environ
+        path = self._path or environ.get('PROCURE_CONFIG')
+        if path is None and (PROJECT_DIR / ".env").exists():
+            path = PROJECT_DIR / ".env"
+        from_file = read_env_file(path) if path else {}
+        base = Path(path).resolve().parent if path else Path.cwd()
+
+        values = {}
+        for name, (default, is_path) in DEFAULTS.items():
+            key = f"PROCURE_{name}"
+            if key in environ:
+                values[name] = Path(environ[key]).resolve() if is_path else environ[key]
+            elif key in from_file:
+                values[name] = (base / from_file[key]).resolve() if is_path else from_file[key]
+            elif isinstance(default, tuple):
+                parent, child = default
+                values[name] = values[parent] / child
+            else:
+                values[name] = default
+        return values
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if self._values is None:
+            self._values = self._load()
+        try:
+            return self._values[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __setattr__(self, name, value):
+        if name.startswith('_'):
+            object.__setattr__(self, name, value)
+            return
+        if self._values is None:
+            self._values = self._load()
+        self._values[name] = value
+
+    def as_dict(self):
+        """Valeurs effectives (affichage, diagnostic)"""
+        return {name: str(getattr(self, name)) for name in DEFAULTS}
+
+    @staticmethod
+    def get_today():
+        """Retourne la date du jour au format YYYY-MM-DD"""
+        return datetime.now().strftime("%Y-%m-%d")
+
+
+Config = Settings()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+DICTIONNAIRE SKU <-> ENTIER
+Attribue à chaque SKU un code int32 stable, persistant sur disque et projeté
+en mémoire (memmap). Les étapes du pipeline échangent des tableaux de codes :
+les jointures demande / stock / produits deviennent de l'indexation de
+tableaux, et les chaînes ne sont décodées qu'à l'écriture des sorties.
+
+Format : en-tête de 16 octets (magique + largeur) puis un enregistrement de
+largeur fixe par SKU, dans l'ordre des codes. Le fichier .order contient la
+permutation triée (int32) utilisée pour la recherche dichotomique.
+Un seul écrivain à la fois : les lecteurs concurrents ne voient que des codes
+déjà attribués.
+"""
+
+import argparse
+import struct
+from pathlib import Path
+
+import numpy as np
+
+from settings import Config
+
+MAGIC = b"SKUDICT1"
+HEADER_SIZE = 16
+DEFAULT_WIDTH = 50  # sku_id VARCHAR(50) dans sql/01_schema.sql
+
+
+class SkuDictionary:
+    """Codes int32 des SKU, étendus quand de nouveaux SKU apparaissent"""
+
+    def __init__(self, path=None, width=DEFAULT_WIDTH):
+        self.path = Path(path or Config.SKU_DICTIONARY)
+        self.order_path = self.path.with_suffix('.order')
+        self.width = width
+        self.ids = np.empty(0, dtype=f'S{width}')
+        self.order = np.empty(0, dtype=np.int32)
+        self._sorted = self.ids
+        self.load()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def load(self):
+        """Projette le fichier en mémoire s'il existe"""
+        if not self.path.exists():
+            return self
+
+        with open(self.path, 'rb') as f:
+            magic, width = struct.unpack('<8sI4x', f.read(HEADER_SIZE))
+        if magic != MAGIC:
+            raise ValueError(f"{self.path}: fichier dictionnaire SKU invalide")
+        self.width = width
+
+        count = (self.path.stat().st_size - HEADER_SIZE) // width
+        if count:
+            self.ids = np.memmap(self.path, dtype=f'S{width}', mode='r',
+                                 offset=HEADER_SIZE, shape=(count,))
+        else:
+            self.ids = np.empty(0, dtype=f'S{width}')
+
+        if self.order_path.exists() and self.order_path.stat().st_size == count * 4 and count:
+            self.order = np.memmap(self.order_path, dtype=np.int32, mode='r', shape=(count,))
+        else:
+            # Permutation absente ou en retard sur le dictionnaire : reconstruction
+            self.order = np.argsort(self.ids, kind='stable').astype(np.int32)
+            self._write_order()
+        self._sorted = self.ids[self.order]
+        return self
+
+    def _write_order(self):
+        tmp = self.order_path.with_suffix('.tmp')
+        self.order.tofile(tmp)
+        tmp.replace(self.order_path)  # écriture atomique
+
+    def _to_bytes(self, skus):
+        try:
+            raw = np.asarray(skus, dtype='S')  # SKU ASCII : conversion directe en C
+        except UnicodeEncodeError:
+            raw = np.char.encode(np.asarray(skus, dtype=str), 'utf-8')
+        if raw.dtype.itemsize > self.width:
+            raise ValueError(f"SKU plus long que {self.width} octets")
+        return raw.astype(f'S{self.width}')
+
+    def lookup(self, skus):
+        """Codes des SKU (-1 pour les SKU inconnus), sans modifier le dictionnaire"""
+        raw = self._to_bytes(skus)
+        if not len(self.ids) or not len(raw):
+            return np.full(len(raw), -1, dtype=np.int32)
+        pos = np.minimum(np.searchsorted(self._sorted, raw), len(self._sorted) - 1)
+        found = self._sorted[pos] == raw
+        return np.where(found, self.order[pos], -1).astype(np.int32)
+
+    def encode(self, skus, extend=True):
+        """Codes des SKU ; les SKU nouveaux sont ajoutés au dictionnaire si extend"""
+        codes = self.lookup(skus)
+        missing = codes < 0
+        if extend and missing.any():
+            new_skus = np.asarray(skus, dtype=str)[missing]
+            self.extend(np.unique(self._to_bytes(new_skus)))
+            codes[missing] = self.lookup(new_skus)
+        return codes
+
+    def extend(self, new_ids):
+        """Ajoute des SKU (déjà encodés en octets) en fin de fichier"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if not self.path.exists():
+            with open(self.path, 'wb') as f:
+                f.write(struct.pack('<8sI4x', MAGIC, self.width))
+        with open(self.path, 'ab') as f:
+            f.write(np.asarray(new_ids, dtype=f'S{self.width}').tobytes())
+
+        # Nouvelle projection et permutation triée
+        self.order_path.unlink(missing_ok=True)
+        self.load()
+
+    def decode(self, codes):
+        """Chaînes SKU des codes (au moment d'écrire les sorties)"""
+        return np.char.decode(self.ids[np.asarray(codes, dtype=np.int64)], 'utf-8').tolist()
+
+
+def main():
+    """Fonction principale"""
+    parser = argparse.ArgumentParser(description='Inspection du dictionnaire SKU <-> entier')
+    parser.add_argument('--path', default=str(Config.SKU_DICTIONARY), help='Fichier dictionnaire')
+    parser.add_argument('skus', nargs='*', help='SKU à encoder (sans extension du dictionnaire)')
+    args = parser.parse_args()
+
+    skus = SkuDictionary(args.path)
+    print(f"Dictionnaire {args.path}: {len(skus)} SKU ({skus.width} octets par SKU)")
+    if args.skus:
+        for sku, code in zip(args.skus, skus.lookup(args.skus)):
+            print(f"   {sku:<20} {code if code >= 0 else 'inconnu'}")
+
+
+if __name__ == "__main__":
+    main()
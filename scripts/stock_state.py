@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+ÉTAT DU STOCK PAR DELTAS
+Au lieu d'un instantané complet par entrepôt et par jour, les entrepôts
+envoient des événements de variation (stock_delta_raw : available_delta,
+reserved_delta par SKU). L'état courant est compacté périodiquement dans
+stock_current (une partition par date de compaction) ; le stock à une date
+quelconque = dernière compaction <= date + somme des deltas postérieurs.
+"""
+
+import argparse
+import csv
+import subprocess
+from datetime import datetime
+from pathlib import Path
+
+from trino_stream import iter_trino_rows
+from query_cache import record_write
+
+SCHEMA = "procurement"
+DELTA_TABLE = f"hive.{SCHEMA}.stock_delta_raw"
+STATE_TABLE = f"hive.{SCHEMA}.stock_current"
+HDFS_RAW_STOCK_DELTA = "/raw/stock_delta"
+DELTA_COLUMNS = ['event_time', 'warehouse_id', 'sku_id', 'available_delta', 'reserved_delta']
+
+
+def create_tables_sql(schema_name=SCHEMA):
+    """DDL des deltas bruts (CSV, colonnes VARCHAR) et de l'état compacté (ORC)"""
+    return [f"""
+    CREATE TABLE IF NOT EXISTS hive.{schema_name}.stock_delta_raw (
+        event_time VARCHAR,
+        warehouse_id VARCHAR,
+        sku_id VARCHAR,
+        available_delta VARCHAR,
+        reserved_delta VARCHAR,
+        date VARCHAR
+    )
+    WITH (
+        format = 'CSV',
+        skip_header_line_count = 1,
+        partitioned_by = ARRAY['date'],
+        external_location = 'hdfs://namenode:9000{HDFS_RAW_STOCK_DELTA}/'
+    )
+    """, f"""
+    CREATE TABLE IF NOT EXISTS hive.{schema_name}.stock_current (
+        warehouse_id VARCHAR,
+        sku_id VARCHAR,
+        available_stock BIGINT,
+        reserved_stock BIGINT,
+        date VARCHAR
+    )
+    WITH (
+        format = 'ORC',
+        partitioned_by = ARRAY['date']
+    )
+    """]
+
+
+def as_of_sql(as_of_date, schema_name=SCHEMA, rebuild=False):
+    """
+    Stock par entrepôt et SKU à une date : dernière compaction + deltas postérieurs.
+    rebuild=True ignore une compaction existante à la date même (recompaction).
+    """
+    bound = '<' if rebuild else '<='
+    last_compaction = (f"(SELECT MAX(date) FROM hive.{schema_name}.\"stock_current$partitions\" "
+                       f"WHERE date {bound} '{as_of_date}')")
+    return f"""
+    WITH base AS (
+        SELECT warehouse_id, sku_id, available_stock, reserved_stock
+        FROM hive.{schema_name}.stock_current
+        WHERE date = {last_compaction}
+    ),
+    deltas AS (
+        SELECT
+            warehouse_id,
+            sku_id,
+            SUM(CAST(available_delta AS BIGINT)) as available_delta,
+            SUM(CAST(reserved_delta AS BIGINT)) as reserved_delta
+        FROM hive.{schema_name}.stock_delta_raw
+        WHERE date > COALESCE({last_compaction}, '')
+        AND date <= '{as_of_date}'
+        AND sku_id IS NOT NULL
+        GROUP BY warehouse_id, sku_id
+    )
+    SELECT
+        COALESCE(b.warehouse_id, d.warehouse_id) as warehouse_id,
+        COALESCE(b.sku_id, d.sku_id) as sku_id,
+        COALESCE(b.available_stock, 0) + COALESCE(d.available_delta, 0) as available_stock,
+        COALESCE(b.reserved_stock, 0) + COALESCE(d.reserved_delta, 0) as reserved_stock
+    FROM base b
+    FULL OUTER JOIN deltas d ON b.warehouse_id = d.warehouse_id AND b.sku_id = d.sku_id
+    """
+
+
+def compact_sql(target_date, schema_name=SCHEMA):
+    """Écrit l'état à target_date comme nouvelle partition compactée"""
+    return f"""
+    INSERT INTO hive.{schema_name}.stock_current (warehouse_id, sku_id, available_stock, reserved_stock, date)
+    SELECT warehouse_id, sku_id, available_stock, reserved_stock, '{target_date}'
+    FROM ({as_of_sql(target_date, schema_name, rebuild=True)})
+    WHERE available_stock <> 0 OR reserved_stock <> 0
+    """
+
+
+def seed_sql(target_date, schema_name=SCHEMA):
+    """Amorce l'état à partir d'un instantané complet de stock_raw"""
+    return f"""
+    INSERT INTO hive.{schema_name}.stock_current (warehouse_id, sku_id, available_stock, reserved_stock, date)
+    SELECT
+        warehouse_id,
+        sku_id,
+        CAST(available_stock AS BIGINT),
+        CAST(reserved_stock AS BIGINT),
+        date
+    FROM hive.{schema_name}.stock_raw
+    WHERE date = '{target_date}'
+    AND sku_id IS NOT NULL
+    """
+
+
+def last_compaction_date(schema_name=SCHEMA, as_of_date=None):
+    """
+    Date de la dernière partition compactée, au plus tard as_of_date si donnée
+    (None si l'état n'est pas amorcé à cette date ou en cas d'erreur de lecture).
+    """
+    query = f"SELECT MAX(date) as last_date FROM hive.{schema_name}.\"stock_current$partitions\""
+    if as_of_date:
+        query += f" WHERE date <= '{as_of_date}'"
+    try:
+        rows = list(iter_trino_rows(query))
+    except Exception as e:
+        print(f"  Erreur lecture des compactions: {e}")
+        return None
+    return rows[0].get('last_date') if rows else None
+
+
+def compact_stock_state(target_date, seed=False, schema_name=SCHEMA):
+    """(Re)construit la partition compactée de target_date"""
+    print(f"\n {'Amorçage' if seed else 'Compaction'} de stock_current pour {target_date}...")
+
+    statements = create_tables_sql(schema_name)
+    statements.append(seed_sql(target_date, schema_name) if seed else compact_sql(target_date, schema_name))
+
+    # La partition existante est remplacée : la compaction reste idempotente
+    cmd = ['docker-compose', 'exec', '-T', 'trino', 'trino',
+           '--session', 'hive.insert_existing_partitions_behavior=OVERWRITE',
+           '--execute', "; ".join(statements)]
+
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
+    except Exception as e:
+        print(f"  Erreur compaction: {e}")
+        return False
+
+    if result.returncode != 0:
+        print(f"  Erreur compaction: {result.stderr.strip()[:300]}")
+        return False
+
+    record_write(STATE_TABLE, target_date)
+    print(" État du stock compacté")
+    return True
+
+
+def compact_if_due(target_date, every_days, schema_name=SCHEMA):
+    """Compacte si la dernière compaction date d'au moins every_days jours"""
+    last = last_compaction_date(schema_name)
+    if last is None:
+        print("  stock_current vide : amorcer avec stock_state.py --seed --date <instantané>")
+        return False
+
+    age = (datetime.strptime(target_date, "%Y-%m-%d") - datetime.strptime(last, "%Y-%m-%d")).days
+    if age < every_days:
+        print(f"  Dernière compaction le {last} ({age} j), prochaine dans {every_days - age} j")
+        return True
+    return compact_stock_state(target_date, schema_name=schema_name)
+
+
+# ---------- Conversion instantanés -> deltas (migration) ----------
+def read_snapshot_dir(snapshot_dir):
+    """Lit les CSV stock_*.csv d'un répertoire date=... : {(entrepôt, sku): (dispo, réservé)}"""
+    stock = {}
+    for path in sorted(Path(snapshot_dir).glob("stock_*.csv")):
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                stock[(row['warehouse_id'], row['sku_id'])] = (int(row['available_stock']),
+                                                               int(row['reserved_stock']))
+    return stock
+
+
+def snapshot_deltas(previous, current):
+    """Variations par entrepôt entre deux instantanés (les SKU disparus repassent à 0)"""
+    deltas = {}
+    for key in previous.keys() | current.keys():
+        before = previous.get(key, (0, 0))
+        after = current.get(key, (0, 0))
+        change = (after[0] - before[0], after[1] - before[1])
+        if change != (0, 0):
+            deltas.setdefault(key[0], []).append((key[1],) + change)
+    return deltas
+
+
+def write_delta_files(deltas, output_dir, event_time):
+    """Un fichier delta_<entrepôt>.csv par entrepôt, au format de stock_delta_raw"""
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    for warehouse_id, rows in sorted(deltas.items()):
+        with open(Path(output_dir) / f"delta_{warehouse_id}.csv", 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(DELTA_COLUMNS)
+            for sku_id, available_delta, reserved_delta in sorted(rows):
+                writer.writerow([event_time, warehouse_id, sku_id, available_delta, reserved_delta])
+    return sum(len(rows) for rows in deltas.values())
+
+
+def main():
+    """Fonction principale"""
+    parser = argparse.ArgumentParser(description='État du stock alimenté par deltas')
+    parser.add_argument('--date', help='Date de compaction ou d\'interrogation (YYYY-MM-DD)')
+    parser.add_argument('--seed', action='store_true', help='Amorcer stock_current depuis l\'instantané stock_raw de --date')
+    parser.add_argument('--compact', action='store_true', help='Compacter l\'état à --date')
+    parser.add_argument('--as-of', action='store_true', help='Afficher le résumé du stock à --date')
+    parser.add_argument('--diff', nargs=2, metavar=('AVANT', 'APRES'),
+                        help='Produire les deltas entre deux répertoires d\'instantanés locaux')
+    parser.add_argument('--output', help='Répertoire des fichiers delta (avec --diff)')
+    args = parser.parse_args()
+
+    if args.diff:
+        output = args.output or str(Path(args.diff[1]).parent.parent / "raw_stock_delta" / Path(args.diff[1]).name)
+        deltas = snapshot_deltas(read_snapshot_dir(args.diff[0]), read_snapshot_dir(args.diff[1]))
+        count = write_delta_files(deltas, output, datetime.now().isoformat())
+        print(f" {count} variations dans {len(deltas)} fichiers ({output})")
+        return
+
+    if not args.date:
+        parser.error('--date est requis')
+
+    if args.seed or args.compact:
+        exit(0 if compact_stock_state(args.date, seed=args.seed) else 1)
+
+    if args.as_of:
+        query = f"""
+        SELECT COUNT(*) as lines, COUNT(DISTINCT sku_id) as skus,
+               SUM(available_stock) as available, SUM(reserved_stock) as reserved
+        FROM ({as_of_sql(args.date)})
+        """
+        for row in iter_trino_rows(query):
+            print(f" Stock au {args.date}: {row['lines']} lignes, {row['skus']} SKU, "
+                  f"{row['available']} disponibles, {row['reserved']} réservés")
+
+
+if __name__ == "__main__":
+    main()
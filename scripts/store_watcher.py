@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+SURVEILLANCE DES FICHIERS MAGASINS
+Démon qui surveille data/raw_orders/date=*/store_id=*/orders.json (inotify si
+inotify_simple est installé, sinon scrutation périodique). Chaque fichier
+stable depuis le délai d'anti-rebond est uploadé dans HDFS et sa partition
+enregistrée dans Hive, magasin par magasin. Dès qu'un quorum de magasins est
+arrivé pour une date, le traitement est lancé ; les magasins en retard
+déclenchent une nouvelle exécution pour mettre à jour les commandes.
+"""
+
+import argparse
+import json
+import os
+import shlex
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from statistics import median
+
+from exec_session import ExecSession
+from query_cache import record_write
+from settings import Config
+
+CONTAINER_TMP = "/tmp/data_watch"
+HDFS_RAW_ORDERS = "/raw/orders"
+PIPELINE = Path(__file__).resolve().parent / "procurement_pipeline.py"
+
+
+def scan_store_files(root):
+    """Fichiers présents : {(date, store_id): (mtime, taille)}"""
+    files = {}
+    if not os.path.isdir(root):
+        return files
+    for date_entry in os.scandir(root):
+        if not (date_entry.is_dir() and date_entry.name.startswith("date=")):
+            continue
+        for store_entry in os.scandir(date_entry.path):
+            if not (store_entry.is_dir() and store_entry.name.startswith("store_id=")):
+                continue
+            path = os.path.join(store_entry.path, "orders.json")
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            key = (date_entry.name.split("=", 1)[1], store_entry.name.split("=", 1)[1])
+            files[key] = (stat.st_mtime, stat.st_size)
+    return files
+
+
+class ChangeNotifier:
+    """Attente du prochain changement : inotify si disponible, sinon simple pause"""
+
+    def __init__(self, root, poll_interval=5.0, use_inotify=True):
+        self.root = root
+        self.poll_interval = poll_interval
+        self.inotify = None
+        self.watched = set()
+        if use_inotify:
+            try:
+                from inotify_simple import INotify, flags
+                self.inotify = INotify()
+                self.mask = flags.CREATE | flags.CLOSE_WRITE | flags.MOVED_TO
+            except (ImportError, OSError):
+                self.inotify = None
+
+    @property
+    def mode(self):
+        return "inotify" if self.inotify else f"scrutation ({self.poll_interval:g}s)"
+
+    def refresh_watches(self):
+        """Ajoute une surveillance sur les nouveaux répertoires date=* et store_id=*"""
+        if not self.inotify or not os.path.isdir(self.root):
+            return
+        dirs = [self.root]
+        for date_entry in os.scandir(self.root):
+            if date_entry.is_dir():
+                dirs.append(date_entry.path)
+                dirs.extend(e.path for e in os.scandir(date_entry.path) if e.is_dir())
+        for path in dirs:
+            if path not in self.watched:
+                self.inotify.add_watch(path, self.mask)
+                self.watched.add(path)
+
+    def wait(self, timeout):
+        """Bloque jusqu'à un événement ou l'expiration du délai (secondes)"""
+        if self.inotify:
+            self.refresh_watches()
+            # Un réveil suffit : l'état réel est relu par scan_store_files
+            self.inotify.read(timeout=int(timeout * 1000))
+        else:
+            time.sleep(min(timeout, self.poll_interval))
+
+
+class StoreWatcher:
+    """Upload par magasin, enregistrement de partition et déclenchement au quorum"""
+
+    def __init__(self, root, quorum=10, debounce=10.0, poll_interval=5.0, use_inotify=True,
+                 pipeline_args=None, state_path=None):
+        self.root = root
+        self.quorum = quorum
+        self.debounce = debounce
+        self.pipeline_args = pipeline_args or []
+        self.state_path = Path(state_path or Config.STORE_WATCHER_STATE)
+        self.notifier = ChangeNotifier(root, poll_interval, use_inotify)
+        self.state = {'uploaded': {}, 'processed': {}}
+        if self.state_path.exists():
+            with open(self.state_path, encoding='utf-8') as f:
+                self.state = json.load(f)
+
+    def save(self):
+        """Écrit l'état (magasins uploadés, exécutions par date)"""
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_path.with_suffix('.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, indent=2)
+        tmp.replace(self.state_path)  # écriture atomique
+
+    def stable_files(self, now):
+        """Fichiers nouveaux ou modifiés, inchangés depuis le délai d'anti-rebond"""
+        ready = []
+        for key, signature in scan_store_files(self.root).items():
+            uploaded = self.state['uploaded'].get(key[0], {}).get(key[1])
+            if uploaded and uploaded['signature'] == list(signature):
+                continue
+            # Toute écriture met à jour mtime : fichier stable = non modifié depuis debounce
+            if now - signature[0] >= self.debounce:
+                ready.append((key, signature))
+        return ready
+
+    def upload_store(self, target_date, store_id):
+        """Copie, upload HDFS et enregistrement de la partition d'un magasin"""
+        local_file = os.path.join(self.root, f"date={target_date}", f"store_id={store_id}", "orders.json")
+        container_dir = f"{CONTAINER_TMP}/date={target_date}/store_id={store_id}"
+        hdfs_dir = f"{HDFS_RAW_ORDERS}/date={target_date}/store_id={store_id}"
+
+        session = ExecSession("namenode")
+        session.add(f"mkdir -p {container_dir}", "mkdir conteneur")
+        ExecSession.report(session.run())
+        copy = subprocess.run(['docker', 'cp', local_file, f"namenode:{container_dir}/orders.json"],
+                              capture_output=True, text=True)
+        if copy.returncode != 0:
+            print(f"   {target_date}/{store_id}: échec copie ({copy.stderr.strip()[:200]})")
+            return False
+
+        session = ExecSession("namenode")
+        mkdir = session.add(f"hdfs dfs -mkdir -p {hdfs_dir}", "mkdir HDFS")
+        put = session.add(f"hdfs dfs -copyFromLocal -f {container_dir}/orders.json {hdfs_dir}/orders.json", "put",
+                          after=mkdir)
+        results = session.run()
+        ExecSession.report(results)
+        if not results or results[put]['returncode'] != 0:
+            print(f"   {target_date}/{store_id}: échec upload HDFS")
+            return False
+
+        # Enregistrement ciblé de la partition (pas de sync complète du catalogue)
+        register = (f"CALL hive.system.register_partition('procurement', 'orders_raw', "
+                    f"ARRAY['date', 'store_id'], ARRAY['{target_date}', '{store_id}'])")
+        result = subprocess.run(['docker-compose', 'exec', '-T', 'trino', 'trino', '--execute', register],
+                                capture_output=True, text=True)
+        if result.returncode != 0 and 'already exists' not in result.stderr:
+            print(f"   {target_date}/{store_id}: échec enregistrement partition ({result.stderr.strip()[:200]})")
+            return False
+        record_write("hive.procurement.orders_raw", target_date)
+        return True
+
+    def processing_command(self, target_date):
+        """Commande du traitement d'une date (nouvelle exécution, sans reprise)"""
+        return [sys.executable, str(PIPELINE), '--date', target_date, '--process-only',
+                '--rebuild-rollup'] + self.pipeline_args
+
+    def run_processing(self, target_date):
+        """Traitement de la date dans un processus séparé (rollup + commandes)"""
+        cmd = self.processing_command(target_date)
+        print(f"\n Traitement de {target_date}: {' '.join(cmd[2:])}")
+        result = subprocess.run(cmd, cwd=PIPELINE.parent)
+        return result.returncode == 0
+
+    def dates_to_process(self):
+        """Dates au quorum avec des magasins arrivés depuis la dernière exécution"""
+        dates = []
+        for target_date, stores in self.state['uploaded'].items():
+            processed = self.state['processed'].get(target_date, {})
+            pending = [s for s, info in stores.items() if info['uploaded_at'] > processed.get('at', 0)]
+            if len(stores) >= self.quorum and pending:
+                dates.append(target_date)
+        return sorted(dates)
+
+    def step(self):
+        """Un cycle : uploads des fichiers stables puis traitements au quorum"""
+        now = time.time()
+        for (target_date, store_id), signature in self.stable_files(now):
+            print(f" {datetime.now():%H:%M:%S} {target_date}/{store_id}: fichier stable, upload...")
+            if self.upload_store(target_date, store_id):
+                self.state['uploaded'].setdefault(target_date, {})[store_id] = {
+                    'signature': list(signature),
+                    'landed_at': signature[0],
+                    'uploaded_at': time.time()
+                }
+                self.save()
+                count = len(self.state['uploaded'][target_date])
+                print(f"   ✓ {store_id} uploadé ({count}/{self.quorum} magasins pour le quorum)")
+
+        for target_date in self.dates_to_process():
+            started = time.time()
+            if not self.run_processing(target_date):
+                print(f"   ✗ Traitement de {target_date} en échec, nouvelle tentative au prochain arrivage")
+                continue
+            stores = self.state['uploaded'][target_date]
+            processed = self.state['processed'].get(target_date, {})
+            latencies = [time.time() - info['landed_at'] for info in stores.values()
+                         if info['uploaded_at'] > processed.get('at', 0)]
+            self.state['processed'][target_date] = {'at': started, 'stores': len(stores), 'runs': processed.get('runs', 0) + 1}
+            self.save()
+            print(f"   ✓ {target_date}: commandes à jour pour {len(stores)} magasins, "
+                  f"latence médiane arrivée → commandes {median(latencies):.0f}s")
+
+    def run(self, once=False):
+        """Boucle du démon"""
+        print(f"SURVEILLANCE DE {self.root} ({self.notifier.mode}, anti-rebond {self.debounce:g}s, "
+              f"quorum {self.quorum} magasins)")
+        while True:
+            self.step()
+            if once:
+                return
+            # Réveil au plus tard à l'expiration de l'anti-rebond des fichiers en attente
+            self.notifier.wait(self.debounce)
+
+
+def check_pipeline_command(watcher):
+    """Vérifie que la commande de traitement est acceptée par l'argparse du pipeline"""
+    from procurement_pipeline import build_parser
+    parser = build_parser()
+    parser.prog = PIPELINE.name
+    parser.exit_on_error = False
+    cmd = watcher.processing_command(Config.get_today())
+    try:
+        args = parser.parse_args(cmd[2:])
+    except (argparse.ArgumentError, SystemExit) as e:
+        print(f"  ✗ Commande refusée par procurement_pipeline.py: {' '.join(cmd[2:])} ({e})")
+        return False
+    if not (args.process_only and args.rebuild_rollup) or args.resume:
+        print(f"  ✗ Commande inattendue: {' '.join(cmd[2:])}")
+        return False
+    print(f"  ✓ Commande acceptée: {' '.join(cmd[2:])}")
+    return True
+
+
+def main():
+    """Fonction principale"""
+    parser = argparse.ArgumentParser(description='Démon de surveillance des fichiers magasins')
+    parser.add_argument('--root', default=str(Config.BASE_LOCAL_DATA / "raw_orders"), help='Répertoire raw_orders local')
+    parser.add_argument('--quorum', type=int, default=10, help='Magasins requis avant le premier traitement d\'une date')
+    parser.add_argument('--debounce', type=float, default=10.0, help='Secondes sans modification avant upload')
+    parser.add_argument('--poll-interval', type=float, default=5.0, help='Intervalle de scrutation sans inotify')
+    parser.add_argument('--no-inotify', action='store_true', help='Forcer la scrutation périodique')
+    parser.add_argument('--pipeline-args', default='', help='Options supplémentaires de procurement_pipeline.py')
+    parser.add_argument('--once', action='store_true', help='Un seul cycle puis sortie')
+    parser.add_argument('--self-check', action='store_true',
+                        help='Vérifier la commande de traitement contre les options du pipeline')
+    args = parser.parse_args()
+
+    watcher = StoreWatcher(args.root, args.quorum, args.debounce, args.poll_interval,
+                           not args.no_inotify, shlex.split(args.pipeline_args))
+    if args.self_check:
+        exit(0 if check_pipeline_command(watcher) else 1)
+    # Une commande refusée ferait échouer chaque traitement au quorum sans autre signe
+    if not check_pipeline_command(watcher):
+        exit(2)
+    try:
+        watcher.run(once=args.once)
+    except KeyboardInterrupt:
+        print("\n Arrêt de la surveillance")
+
+
+if __name__ == "__main__":
+    main()
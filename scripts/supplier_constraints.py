@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+CONTRAINTES FOURNISSEUR (VALEUR MINIMALE, CAPACITÉ CAMION)
+Ajuste les quantités par fournisseur après le calcul des commandes :
+- capacité : retire d'abord le surplus d'arrondi, puis réduit les lignes
+  de plus faible valeur unitaire (glouton type sac à dos, par packs)
+- valeur minimale : complète par packs les SKU les plus demandés, sans
+  dépasser MAX_TOPUP_FACTOR fois la quantité d'origine d'une ligne
+Chaque fournisseur est traité en O(n log n) sur ses lignes, dans son propre
+budget de temps ; un fournisseur hors budget garde ses quantités d'origine.
+"""
+
+import argparse
+import random
+import time
+
+MAX_TOPUP_FACTOR = 3
+
+
+class SupplierConstraintSolver:
+    """Applique les conditions de supplier_terms aux commandes générées"""
+
+    def __init__(self, terms, time_budget=2.0, max_topup_factor=MAX_TOPUP_FACTOR):
+        # terms: supplier_id -> {'min_order_value', 'truck_capacity_units', 'max_trucks'}
+        # time_budget: secondes par fournisseur
+        self.terms = terms
+        self.time_budget = time_budget
+        self.max_topup_factor = max_topup_factor
+
+    def solve(self, orders):
+        """Retourne (commandes ajustées, rapport par fournisseur)"""
+        by_supplier = {}
+        for order in orders:
+            by_supplier.setdefault(order['supplier_id'], []).append(dict(order))
+
+        adjusted = []
+        report = []
+        for supplier_id, lines in by_supplier.items():
+            terms = self.terms.get(supplier_id)
+            if terms:
+                deadline = time.perf_counter() + self.time_budget
+                report.append(self.solve_supplier(supplier_id, lines, terms, deadline))
+            adjusted.extend(line for line in lines if line['order_quantity'] > 0)
+
+        return adjusted, report
+
+    def solve_supplier(self, supplier_id, lines, terms, deadline):
+        """Ajuste les lignes d'un fournisseur (modifiées en place, restaurées si budget dépassé)"""
+        before_value = sum(line['total_price'] for line in lines)
+        before_units = sum(line['order_quantity'] for line in lines)
+        original = [dict(line) for line in lines]
+        status = 'ok'
+
+        capacity = None
+        if terms.get('truck_capacity_units') and terms.get('max_trucks'):
+            capacity = int(terms['truck_capacity_units']) * int(terms['max_trucks'])
+
+        if capacity is not None and before_units > capacity:
+            status = self._fit_capacity(lines, before_units - capacity, deadline)
+
+        min_value = float(terms.get('min_order_value') or 0)
+        value = sum(line['total_price'] for line in lines)
+        if min_value > 0 and value < min_value and status == 'ok':
+            status = self._reach_min_value(lines, min_value - value, capacity, deadline)
+
+        if status == 'budget_exceeded':
+            # Pas d'ajustement partiel : le fournisseur garde ses quantités d'origine
+            for line, saved in zip(lines, original):
+                line.clear()
+                line.update(saved)
+
+        for line in lines:
+            line['total_price'] = line['unit_price'] * line['order_quantity']
+
+        return {
+            'supplier_id': supplier_id,
+            'lines': len(lines),
+            'before_value': round(before_value, 2),
+            'after_value': round(sum(line['total_price'] for line in lines), 2),
+            'before_units': before_units,
+            'after_units': sum(line['order_quantity'] for line in lines),
+            'status': status
+        }
+
+    @staticmethod
+    def _set_quantity(line, quantity, reason):
+        line['order_quantity'] = quantity
+        line['total_price'] = line['unit_price'] * quantity
+        line['constraint_adjustment'] = reason
+
+    def _fit_capacity(self, lines, excess, deadline):
+        """Réduit les unités commandées de `excess` au plus"""
+        # 1. Surplus d'arrondi au-delà du besoin net : sans impact sur la couverture
+        for line in lines:
+            pack = max(1, int(line['pack_size']))
+            floor_qty = max(line['net_demand'], int(line.get('min_order_quantity', 0)))
+            removable = min(excess, max(0, line['order_quantity'] - floor_qty)) // pack * pack
+            if removable > 0:
+                self._set_quantity(line, line['order_quantity'] - removable, 'capacity_surplus')
+                excess -= removable
+        if excess <= 0:
+            return 'capacity_trimmed'
+
+        # 2. Réduire les lignes de plus faible valeur unitaire d'abord
+        for line in sorted(lines, key=lambda l: l['unit_price']):
+            if time.perf_counter() > deadline:
+                return 'budget_exceeded'
+            pack = max(1, int(line['pack_size']))
+            min_qty = int(line.get('min_order_quantity', 0))
+            packs = min(line['order_quantity'] // pack, (excess + pack - 1) // pack)
+            quantity = line['order_quantity'] - packs * pack
+            if 0 < quantity < min_qty:
+                quantity = 0  # sous le minimum : la ligne est retirée
+            excess -= line['order_quantity'] - quantity
+            self._set_quantity(line, quantity, 'capacity_reduced')
+            if excess <= 0:
+                return 'capacity_trimmed'
+        return 'capacity_unmet'
+
+    def _reach_min_value(self, lines, gap, capacity, deadline):
+        """Ajoute des packs aux SKU les plus demandés jusqu'à la valeur minimale"""
+        # Un prix nul ou négatif ne rapproche jamais de la valeur minimale
+        candidates = sorted((l for l in lines if l['order_quantity'] > 0 and l['unit_price'] > 0),
+                            key=lambda l: l['net_demand'], reverse=True)
+        if not candidates:
+            return 'min_value_unmet'
+
+        limits = {id(line): line['order_quantity'] * self.max_topup_factor for line in candidates}
+        units = sum(line['order_quantity'] for line in lines)
+        while gap > 0:
+            progressed = False
+            for line in candidates:
+                if time.perf_counter() > deadline:
+                    return 'budget_exceeded'
+                pack = max(1, int(line['pack_size']))
+                if capacity is not None and units + pack > capacity:
+                    continue
+                if line['order_quantity'] + pack > limits[id(line)]:
+                    continue
+                self._set_quantity(line, line['order_quantity'] + pack, 'min_value_topup')
+                units += pack
+                gap -= pack * line['unit_price']
+                progressed = True
+                if gap <= 0:
+                    return 'min_value_reached'
+            if not progressed:
+                return 'min_value_unmet'
+        return 'min_value_reached'
+
+
+def print_report(report):
+    """Affiche le rapport d'ajustement par fournisseur"""
+    for r in report:
+        if r['status'] == 'ok':
+            continue
+        print(f"    {r['supplier_id']}: {r['status']} "
+              f"(valeur {r['before_value']:.2f}€ → {r['after_value']:.2f}€, "
+              f"unités {r['before_units']} → {r['after_units']})")
+
+
+def benchmark(num_lines=100000, num_suppliers=20, time_budget=10.0):
+    """Mesure le temps de résolution sur des lignes aléatoires"""
+    rng = random.Random(42)
+    orders = []
+    for i in range(num_lines):
+        pack = rng.choice([1, 6, 12, 24])
+        net = rng.randint(1, 60)
+        quantity = -(-net // pack) * pack
+        price = round(rng.uniform(0.5, 20), 2)
+        orders.append({
+            'supplier_id': f"SUP{i % num_suppliers:03d}",
+            'sku_id': f"SKU{i:06d}",
+            'net_demand': net,
+            'order_quantity': quantity,
+            'pack_size': pack,
+            'min_order_quantity': rng.choice([1, 5, 10, 24]),
+            'unit_price': price,
+            'total_price': price * quantity
+        })
+
+    # La moitié des fournisseurs limités en camions, l'autre avec une valeur minimale élevée
+    terms = {}
+    for j in range(num_suppliers):
+        if j % 2:
+            terms[f"SUP{j:03d}"] = {'truck_capacity_units': 10000, 'max_trucks': 10}
+        else:
+            terms[f"SUP{j:03d}"] = {'min_order_value': 2000000}
+
+    solver = SupplierConstraintSolver(terms, time_budget)
+    start = time.perf_counter()
+    adjusted, report = solver.solve(orders)
+    elapsed = time.perf_counter() - start
+
+    print(f"{num_lines} lignes, {num_suppliers} fournisseurs: {elapsed:.3f}s")
+    statuses = {}
+    for r in report:
+        statuses[r['status']] = statuses.get(r['status'], 0) + 1
+    print(f"Statuts: {statuses}, lignes conservées: {len(adjusted)}")
+    return elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark du solveur de contraintes fournisseur')
+    parser.add_argument('--lines', type=int, default=100000)
+    parser.add_argument('--suppliers', type=int, default=20)
+    args = parser.parse_args()
+    benchmark(args.lines, args.suppliers)
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+INDEX FOURNISSEURS PAR SKU (BASCULE SUR FOURNISSEUR SECONDAIRE)
+Construit une fois par exécution à partir de toutes les lignes de
+product_supplier : pour chaque SKU, les fournisseurs triés par priorité
+(principal d'abord) puis par délai. Une ligne est routée vers le premier
+fournisseur non bloqué (embargo, capacité épuisée) en O(1) par SKU.
+Les liens ne portent que le délai : une ligne basculée garde le prix et le
+pack du produit (conditions du principal), signalés par price_source.
+Un SKU sans lien retombe sur le fournisseur principal de la ligne produit.
+"""
+
+
+class SupplierIndex:
+    """Fournisseurs candidats par SKU, ordonnés par priorité puis délai"""
+
+    def __init__(self, links, embargo=None, capacities=None):
+        # links: lignes product_supplier (sku_id, supplier_id, supplier_name, lead_time_days, is_primary)
+        self.embargo = set(embargo or [])
+        self.remaining = dict(capacities or {})  # supplier_id -> unités encore disponibles
+        self.by_sku = {}
+
+        for link in links:
+            sku_id = link.get('sku_id')
+            if sku_id:
+                self.by_sku.setdefault(sku_id, []).append(link)
+
+        for candidates in self.by_sku.values():
+            candidates.sort(key=lambda l: (not self._is_primary(l), int(l.get('lead_time_days') or 7)))
+
+    @staticmethod
+    def _is_primary(link):
+        value = link.get('is_primary')
+        return value is True or str(value).lower() == 'true'
+
+    def candidates(self, sku_id):
+        """Fournisseurs d'un SKU dans l'ordre de préférence"""
+        return self.by_sku.get(sku_id, [])
+
+    def is_blocked(self, supplier_id, quantity):
+        """Fournisseur sous embargo ou sans capacité suffisante"""
+        if supplier_id in self.embargo:
+            return True
+        remaining = self.remaining.get(supplier_id)
+        return remaining is not None and remaining < quantity
+
+    def route(self, sku_id, quantity, fallback=None):
+        """
+        Retourne le fournisseur retenu pour la ligne (capacité réservée) ou None.
+        fallback : fournisseur principal (ligne produit), seul candidat d'un SKU sans lien.
+        """
+        candidates = self.by_sku.get(sku_id) or ([fallback] if fallback else [])
+        for link in candidates:
+            supplier_id = link['supplier_id']
+            if self.is_blocked(supplier_id, quantity):
+                continue
+            if supplier_id in self.remaining:
+                self.remaining[supplier_id] -= quantity
+            return link
+        return None
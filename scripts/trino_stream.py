@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+LECTURE EN FLUX DES RÉSULTATS TRINO
+Lit la sortie JSONL du CLI Trino ligne par ligne au lieu de charger tout
+stdout en mémoire, avec un décodeur JSON plus rapide (orjson) s'il est installé.
+Les lignes sont rangées au fil du flux dans des colonnes (ColumnResult) :
+tableaux numpy pour les colonnes numériques typées, sans dictionnaire par ligne.
+"""
+
+import json
+import subprocess
+import threading
+
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
+
+JSON_ERRORS = (ValueError,)  # orjson.JSONDecodeError et json.JSONDecodeError héritent de ValueError
+NUMERIC_CASTS = {int: 'int64', float: 'float64'}
+
+
+def trino_cmd(query):
+    """Commande CLI Trino en sortie JSONL"""
+    return ['docker-compose', 'exec', '-T', 'trino', 'trino', '--output-format', 'JSON', '--execute', query]
+
+
+def iter_jsonl(stream, types=None):
+    """Décode un flux JSONL, en typant les colonnes demandées au passage"""
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            row = loads(line)
+        except JSON_ERRORS:
+            continue
+        if types:
+            for column, cast in types.items():
+                value = row.get(column)
+                if value is not None:
+                    row[column] = cast(value)
+        yield row
+
+
+def iter_trino_rows(query, types=None, timeout=30, cmd=None):
+    """
+    Exécute une requête et produit les lignes au fil de l'eau.
+    Lève CalledProcessError si le CLI échoue, TimeoutExpired après `timeout` secondes.
+    """
+    cmd = cmd or trino_cmd(query)
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    # stderr vidé en parallèle : un CLI bavard ne bloque pas sur un tube plein
+    stderr_chunks = []
+    drain = threading.Thread(target=lambda: stderr_chunks.append(proc.stderr.read()), daemon=True)
+    drain.start()
+
+    # Le timeout du subprocess.run d'origine, appliqué au flux
+    timer = threading.Timer(timeout, proc.kill)
+    timer.start()
+    try:
+        yield from iter_jsonl(proc.stdout, types)
+        returncode = proc.wait()
+    finally:
+        expired = not timer.is_alive()
+        timer.cancel()
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        drain.join()
+        proc.stdout.close()
+        proc.stderr.close()
+
+    if expired:
+        raise subprocess.TimeoutExpired(cmd, timeout)
+    if returncode != 0:
+        stderr = b"".join(stderr_chunks).decode('utf-8', errors='replace')
+        raise subprocess.CalledProcessError(returncode, cmd, stderr=stderr)
+
+
+class ColumnResult:
+    """
+    Résultat en colonnes {colonne: valeurs}. Les colonnes numériques sans NULL sont
+    des tableaux numpy, utilisables directement par les calculs vectorisés ;
+    len(), l'itération et l'indexation restituent des lignes (dict) pour les
+    lecteurs ligne à ligne.
+    """
+
+    def __init__(self, columns=None):
+        self.columns = columns or {}
+        self.length = len(next(iter(self.columns.values()), ()))
+
+    @classmethod
+    def from_rows(cls, rows, types=None):
+        """Consomme un itérateur de lignes (iter_trino_rows) colonne par colonne"""
+        columns = {}
+        count = 0
+        for row in rows:
+            if row.keys() != columns.keys():
+                for name in row:
+                    if name not in columns:
+                        columns[name] = [None] * count
+                for name, values in columns.items():
+                    values.append(row.get(name))
+            else:
+                for name, value in row.items():
+                    columns[name].append(value)
+            count += 1
+        for name, cast in (types or {}).items():
+            values = columns.get(name)
+            if values is not None and cast in NUMERIC_CASTS and None not in values:
+                import numpy as np
+                columns[name] = np.asarray(values, dtype=NUMERIC_CASTS[cast])
+        return cls(columns)
+
+    @classmethod
+    def from_arrow(cls, table):
+        """Table pyarrow (cache, points de reprise) : colonnes numériques sans NULL en numpy"""
+        import pyarrow as pa
+
+        columns = {}
+        for name in table.column_names:
+            column = table.column(name)
+            numeric = pa.types.is_integer(column.type) or pa.types.is_floating(column.type)
+            columns[name] = column.to_numpy() if numeric and column.null_count == 0 else column.to_pylist()
+        return cls(columns)
+
+    @classmethod
+    def of(cls, data):
+        """ColumnResult tel quel, ou construit depuis une liste de lignes"""
+        return data if isinstance(data, cls) else cls.from_rows(data)
+
+    def to_arrow(self):
+        import pyarrow as pa
+
+        return pa.table(self.columns)
+
+    def column(self, name):
+        """Valeurs d'une colonne (liste vide si la colonne est absente)"""
+        values = self.columns.get(name)
+        return [None] * self.length if values is None else values
+
+    def nonempty(self, name):
+        """Lignes dont la colonne est renseignée (le résultat lui-même s'il n'en manque aucune)"""
+        keep = [i for i, value in enumerate(self.column(name)) if value]
+        if len(keep) == self.length:
+            return self
+        return ColumnResult({n: values[keep] if hasattr(values, 'shape') else [values[i] for i in keep]
+                             for n, values in self.columns.items()})
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        names = list(self.columns)
+        values = [v.tolist() if hasattr(v, 'tolist') else v for v in self.columns.values()]
+        for row in zip(*values):
+            yield dict(zip(names, row))
+
+    def __getitem__(self, index):
+        return {name: values[index].item() if hasattr(values, 'shape') else values[index]
+                for name, values in self.columns.items()}
@@ -16,6 +16,15 @@ CREATE TABLE suppliers (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Conditions commerciales par fournisseur
+CREATE TABLE supplier_terms (
+    supplier_id VARCHAR(20) PRIMARY KEY REFERENCES suppliers(supplier_id),
+    min_order_value DECIMAL(12,2) DEFAULT 0,
+    truck_capacity_units INTEGER,
+    max_trucks INTEGER,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
 -- Table de liaison produit-fournisseur
 CREATE TABLE product_supplier (
     id SERIAL PRIMARY KEY,
@@ -12,6 +12,12 @@ INSERT INTO suppliers (supplier_id, supplier_name, contact_email) VALUES
 ('SUP02', 'PastaWorld', 'supply@pastaworld.com'),
 ('SUP03', 'BeverageExperts', 'procurement@bevex.com');
 
+-- Conditions commerciales des fournisseurs
+INSERT INTO supplier_terms (supplier_id, min_order_value, truck_capacity_units, max_trucks) VALUES
+('SUP01', 150.00, 2000, 2),
+('SUP02', 100.00, 1500, 1),
+('SUP03', 200.00, NULL, NULL);
+
 -- Lier produits et fournisseurs
 INSERT INTO product_supplier (sku_id, supplier_id, lead_time_days, is_primary) VALUES
 ('SKU001', 'SUP01', 2, TRUE),
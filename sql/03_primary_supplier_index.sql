@@ -0,0 +1,34 @@
+-- Migration : index et projection pour la jointure produits / fournisseurs
+-- principaux lue par Trino (get_products_with_suppliers).
+-- Idempotente : peut être rejouée sur une base existante.
+
+-- Index partiel : uniquement les liens principaux (un par SKU)
+CREATE INDEX IF NOT EXISTS idx_product_supplier_primary
+    ON product_supplier (sku_id)
+    INCLUDE (supplier_id, lead_time_days)
+    WHERE is_primary;
+
+-- Index couvrant pour la jointure fournisseur -> liens (bascule secondaire)
+CREATE INDEX IF NOT EXISTS idx_product_supplier_supplier
+    ON product_supplier (supplier_id, sku_id)
+    INCLUDE (lead_time_days, is_primary);
+
+-- Projection précalculée : une ligne étroite par SKU avec son fournisseur principal
+CREATE MATERIALIZED VIEW IF NOT EXISTS primary_supplier_by_sku AS
+SELECT
+    p.sku_id,
+    p.product_name,
+    p.unit_price,
+    COALESCE(p.pack_size, 1) AS pack_size,
+    COALESCE(p.min_order_quantity, 0) AS min_order_quantity,
+    ps.supplier_id,
+    COALESCE(ps.lead_time_days, 7) AS lead_time_days,
+    s.supplier_name
+FROM products p
+JOIN product_supplier ps ON p.sku_id = ps.sku_id AND ps.is_primary
+JOIN suppliers s ON ps.supplier_id = s.supplier_id;
+
+-- Index unique requis par REFRESH MATERIALIZED VIEW CONCURRENTLY
+-- (un SKU avec deux liens principaux ferait échouer le rafraîchissement)
+CREATE UNIQUE INDEX IF NOT EXISTS idx_primary_supplier_by_sku
+    ON primary_supplier_by_sku (sku_id);